@@ -4,6 +4,7 @@ import reporting.applist as applist
 import reporting.form_utils as form_utils
 from reporting.form_utils import get_variable_with_error, get_variable
 from dbbackend.models import GradeResults, TableStatus
+from dbbackend.dimensions import dimension_values
 from django.db import connection
 from django.http import HttpResponse
 from django.contrib.auth.decorators import login_required, permission_required
@@ -47,15 +48,7 @@ HEADER_QUALIFICATION = "Qualification"
 @permission_required("al.can_access_al")
 def index(request):
     # get all schools
-    cursor = connection.cursor()
-    cursor.execute("""
-        SELECT DISTINCT(owning_school_clevel)
-        FROM %s
-        ORDER BY owning_school_clevel ASC
-        """ % GradeResults._meta.db_table)
-    schools = []
-    for row in cursor.fetchall():
-        schools.append(row[0])
+    schools = dimension_values('graderesults.school')
 
     # get query date
     query_date = None
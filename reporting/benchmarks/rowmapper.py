@@ -0,0 +1,136 @@
+"""
+Micro-benchmark comparing the compiled RowMapper with the string_cell/int_cell/float_cell
+helpers applied to DictReader rows (both from reporting/db.py).
+
+Usage (from the directory containing manage.py):
+
+  python3 -m benchmarks.rowmapper [rows] [columns]
+"""
+
+from reporting.db import truncate_strings, encode_strings, string_cell, int_cell, float_cell
+from reporting.db import RowMapper, int_value, float_value
+from csv import DictReader
+from csv import reader as csv_reader
+from io import StringIO
+import random
+import sys
+import time
+
+
+def generate(rows, columns):
+    """
+    Generates the CSV content and the column definitions for the benchmark.
+    Every third column is an int, every third a float and the rest strings;
+    every column has an alias that does not occur in the header.
+
+    :param rows: the number of rows to generate
+    :type rows: int
+    :param columns: the number of columns to generate
+    :type columns: int
+    :return: the CSV content and the column definitions
+    :rtype: tuple
+    """
+
+    random.seed(42)
+    defs = []
+    for i in range(columns):
+        if i % 3 == 0:
+            defs.append(('col%d' % i, ['alias%d' % i, 'col%d' % i], int_value, None))
+        elif i % 3 == 1:
+            defs.append(('col%d' % i, ['alias%d' % i, 'col%d' % i], float_value, None))
+        else:
+            defs.append(('col%d' % i, ['alias%d' % i, 'col%d' % i], None, None))
+    lines = [','.join([d[0].upper() for d in defs])]
+    for n in range(rows):
+        cells = []
+        for i in range(columns):
+            if i % 3 == 0:
+                cells.append(str(random.randint(0, 1000)))
+            elif i % 3 == 1:
+                cells.append('%.2f' % random.random())
+            else:
+                cells.append('value-%d' % random.randint(0, 1000))
+        lines.append(','.join(cells))
+    return '\n'.join(lines) + '\n', defs
+
+
+def run_cells(content, defs):
+    """
+    Processes the content with DictReader and the *_cell helpers.
+
+    :param content: the CSV content
+    :type content: str
+    :param defs: the column definitions
+    :type defs: list
+    :return: the number of rows processed
+    :rtype: int
+    """
+
+    reader = DictReader(StringIO(content))
+    reader.fieldnames = [name.lower().replace(" ", "_") for name in reader.fieldnames]
+    count = 0
+    for row in reader:
+        truncate_strings(row, 250)
+        encode_strings(row, 'utf-8')
+        values = dict()
+        for name, aliases, converter, defvalue in defs:
+            if converter is int_value:
+                values[name] = int_cell(row, aliases, defvalue=defvalue)
+            elif converter is float_value:
+                values[name] = float_cell(row, aliases, defvalue=defvalue)
+            else:
+                values[name] = string_cell(row, aliases, defvalue=defvalue)
+        count += 1
+    return count
+
+
+def run_mapper(content, defs):
+    """
+    Processes the content with csv.reader and the RowMapper.
+
+    :param content: the CSV content
+    :type content: str
+    :param defs: the column definitions
+    :type defs: list
+    :return: the number of rows processed
+    :rtype: int
+    """
+
+    reader = csv_reader(StringIO(content))
+    mapper = RowMapper(next(reader), defs)
+    count = 0
+    for row in reader:
+        mapper.map(row)
+        count += 1
+    return count
+
+
+def main(rows=20000, columns=150, repeat=3):
+    """
+    Runs the benchmark and outputs the best time of each approach.
+
+    :param rows: the number of rows to generate
+    :type rows: int
+    :param columns: the number of columns to generate
+    :type columns: int
+    :param repeat: how often to repeat each measurement
+    :type repeat: int
+    """
+
+    content, defs = generate(rows, columns)
+    results = dict()
+    for name, func in [('cells', run_cells), ('mapper', run_mapper)]:
+        best = None
+        for i in range(repeat):
+            start = time.perf_counter()
+            func(content, defs)
+            duration = time.perf_counter() - start
+            if (best is None) or (duration < best):
+                best = duration
+        results[name] = best
+        print("%-7s %8.3fs  %10.0f rows/s" % (name, best, rows / best))
+    print("speedup %8.2fx" % (results['cells'] / results['mapper']))
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:3]])
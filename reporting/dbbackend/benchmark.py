@@ -0,0 +1,298 @@
+from django.db import connection, connections
+from django.db.backends.utils import CursorWrapper
+from dbbackend import dbimport, synthetic
+from dbbackend.dimensions import rebuild_dimensions
+from dbbackend.models import GradeResults, CourseDefs
+from reporting.tempfile_utils import gettempdir
+from collections import OrderedDict
+import multiprocessing
+import traceback
+import resource
+import json
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+BENCHMARK_YEAR = 1900
+""" the year that the grade results and course definitions get imported for """
+
+BENCHMARKS = OrderedDict([
+    ('graderesults', "grade results"),
+    ('graderesults_differential', "grade results (differential, unchanged)"),
+    ('coursedefs', "course definitions"),
+    ('supervisors', "supervisors"),
+    ('scholarships', "scholarships"),
+    ('associatedrole', "associated role"),
+])
+""" the available benchmarks and their descriptions """
+
+EXTENSIONS = {'gzip': '.gz', 'bz2': '.bz2', 'xz': '.xz', 'zstd': '.zst'}
+""" the file extensions of the compressions """
+
+
+class CountingCursorWrapper(CursorWrapper):
+    """
+    Cursor wrapper that counts the statements that get executed (including COPY), without logging them.
+    """
+
+    def __init__(self, cursor, db, counter):
+        """
+        Initializes the wrapper.
+
+        :param cursor: the cursor to wrap
+        :param db: the database wrapper
+        :param counter: the single-element list to increment
+        :type counter: list
+        """
+
+        super(CountingCursorWrapper, self).__init__(cursor, db)
+        self.counter = counter
+
+    def execute(self, sql, params=None):
+        self.counter[0] += 1
+        return super(CountingCursorWrapper, self).execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.counter[0] += 1
+        return super(CountingCursorWrapper, self).executemany(sql, param_list)
+
+    def copy_expert(self, sql, file, *args):
+        self.counter[0] += 1
+        return self.cursor.copy_expert(sql, file, *args)
+
+
+def count_queries():
+    """
+    Makes the default connection count the statements it executes.
+
+    :return: the single-element list with the number of statements
+    :rtype: list
+    """
+
+    counter = [0]
+
+    def make_cursor(cursor):
+        return CountingCursorWrapper(cursor, connection, counter)
+
+    connection.make_cursor = make_cursor
+    connection.make_debug_cursor = make_cursor
+    return counter
+
+
+def generate(name, path, rows, compression=None, seed=1):
+    """
+    Generates the synthetic export for the benchmark.
+
+    :param name: the benchmark, see BENCHMARKS
+    :type name: str
+    :param path: the file to write to
+    :type path: str
+    :param rows: the number of rows to generate
+    :type rows: int
+    :param compression: the compression to apply (gzip, bz2, xz, zstd), None for uncompressed
+    :type compression: str
+    :param seed: the seed for the random number generator
+    :type seed: int
+    """
+
+    if name.startswith('graderesults'):
+        synthetic.generate_grade_results(path, rows, BENCHMARK_YEAR, compression=compression, seed=seed)
+    elif name == 'coursedefs':
+        synthetic.generate_coursedefs(path, rows, compression=compression, seed=seed)
+    elif name == 'supervisors':
+        synthetic.generate_supervisors(path, rows, compression=compression, seed=seed)
+    elif name == 'scholarships':
+        synthetic.generate_scholarships(path, rows, compression=compression, seed=seed)
+    elif name == 'associatedrole':
+        synthetic.generate_associatedrole(path, rows, compression=compression, seed=seed)
+    else:
+        raise Exception("Unknown benchmark: %s" % name)
+
+
+def run_import(name, path):
+    """
+    Runs the import of the benchmark.
+
+    :param name: the benchmark, see BENCHMARKS
+    :type name: str
+    :param path: the file to import
+    :type path: str
+    :return: None if successful, otherwise error message
+    :rtype: str
+    """
+
+    if name == 'graderesults':
+        return dbimport.import_grade_results(BENCHMARK_YEAR, path, 'utf-8', delete=False, resume=False)
+    elif name == 'graderesults_differential':
+        return dbimport.import_grade_results_differential(BENCHMARK_YEAR, path, 'utf-8', delete=False)
+    elif name == 'coursedefs':
+        return dbimport.import_coursedefs(BENCHMARK_YEAR, path, 'utf-8', delete=False)
+    elif name == 'supervisors':
+        return dbimport.import_supervisors(path, 'utf-8', delete=False)
+    elif name == 'scholarships':
+        return dbimport.import_scholarships(path, 'utf-8', delete=False)
+    elif name == 'associatedrole':
+        return dbimport.import_associatedrole(path, 'utf-8', delete=False)
+    raise Exception("Unknown benchmark: %s" % name)
+
+
+def measure(name, path, conn):
+    """
+    Runs the import of the benchmark and sends the measurements through the pipe,
+    to be executed in its own process (peak RSS is per process).
+
+    :param name: the benchmark, see BENCHMARKS
+    :type name: str
+    :param path: the file to import
+    :type path: str
+    :param conn: the pipe to send the measurements (dict) through
+    :type conn: Connection
+    """
+
+    try:
+        counter = count_queries()
+        start = time.perf_counter()
+        msg = run_import(name, path)
+        duration = time.perf_counter() - start
+        # ru_maxrss is in kilobytes on Linux
+        conn.send({'error': msg, 'duration': duration, 'queries': counter[0],
+                   'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024})
+    except Exception:
+        conn.send({'error': traceback.format_exc()})
+    finally:
+        connections.close_all()
+
+
+def run_benchmark(name, rows, workdir=None, compression=None, seed=1):
+    """
+    Generates the synthetic export and measures its import in a separate process.
+
+    :param name: the benchmark, see BENCHMARKS
+    :type name: str
+    :param rows: the number of rows to generate
+    :type rows: int
+    :param workdir: the directory for the generated files, uses the temp directory if None
+    :type workdir: str
+    :param compression: the compression to apply to the export (gzip, bz2, xz, zstd), None for uncompressed
+    :type compression: str
+    :param seed: the seed for the random number generator
+    :type seed: int
+    :return: the measurements (name, rows, duration, rows_per_sec, peak_rss, queries, error)
+    :rtype: dict
+    """
+
+    if workdir is None:
+        workdir = gettempdir()
+    # the differential benchmark re-imports the grade results file
+    base = 'graderesults' if name.startswith('graderesults') else name
+    path = os.path.join(workdir, "benchmark-%s-%d.csv%s" % (base, rows, EXTENSIONS.get(compression, "")))
+    if not os.path.exists(path):
+        generate(name, path, rows, compression=compression, seed=seed)
+    # the import process must not share the connection of this process
+    connections.close_all()
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.get_context('fork').Process(target=measure, args=(name, path, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {'error': "Benchmark process died"}
+    process.join()
+    if result['error'] is not None:
+        result['error'] = result['error'].strip()
+    result['name'] = name
+    result['rows'] = rows
+    if result.get('duration'):
+        result['rows_per_sec'] = rows / result['duration']
+    else:
+        result['rows_per_sec'] = None
+    return result
+
+
+def cleanup():
+    """
+    Removes the grade results and course definitions of the benchmark year.
+    """
+
+    GradeResults.objects.all().filter(year=BENCHMARK_YEAR).delete()
+    CourseDefs.objects.all().filter(year=BENCHMARK_YEAR).delete()
+    rebuild_dimensions(GradeResults._meta.db_table)
+
+
+def baseline_key(name, rows):
+    """
+    Generates the key for the benchmark in the baseline, specific to the database backend.
+
+    :param name: the benchmark
+    :type name: str
+    :param rows: the number of rows
+    :type rows: int
+    :return: the key
+    :rtype: str
+    """
+
+    return "%s:%s:%d" % (connection.vendor, name, rows)
+
+
+def load_baseline(path):
+    """
+    Loads the baseline throughputs.
+
+    :param path: the JSON file with the baseline, can be missing
+    :type path: str
+    :return: the dictionary of key (see baseline_key) and rows per second
+    :rtype: dict
+    """
+
+    if (path is None) or not os.path.exists(path):
+        return dict()
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, baseline, results):
+    """
+    Stores the throughputs of the successful benchmarks in the baseline.
+
+    :param path: the JSON file to write
+    :type path: str
+    :param baseline: the current baseline
+    :type baseline: dict
+    :param results: the measurements
+    :type results: list
+    """
+
+    for result in results:
+        if result['error'] is None:
+            baseline[baseline_key(result['name'], result['rows'])] = result['rows_per_sec']
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def regressions(baseline, results, tolerance):
+    """
+    Determines the benchmarks whose throughput fell below the baseline by more than the tolerance.
+
+    :param baseline: the baseline throughputs
+    :type baseline: dict
+    :param results: the measurements
+    :type results: list
+    :param tolerance: the fraction the throughput may drop (eg 0.2 for 20%)
+    :type tolerance: float
+    :return: the list of messages, empty if none regressed
+    :rtype: list
+    """
+
+    result = []
+    for r in results:
+        key = baseline_key(r['name'], r['rows'])
+        if (r['error'] is not None) or (key not in baseline):
+            continue
+        if r['rows_per_sec'] < baseline[key] * (1.0 - tolerance):
+            result.append("%s: %.0f rows/s, baseline %.0f rows/s (-%.0f%%)"
+                          % (key, r['rows_per_sec'], baseline[key], 100.0 * (1.0 - r['rows_per_sec'] / baseline[key])))
+    return result
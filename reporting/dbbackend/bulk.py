@@ -0,0 +1,181 @@
+from django.db import connection, transaction
+from django.db.models import AutoField
+import reporting.settings
+from io import StringIO
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+PLAIN_TYPES = ['CharField', 'TextField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+               'PositiveIntegerField', 'FloatField', 'BooleanField', 'NullBooleanField', 'DateField']
+""" the field types whose values can be passed to COPY without preparing them first """
+
+INTEGER_TYPES = ['IntegerField', 'BigIntegerField', 'SmallIntegerField', 'PositiveIntegerField']
+""" the field types that need float values truncated (as the ORM does), eg 15.0 from float_value """
+
+
+def copy_value(value):
+    """
+    Turns the value into a cell for a CSV-formatted COPY FROM STDIN statement.
+    None values are output as unquoted empty cells (= NULL), strings are always
+    quoted to distinguish empty strings from NULL.
+
+    :param value: the value to convert
+    :type value: object
+    :return: the cell content
+    :rtype: str
+    """
+
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def use_copy():
+    """
+    Checks whether COPY FROM STDIN can be used for bulk writes, i.e., if it is
+    enabled and the database backend is PostgreSQL (psycopg2).
+
+    :return: True if COPY can be used
+    :rtype: bool
+    """
+
+    return reporting.settings.IMPORT_USE_COPY and (connection.vendor == 'postgresql')
+
+
+class BulkWriter(object):
+    """
+    Collects model instances and writes them to the database in batches. Uses
+    COPY FROM STDIN with PostgreSQL and bulk_create for all other backends.
+    Rows can be written to a table other than the model's (eg a staging table
+    with the same layout).
+    """
+
+    def __init__(self, model, batch_size=None, progress=None, table=None, checkpoint=None):
+        """
+        Initializes the writer.
+
+        :param model: the model class of the instances to write
+        :type model: type
+        :param batch_size: the number of rows per batch, uses IMPORT_BATCH_SIZE if None
+        :type batch_size: int
+        :param progress: the (optional) function to call with the number of rows written after each batch
+        :type progress: function
+        :param table: the table to write to, uses the model's table if None
+        :type table: str
+        :param checkpoint: the (optional) function to call with the number of rows written, inside the transaction of the batch
+        :type checkpoint: function
+        """
+
+        if batch_size is None:
+            batch_size = reporting.settings.IMPORT_BATCH_SIZE
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.progress = progress
+        self.checkpoint = checkpoint
+        self.table = model._meta.db_table if table is None else table
+        self.use_copy = use_copy()
+        self.fields = [f for f in model._meta.concrete_fields if not isinstance(f, AutoField)]
+        self.plain = [f.get_internal_type() in PLAIN_TYPES for f in self.fields]
+        self.integer = [f.get_internal_type() in INTEGER_TYPES for f in self.fields]
+        self.pending = []
+        self.count = 0
+        self.elapsed = 0.0
+
+    def add(self, obj):
+        """
+        Adds the model instance, writes the batch if full.
+
+        :param obj: the instance to add
+        :type obj: object
+        """
+
+        self.pending.append(obj)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def copy(self, objs):
+        """
+        Writes the instances using COPY FROM STDIN.
+
+        :param objs: the instances to write
+        :type objs: list
+        """
+
+        fields = list(zip(self.fields, self.plain, self.integer))
+        buf = StringIO()
+        for obj in objs:
+            cells = []
+            for f, plain, integer in fields:
+                value = getattr(obj, f.attname)
+                if not plain:
+                    value = f.get_db_prep_save(value, connection)
+                elif integer and isinstance(value, float):
+                    value = int(value)
+                cells.append(copy_value(value))
+            buf.write(','.join(cells))
+            buf.write('\n')
+        buf.seek(0)
+        sql = "COPY %s (%s) FROM STDIN WITH (FORMAT csv)" % (
+            connection.ops.quote_name(self.table),
+            ','.join([connection.ops.quote_name(f.column) for f in self.fields]))
+        with connection.cursor() as cursor:
+            cursor.copy_expert(sql, buf)
+
+    def insert(self, objs):
+        """
+        Writes the instances using INSERT statements (executemany), used when
+        writing to a table other than the model's without COPY.
+
+        :param objs: the instances to write
+        :type objs: list
+        """
+
+        sql = "INSERT INTO %s (%s) VALUES (%s)" % (
+            connection.ops.quote_name(self.table),
+            ','.join([connection.ops.quote_name(f.column) for f in self.fields]),
+            ','.join(['%s'] * len(self.fields)))
+        params = [[f.get_db_prep_save(getattr(obj, f.attname), connection) for f in self.fields] for obj in objs]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def flush(self):
+        """
+        Writes all pending instances to the database.
+        """
+
+        if len(self.pending) == 0:
+            return
+        start = time.perf_counter()
+        with transaction.atomic():
+            if self.use_copy:
+                self.copy(self.pending)
+            elif self.table != self.model._meta.db_table:
+                self.insert(self.pending)
+            else:
+                self.model.objects.bulk_create(self.pending)
+            if self.checkpoint is not None:
+                self.checkpoint(self.count + len(self.pending))
+        self.count += len(self.pending)
+        self.elapsed += time.perf_counter() - start
+        logger.debug("%s: wrote %d rows" % (self.table, self.count))
+        self.pending = []
+        if self.progress is not None:
+            self.progress(self.count)
+
+    def close(self):
+        """
+        Writes any remaining instances.
+
+        :return: the total number of rows written
+        :rtype: int
+        """
+
+        self.flush()
+        return self.count
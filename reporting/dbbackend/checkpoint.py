@@ -0,0 +1,228 @@
+from dbbackend.models import ImportJob
+from django.db import connection
+from reporting.tempfile_utils import gettempdir
+from csv import writer as csv_writer, reader as csv_reader
+import hashlib
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+FINGERPRINT_HEAD = 1024 * 1024
+""" the number of bytes at the start of a file to use for the fingerprint """
+
+
+def file_fingerprint(path):
+    """
+    Generates a fingerprint for the file from its size and the SHA-1 of its start,
+    for recognizing an uploaded file again without reading all of it.
+
+    :param path: the file to generate the fingerprint for
+    :type path: str
+    :return: the fingerprint
+    :rtype: str
+    """
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        sha1.update(f.read(FINGERPRINT_HEAD))
+    return "%s-%d" % (sha1.hexdigest(), os.path.getsize(path))
+
+
+def table_exists(table):
+    """
+    Checks whether the table exists.
+
+    :param table: the name of the table
+    :type table: str
+    :return: True if the table exists
+    :rtype: bool
+    """
+
+    with connection.cursor() as cursor:
+        return table in connection.introspection.table_names(cursor)
+
+
+def find_import_job(table, year, fingerprint):
+    """
+    Returns the most recent failed (or interrupted) import of the same file
+    that got past its first checkpoint.
+
+    :param table: the table being imported
+    :type table: str
+    :param year: the year being imported, None if not year-based
+    :type year: int
+    :param fingerprint: the fingerprint of the file being imported
+    :type fingerprint: str
+    :return: the job, None if nothing to resume
+    :rtype: ImportJob
+    """
+
+    jobs = ImportJob.objects.all().filter(table=table, year=year, fingerprint=fingerprint,
+                                          status__in=['failed', 'running'], written__gt=0).order_by('-id')
+    for job in jobs:
+        return job
+    return None
+
+
+def abandon_import_jobs(table, year, job, staging=None):
+    """
+    Marks all other unfinished imports of the table/year as abandoned and removes their staging tables.
+
+    :param table: the table being imported
+    :type table: str
+    :param year: the year being imported, None if not year-based
+    :type year: int
+    :param job: the job that is being run
+    :type job: ImportJob
+    :param staging: the staging table in use by the job, not to be removed
+    :type staging: str
+    """
+
+    jobs = ImportJob.objects.all().filter(table=table, year=year, status__in=['failed', 'running']).exclude(id=job.id)
+    for other in jobs:
+        if (other.staging is not None) and (other.staging != staging) and table_exists(other.staging):
+            with connection.cursor() as cursor:
+                cursor.execute("DROP TABLE %s" % other.staging)
+        other.status = 'abandoned'
+        other.save()
+
+
+def rejects_filename(table, year, fingerprint):
+    """
+    Generates the name of the file for storing rejected rows, the same for all attempts to import the file.
+
+    :param table: the table being imported
+    :type table: str
+    :param year: the year being imported, None if not year-based
+    :type year: int
+    :param fingerprint: the fingerprint of the file being imported
+    :type fingerprint: str
+    :return: the file name
+    :rtype: str
+    """
+
+    return os.path.join(gettempdir(), "%s-%s-%s.rejects.csv" % (table, str(year), fingerprint[:12]))
+
+
+class OffsetLineReader(object):
+    """
+    Iterates the lines of a binary file, decoding them on the fly and keeping
+    track of the byte offset after the last line, to be used with csv.reader.
+    Encodings that don't represent a newline with a single 0x0A byte (eg UTF-16)
+    are not supported.
+    """
+
+    def __init__(self, fileobj, encoding):
+        """
+        Initializes the reader.
+
+        :param fileobj: the binary file to read from
+        :type fileobj: file
+        :param encoding: the file encoding (eg utf-8)
+        :type encoding: str
+        """
+
+        self.fileobj = fileobj
+        self.encoding = encoding
+        self.offset = 0
+
+    def seek(self, offset):
+        """
+        Continues reading at the specified byte offset.
+
+        :param offset: the offset
+        :type offset: int
+        """
+
+        self.fileobj.seek(offset)
+        self.offset = offset
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.fileobj.readline()
+        if len(line) == 0:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode(self.encoding)
+
+
+class RejectWriter(object):
+    """
+    Appends rows that failed to import to a CSV file, along with row number and error.
+    """
+
+    def __init__(self, filename, header, keep=0):
+        """
+        Initializes the writer, the file only gets created with the first rejected row.
+        Rows of a previous attempt beyond the ones to keep get removed, as a resumed
+        import rejects the rows after its last checkpoint again.
+
+        :param filename: the file to write to
+        :type filename: str
+        :param header: the header of the imported file
+        :type header: list
+        :param keep: the number of rejected rows of the previous attempt to keep (up to its last checkpoint)
+        :type keep: int
+        """
+
+        self.filename = filename
+        self.header = header
+        self.fileobj = None
+        self.writer = None
+        if os.path.exists(filename):
+            self.truncate(keep)
+
+    def truncate(self, keep):
+        """
+        Keeps only the header and the specified number of rejected rows in the file.
+
+        :param keep: the number of rejected rows to keep
+        :type keep: int
+        """
+
+        if keep == 0:
+            os.remove(self.filename)
+            return
+        with open(self.filename, newline='', encoding='utf-8') as f:
+            rows = []
+            for row in csv_reader(f):
+                rows.append(row)
+                if len(rows) > keep:
+                    break
+        with open(self.filename, 'w', newline='', encoding='utf-8') as f:
+            csv_writer(f).writerows(rows)
+
+    def write(self, row_number, row, error):
+        """
+        Writes the rejected row.
+
+        :param row_number: the number of the row (1-based, excluding header)
+        :type row_number: int
+        :param row: the cells of the row
+        :type row: list
+        :param error: the reason for rejecting it
+        :type error: str
+        """
+
+        if self.writer is None:
+            exists = os.path.exists(self.filename)
+            self.fileobj = open(self.filename, 'a', newline='', encoding='utf-8')
+            self.writer = csv_writer(self.fileobj)
+            if not exists:
+                self.writer.writerow(['row', 'error'] + self.header)
+        self.writer.writerow([row_number, error] + row)
+        self.fileobj.flush()
+
+    def close(self):
+        """
+        Closes the file, if opened.
+        """
+
+        if self.fileobj is not None:
+            self.fileobj.close()
+            self.fileobj = None
+            self.writer = None
@@ -0,0 +1,102 @@
+from django.core.management.base import BaseCommand, CommandError
+from dbbackend import jobs
+import reporting.settings
+import logging
+import os
+
+
+class ImportCommand(BaseCommand):
+    """
+    Base class for the commands that run imports from the shell (eg cron),
+    outputting the log messages of the imports (including their progress)
+    and failing with a non-zero exit code if the import fails.
+    """
+
+    job_type = None
+    """ the job type that must not be active at the same time, see jobs.HANDLERS """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default=None, help='the email address to send a notification to')
+        parser.add_argument('--force', action='store_true',
+                            help='run even if a job of the same type is queued or running in the background')
+
+    def add_file_arguments(self, parser):
+        """
+        Adds the arguments for the file to import and its encoding.
+
+        :param parser: the parser to add the arguments to
+        :type parser: ArgumentParser
+        """
+
+        parser.add_argument('file', help='the CSV file to import, can be compressed (gzip, bz2, xz, zstd)')
+        parser.add_argument('--encoding', default='utf-8', help='the file encoding (default: utf-8)')
+
+    def setup_logging(self, verbosity):
+        """
+        Outputs the log messages of the imports on stdout.
+
+        :param verbosity: the verbosity of the command (0: warnings, 1: progress, 2+: debug)
+        :type verbosity: int
+        """
+
+        handler = logging.StreamHandler(self.stdout)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        logger = logging.getLogger('dbbackend')
+        logger.addHandler(handler)
+        if verbosity == 0:
+            logger.setLevel(logging.WARNING)
+        elif verbosity == 1:
+            logger.setLevel(logging.INFO)
+        else:
+            logger.setLevel(logging.DEBUG)
+
+    def check_import(self, options):
+        """
+        Checks whether the import can be run.
+
+        :param options: the options of the command
+        :type options: dict
+        """
+
+        if ('file' in options) and not os.path.isfile(options['file']):
+            raise CommandError("File does not exist: %s" % options['file'])
+        if (self.job_type is not None) and not options['force'] and jobs.is_active(self.job_type):
+            raise CommandError("A '%s' job is queued or running, use --force to run anyway!" % self.job_type)
+
+    def run(self, options):
+        """
+        Runs the import.
+
+        :param options: the options of the command
+        :type options: dict
+        :return: None if successful, otherwise error message
+        :rtype: str
+        """
+
+        raise NotImplementedError()
+
+    def handle(self, *args, **options):
+        self.setup_logging(options['verbosity'])
+        self.check_import(options)
+        msg = self.run(options)
+        if msg is not None:
+            raise CommandError(msg)
+        if options['verbosity'] > 0:
+            self.stdout.write("Finished")
+
+
+def set_workers(name, workers):
+    """
+    Overrides the number of processes setting for this run.
+
+    :param name: the name of the setting (eg IMPORT_PARSE_WORKERS)
+    :type name: str
+    :param workers: the number of processes, ignored if None
+    :type workers: int
+    """
+
+    if workers is None:
+        return
+    if workers < 1:
+        raise CommandError("The number of processes must be at least 1!")
+    setattr(reporting.settings, name, workers)
@@ -0,0 +1,243 @@
+from queue import Queue, Full
+import threading
+import gzip
+import bz2
+import lzma
+import io
+import reporting.settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC_BYTES = [
+    ('gzip', b'\x1f\x8b'),
+    ('bz2', b'BZh'),
+    ('xz', b'\xfd7zXZ\x00'),
+    ('zstd', b'\x28\xb5\x2f\xfd'),
+]
+""" the compression formats and the magic bytes their files start with """
+
+
+def detect_compression(path):
+    """
+    Determines the compression of the file from its magic bytes.
+
+    :param path: the file to check
+    :type path: str
+    :return: the compression (gzip, bz2, xz, zstd), None if not compressed
+    :rtype: str
+    """
+
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    for codec, magic in MAGIC_BYTES:
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def decompressor(fileobj, codec):
+    """
+    Wraps the binary file in a stream that decompresses it.
+
+    :param fileobj: the compressed file
+    :type fileobj: file
+    :param codec: the compression, see detect_compression
+    :type codec: str
+    :return: the decompressing stream
+    :rtype: file
+    """
+
+    if codec == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if codec == 'bz2':
+        return bz2.BZ2File(fileobj, mode='rb')
+    if codec == 'xz':
+        return lzma.LZMAFile(fileobj, mode='rb')
+    if codec == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception("The 'zstandard' package is required for importing zstd compressed files!")
+        return zstandard.ZstdDecompressor().stream_reader(fileobj)
+    raise Exception("Unsupported compression: %s" % codec)
+
+
+class DecompressingReader(io.RawIOBase):
+    """
+    Decompresses a file in a separate thread, which feeds a bounded buffer of
+    IMPORT_DECOMPRESS_BLOCKS blocks of IMPORT_DECOMPRESS_BLOCK_SIZE bytes. This
+    way decompression (zlib, bz2 and lzma release the GIL) overlaps with parsing
+    and writing the rows. Only supports seeking forward, by reading and
+    discarding the data up to the offset (eg when resuming an import).
+    """
+
+    def __init__(self, fileobj, codec, block_size=None, blocks=None):
+        """
+        Initializes the reader and starts the decompression thread.
+
+        :param fileobj: the compressed binary file, gets closed along with the reader
+        :type fileobj: file
+        :param codec: the compression, see detect_compression
+        :type codec: str
+        :param block_size: the number of bytes to decompress at a time, uses IMPORT_DECOMPRESS_BLOCK_SIZE if None
+        :type block_size: int
+        :param blocks: the number of decompressed blocks to buffer, uses IMPORT_DECOMPRESS_BLOCKS if None
+        :type blocks: int
+        """
+
+        super(DecompressingReader, self).__init__()
+        if block_size is None:
+            block_size = reporting.settings.IMPORT_DECOMPRESS_BLOCK_SIZE
+        if blocks is None:
+            blocks = reporting.settings.IMPORT_DECOMPRESS_BLOCKS
+        self.fileobj = fileobj
+        self.codec = codec
+        self.stream = decompressor(fileobj, codec)
+        self.block_size = max(1, block_size)
+        self.queue = Queue(maxsize=max(1, blocks))
+        self.stopped = threading.Event()
+        self.current = b''
+        self.index = 0
+        self.position = 0
+        self.eof = False
+        self.thread = threading.Thread(target=self.decompress, name="decompress-" + codec, daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        """
+        Adds the item to the buffer, waiting for space unless the reader got closed.
+
+        :param item: the block or exception to add
+        :type item: object
+        """
+
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except Full:
+                pass
+
+    def decompress(self):
+        """
+        Decompresses the blocks, executed by the thread. An empty block marks
+        the end of the data, exceptions get passed on to the reading thread.
+        """
+
+        try:
+            while not self.stopped.is_set():
+                block = self.stream.read(self.block_size)
+                self.put(block)
+                if len(block) == 0:
+                    return
+        except Exception as ex:
+            self.put(ex)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, b):
+        while self.index >= len(self.current):
+            if self.eof:
+                return 0
+            item = self.queue.get()
+            if isinstance(item, Exception):
+                self.eof = True
+                raise item
+            if len(item) == 0:
+                self.eof = True
+                return 0
+            self.current = item
+            self.index = 0
+        n = min(len(b), len(self.current) - self.index)
+        b[:n] = self.current[self.index:self.index + n]
+        self.index += n
+        self.position += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("Can only seek relative to start or current position in compressed files")
+        if offset < self.position:
+            raise io.UnsupportedOperation("Cannot seek backwards in compressed files")
+        buf = bytearray(self.block_size)
+        while self.position < offset:
+            if self.readinto(memoryview(buf)[:min(len(buf), offset - self.position)]) == 0:
+                break
+        return self.position
+
+    def close(self):
+        if self.closed:
+            return
+        self.stopped.set()
+        # unblock the thread if waiting for space
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.thread.join()
+        try:
+            self.stream.close()
+        finally:
+            self.fileobj.close()
+            super(DecompressingReader, self).close()
+
+
+def open_binary(path):
+    """
+    Opens the file for reading bytes, decompressing it in a separate thread if
+    compressed (see detect_compression).
+
+    :param path: the file to open
+    :type path: str
+    :return: the (buffered) binary file
+    :rtype: file
+    """
+
+    codec = detect_compression(path)
+    if codec is None:
+        return open(path, mode='rb')
+    logger.info("Decompressing %s (%s)" % (path, codec))
+    return io.BufferedReader(DecompressingReader(open(path, mode='rb'), codec))
+
+
+def open_text(path, encoding=None):
+    """
+    Opens the file for reading text, decompressing it in a separate thread if
+    compressed (see detect_compression).
+
+    :param path: the file to open
+    :type path: str
+    :param encoding: the file encoding (eg utf-8), uses the platform default if None
+    :type encoding: str
+    :return: the text file
+    :rtype: file
+    """
+
+    return io.TextIOWrapper(open_binary(path), encoding=encoding)
+
+
+def source_file(fileobj):
+    """
+    Returns the file that is actually being read from disk, i.e., the compressed
+    file of a file opened via open_binary or open_text, for tracking the progress.
+
+    :param fileobj: the file opened via open_binary or open_text
+    :type fileobj: file
+    :return: the underlying file
+    :rtype: file
+    """
+
+    if isinstance(fileobj, io.TextIOWrapper):
+        fileobj = fileobj.buffer
+    if isinstance(fileobj, io.BufferedReader) and isinstance(fileobj.raw, DecompressingReader):
+        return fileobj.raw.fileobj
+    return fileobj
@@ -1,16 +1,36 @@
-from dbbackend.models import GradeResults, TableStatus, CourseDefs
-from supervisors.models import Supervisors, StudentDates, Scholarship, AssociatedRole
-from reporting.db import truncate_strings, encode_strings, string_cell, int_cell, float_cell, bool_cell
+from dbbackend.models import GradeResults, TableStatus, CourseDefs, ImportJob
+from supervisors.models import Supervisors, StudentDates, StudentDatesPending, Scholarship, AssociatedRole
+from reporting.db import RowMapper, REQUIRED, int_value, float_value, bool_value
 from csv import DictReader
-import gzip
+from csv import reader as csv_reader
+import hashlib
 import traceback
 import sys
 import re
 import os
+import time
 from datetime import datetime
-from django.db import connection
+from collections import OrderedDict
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from django.db import connection, connections, transaction
+from django.db.models import Max, F
 from maintenance_mode.core import set_maintenance_mode
 from reporting.email_utils import send_email
+from dbbackend.bulk import BulkWriter
+from dbbackend.partitions import is_partitioned, partition_name, create_staging, swap_partition, drop_staging
+from dbbackend.shadow import ShadowTable, use_shadow_tables
+from dbbackend.merge import MergeWriter
+from dbbackend.indexes import drop_indexes, create_indexes
+from dbbackend.checkpoint import file_fingerprint, table_exists, find_import_job, abandon_import_jobs, rejects_filename
+from dbbackend.checkpoint import OffsetLineReader, RejectWriter
+from dbbackend.progress import ImportProgress, set_tablestatus
+from dbbackend.profiling import ImportProfile, TimedFile
+from dbbackend.parallel import parse_workers, parse_pool, split_file, read_chunks, read_range, ordered_map
+from dbbackend.compression import open_binary, open_text, source_file
+from dbbackend.dimensions import rebuild_dimensions
+from supervisors.namesearch import update_name_index
+import reporting.settings
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,26 +72,78 @@ def fix_org_unit(unit):
     return unit
 
 
-def parse_grade_results_date(name, value):
+class DateCache(object):
     """
-    Parses the various date formats of the grade results.
-    :param name: the field name
+    Bounded cache for parsed date values of a single import, keyed by format and value.
+    Once full, new values still get parsed, but are no longer stored.
+    """
+
+    def __init__(self, max_size=None):
+        """
+        Initializes the cache.
+
+        :param max_size: the maximum number of entries, uses IMPORT_DATE_CACHE_SIZE if None
+        :type max_size: int
+        """
+
+        if max_size is None:
+            max_size = reporting.settings.IMPORT_DATE_CACHE_SIZE
+        self.max_size = max_size
+        self.values = dict()
+        self.hits = 0
+        self.misses = 0
+        self.elapsed = 0.0
+
+    def parse(self, name, value, dformat):
+        """
+        Returns the parsed date, parses and stores it if not yet present.
+
+        :param name: the field name (for logging)
+        :type name: str
+        :param value: the value to parse
+        :type value: str
+        :param dformat: the date format
+        :type dformat: str
+        :return: the fixed date, None if failed to parse
+        :rtype: str
+        """
+
+        key = (dformat, value)
+        if key in self.values:
+            self.hits += 1
+            return self.values[key]
+        self.misses += 1
+        start = time.perf_counter()
+        result = convert_date(name, value, dformat)
+        self.elapsed += time.perf_counter() - start
+        if len(self.values) < self.max_size:
+            self.values[key] = result
+        return result
+
+    def log(self, table):
+        """
+        Logs the hit/miss statistics of the cache.
+
+        :param table: the table that was imported
+        :type table: str
+        """
+
+        logger.info("%s: date cache hits=%d, misses=%d, size=%d" % (table, self.hits, self.misses, len(self.values)))
+
+
+def convert_date(name, value, dformat):
+    """
+    Turns the date string into the YYYY-MM-DD format.
+
+    :param name: the field name (for logging)
     :type name: str
     :param value: the value to parse
     :type value: str
-    :return: the fixed date
+    :param dformat: the date format of the value
+    :type dformat: str
+    :return: the fixed date, None if failed to parse
     :rtype: str
     """
-    if value == "" or value is None:
-        return "0001-01-01"
-    if name == "achievement_date":
-        dformat = "%m/%d/%y"
-    elif name == "query_date":
-        dformat = "%d %B %Y"
-    elif name in ["dateofbirth", "dateofdeath", "occurrence_startdate", "occurrence_enddate", "award_completion_date", "award_completion_confirmed_date"]:
-        dformat = "%d-%b-%Y"
-    else:
-        dformat = "%d/%m/%y"
     try:
         d = datetime.strptime(value, dformat)
         return d.strftime("%Y-%m-%d")
@@ -80,233 +152,660 @@ def parse_grade_results_date(name, value):
         return None
 
 
-def queue_import_grade_results(year, csv, isgzip, encoding, email=None):
+def parse_date(name, value, dformat, cache=None):
+    """
+    Parses the date using the cache, if supplied.
+
+    :param name: the field name (for logging)
+    :type name: str
+    :param value: the value to parse
+    :type value: str
+    :param dformat: the date format of the value
+    :type dformat: str
+    :param cache: the (optional) cache to use
+    :type cache: DateCache
+    :return: the fixed date, None if failed to parse
+    :rtype: str
+    """
+    if cache is None:
+        return convert_date(name, value, dformat)
+    return cache.parse(name, value, dformat)
+
+
+GRADE_RESULTS_DATE_FORMATS = {
+    "achievement_date": "%m/%d/%y",
+    "query_date": "%d %B %Y",
+    "dateofbirth": "%d-%b-%Y",
+    "dateofdeath": "%d-%b-%Y",
+    "occurrence_startdate": "%d-%b-%Y",
+    "occurrence_enddate": "%d-%b-%Y",
+    "award_completion_date": "%d-%b-%Y",
+    "award_completion_confirmed_date": "%d-%b-%Y",
+}
+""" the date formats of the grade results per field name, all others use %d/%m/%y """
+
+
+def parse_grade_results_date(name, value, cache=None):
+    """
+    Parses the various date formats of the grade results.
+    :param name: the field name
+    :type name: str
+    :param value: the value to parse
+    :type value: str
+    :param cache: the (optional) cache to use
+    :type cache: DateCache
+    :return: the fixed date
+    :rtype: str
+    """
+    if value == "" or value is None:
+        return "0001-01-01"
+    return parse_date(name, value, GRADE_RESULTS_DATE_FORMATS.get(name, "%d/%m/%y"), cache=cache)
+
+
+def grade_results_date(name, cache=None):
+    """
+    Returns a converter for the date column of the grade results.
+    The date format is determined once, rather than for every value.
+
+    :param name: the field name
+    :type name: str
+    :param cache: the (optional) cache to use
+    :type cache: DateCache
+    :return: the function that parses the value
+    :rtype: function
+    """
+    dformat = GRADE_RESULTS_DATE_FORMATS.get(name, "%d/%m/%y")
+
+    def parse(value):
+        if value == "" or value is None:
+            return "0001-01-01"
+        return parse_date(name, value, dformat, cache=cache)
+
+    return parse
+
+
+def grade_results_columns(cache=None):
+    """
+    Returns the column definitions of the grade results (name, aliases, converter, default value).
+
+    :param cache: the (optional) cache for the date columns
+    :type cache: DateCache
+    :return: the column definitions
+    :rtype: list
+    """
+
+    return [
+        ('student_id', ['student_id'], None, None),
+        ('name', ['name'], None, None),
+        ('title', ['title'], None, None),
+        ('prefered_given_name', ['prefered_given_name'], None, ''),
+        ('given_name', ['given_name'], None, ''),
+        ('other_given_names', ['other_given_names'], None, ''),
+        ('family_name', ['family_name'], None, ''),
+        ('previous_name', ['previous_name'], None, None),
+        ('address1', ['address1', 'address_line_1'], None, None),
+        ('address2', ['address2', 'address_line_2'], None, None),
+        ('address2a', ['address2a'], None, None),
+        ('address2b', ['address2b'], None, None),
+        ('address3', ['address3', 'address_line_3'], None, None),
+        ('address4', ['address4', 'address_line_4'], None, None),
+        ('postcode', ['postcode', 'postal_area_code'], None, None),
+        ('telephone', ['telephone', 'perm_phone_number'], None, None),
+        ('cellphone', ['cellphone', 'perm_cellphone_number'], None, None),
+        ('email', ['email', 'perm_email_address'], None, None),
+        ('hasdisability', ['hasdisability'], int_value, None),
+        ('isdomestic', ['isdomestic', 'domestic_indicator'], int_value, None),
+        ('is_domiciled_locally', ['is_domiciled_locally'], int_value, None),
+        ('citizenship', ['citizenship'], None, None),
+        ('residency_status', ['residency_status'], None, None),
+        ('origin', ['origin'], None, None),
+        ('gender', ['gender'], None, None),
+        ('ethnicity', ['ethnicity'], None, None),
+        ('ethnic_group', ['ethnic_group'], None, None),
+        ('all_ethnicities_string', ['all_ethnicities_string'], None, None),
+        ('all_iwi_string', ['all_iwi_string'], None, None),
+        ('dateofbirth', ['dateofbirth', 'date_of_birth'], grade_results_date('dateofbirth', cache), '0001-01-01'),
+        ('dateofdeath', ['dateofdeath'], None, None),
+        ('waikato_1st', ['waikato_1st'], int_value, None),
+        ('nz_1st', ['nz_1st'], int_value, None),
+        ('last_year_sec', ['last_year_sec'], int_value, None),
+        ('sec_qual_year', ['sec_qual_year'], int_value, None),
+        ('last_sec_school', ['last_sec_school'], None, None),
+        ('last_sec_school_region', ['last_sec_school_region'], None, None),
+        ('highest_sec_qual', ['highest_sec_qual'], None, None),
+        ('main_activity', ['main_activity'], None, None),
+        ('award_title', ['award_title', 'award'], None, None),
+        ('prog_abbr', ['prog_abbr', 'prog_-_abbr'], None, None),
+        ('programme', ['programme'], None, None),
+        ('programme_type_code', ['programme_type_code'], None, None),
+        ('programme_type', ['programme_type'], None, None),
+        ('ishigherdegree', ['ishigherdegree'], int_value, None),
+        ('school_of_study', ['school_of_study'], None, None),
+        ('school_of_study_clevel', ['school_of_study_clevel'], fix_org_unit, None),
+        ('paper_master_code', ['paper_master_code', 'paper_master'], None, None),
+        ('paper_occurrence', ['paper_occurrence'], None, None),
+        ('paper_title', ['paper_title'], None, None),
+        ('occurrence_startdate', ['occurrence_startdate'], grade_results_date('occurrence_startdate', cache), '0001-01-01'),
+        ('occurrence_startyear', ['occurrence_startyear'], int_value, None),
+        ('occurrence_startweek', ['occurrence_startweek'], int_value, None),
+        ('occurrence_enddate', ['occurrence_enddate'], grade_results_date('occurrence_enddate', cache), '0001-01-01'),
+        ('stage', ['stage'], int_value, None),
+        ('credits', ['credits'], float_value, None),
+        ('student_credit_points', ['student_credit_points', 'student_credits'], float_value, None),
+        ('iscancelled', ['iscancelled'], int_value, None),
+        ('isoncampus', ['isoncampus'], int_value, None),
+        ('issemesteracourse', ['issemesteracourse'], int_value, None),
+        ('issemesterbcourse', ['issemesterbcourse'], int_value, None),
+        ('iswholeyearcourse', ['iswholeyearcourse'], int_value, None),
+        ('location_code', ['location_code'], None, None),
+        ('location', ['location'], None, None),
+        ('owning_school_clevel', ['owning_school_clevel'], fix_org_unit, None),
+        ('owning_school', ['owning_school'], None, None),
+        ('owning_department_clevel', ['owning_department_clevel'], None, None),
+        ('owning_department', ['owning_department'], None, None),
+        ('owning_level4_clevel', ['owning_level4_clevel'], None, None),
+        ('owning_level4_department', ['owning_level4_department'], None, None),
+        ('owning_level4or3_department', ['owning_level4or3_department'], None, None),
+        ('owning_level4or3_clevel', ['owning_level4or3_clevel'], None, None),
+        ('delivery_mode_code', ['delivery_mode_code'], None, None),
+        ('delivery_mode', ['delivery_mode'], None, None),
+        ('semester_code', ['semester_code'], None, None),
+        ('semester_description', ['semester_description'], None, None),
+        ('isselfpaced', ['isselfpaced'], int_value, None),
+        ('source_of_funding', ['source_of_funding'], None, None),
+        ('funding_category_code', ['funding_category_code'], None, None),
+        ('funding_category', ['funding_category'], None, None),
+        ('cost_category_code', ['cost_category_code'], None, None),
+        ('cost_category', ['cost_category'], None, None),
+        ('research_supplement_code', ['research_supplement_code'], int_value, None),
+        ('research_supplement', ['research_supplement'], None, None),
+        ('classification_code', ['classification_code'], float_value, None),
+        ('classification', ['classification'], None, None),
+        ('division', ['division'], None, None),
+        ('division_code', ['division_code'], None, None),
+        ('specified_programme', ['specified_programme'], None, None),
+        ('major', ['major'], None, None),
+        ('second_major', ['second_major'], None, None),
+        ('major2', ['major2'], None, None),
+        ('second_major2', ['second_major2'], None, None),
+        ('main_subject', ['main_subject'], None, None),
+        ('second_subject', ['second_subject'], None, None),
+        ('supporting_subject', ['supporting_subject'], None, None),
+        ('teaching_1', ['teaching_1'], None, None),
+        ('teaching_2', ['teaching_2'], None, None),
+        ('teaching_3', ['teaching_3'], None, None),
+        ('teaching_4', ['teaching_4'], None, None),
+        ('subject', ['subject'], None, None),
+        ('field', ['field'], None, None),
+        ('specialisation', ['specialisation'], None, None),
+        ('stream', ['stream'], None, None),
+        ('endorsement', ['endorsement'], None, None),
+        ('award_year', ['award_year'], int_value, None),
+        ('award_completion_status', ['award_completion_status'], None, None),
+        ('award_completion_date', ['award_completion_date'], grade_results_date('award_completion_date', cache), '0001-01-01'),
+        ('award_completion_confirmed_date', ['award_completion_confirmed_date'], grade_results_date('award_completion_confirmed_date', cache), '0001-01-01'),
+        ('admission_year', ['admission_year'], int_value, None),
+        ('admission_reason', ['admission_reason'], None, None),
+        ('admission_criteria', ['admission_criteria'], None, None),
+        ('admission_status', ['admission_status'], None, None),
+        ('grade', ['grade'], None, None),
+        ('grade_status', ['grade_status'], None, None),
+        ('result_status_code', ['result_status_code'], None, None),
+        ('result_status', ['result_status'], None, None),
+        ('grade_ranking', ['grade_ranking'], int_value, None),
+        ('mark', ['mark'], float_value, None),
+        ('moe_completion_code', ['moe_completion_code'], int_value, None),
+        ('iscontinuinggrade', ['iscontinuinggrade'], int_value, None),
+        ('ispassgrade', ['ispassgrade'], int_value, None),
+        ('query_date', ['query_date'], grade_results_date('query_date', cache), '0001-01-01'),
+        ('enr_year', ['enr_year', 'enrolment_year'], int_value, None),
+        ('enrolment_status', ['enrolment_status'], None, None),
+        ('final_grade', ['final_grade'], None, None),
+        ('final_grade_ranking', ['final_grade_ranking'], int_value, None),
+        ('final_grade_status', ['final_grade_status'], None, None),
+        ('final_grade_result_status', ['final_grade_result_status'], None, None),
+        ('papers_per_student', ['papers_per_student'], int_value, None),
+        ('credits_per_student', ['credits_per_student'], float_value, None),
+        ('gpa', ['gpa'], float_value, None),
+        ('ones', ['ones'], int_value, None),
+        ('allgradeones', ['allgradeones'], int_value, None),
+        ('passgradeones', ['passgradeones'], int_value, None),
+        ('retentionones', ['retentionones'], int_value, None),
+        ('award_completion_year', ['award_completion_year'], int_value, None),
+        ('personoid', ['personoid'], float_value, None),
+        ('courseoccurrenceoid', ['courseoccurrenceoid'], float_value, None),
+        ('awardenrolmentoid', ['awardenrolmentoid'], float_value, None),
+        ('enrolmentorcosuoid', ['enrolmentorcosuoid'], float_value, None),
+        ('isformalprogramme', ['isformalprogramme'], int_value, None),
+        ('citizenship_simple', ['citizenship_simple', 'citizenship_code'], None, None),
+        ('moe_pbrf_code', ['moe_pbrf_code'], None, None),
+        ('moe_pbrf', ['moe_pbrf'], None, None),
+        ('achievement_date', ['achievement_date'], grade_results_date('achievement_date', cache), '0001-01-01'),
+        ('te_reo', ['te_reo'], int_value, None),
+    ]
+
+
+GRADE_RESULTS_NATURAL_KEY = ('student_id', 'paper_occurrence', 'enrolmentorcosuoid')
+""" the columns that identify a grade results row within a year (differential imports) """
+
+GRADE_RESULTS_FINGERPRINT_EXCLUDE = ['query_date']
+""" the columns that don't count as change of a grade results row (snapshot metadata) """
+
+
+def grade_results_fingerprint(values):
+    """
+    Generates the fingerprint of the mapped grade results values, for detecting changed rows.
+
+    :param values: the mapped values (column name - value)
+    :type values: dict
+    :return: the fingerprint (MD5)
+    :rtype: str
+    """
+
+    names = sorted([n for n in values.keys() if n not in GRADE_RESULTS_FINGERPRINT_EXCLUDE])
+    return hashlib.md5("\x1f".join([str(values[n]) for n in names]).encode('utf-8')).hexdigest()
+
+
+def grade_results_rows(reader, lines, mapper):
+    """
+    Maps the rows of the grade results file sequentially.
+
+    :param reader: the csv.reader to read the rows from
+    :type reader: object
+    :param lines: the line reader underneath the csv.reader
+    :type lines: OffsetLineReader
+    :param mapper: the mapper to convert the rows with
+    :type mapper: RowMapper
+    :return: the generator of tuples of byte offset after the row, mapped values (None if empty
+             or rejected), error message (None if not rejected) and cells
+    :rtype: generator
+    """
+
+    for row in reader:
+        values = None
+        error = None
+        if len(row) > 0:
+            try:
+                values = mapper.map(row)
+                values['fingerprint'] = grade_results_fingerprint(values)
+            except Exception as ex:
+                error = str(ex)
+                values = None
+        yield lines.offset, values, error, row
+
+
+CHUNK_DATE_CACHE = None
+""" the date cache of a parse worker process, shared by all the chunks it parses """
+
+
+def parse_grade_results_chunk(task):
+    """
+    Parses and maps a chunk of complete records of a grade results file, executed in a parse worker process.
+
+    :param task: the tuple of file, start offset, end offset, data (None to read the range from the file),
+                 encoding and header
+    :type task: tuple
+    :return: the tuple of chunk length, value names, list of rows (byte offset in chunk after the row, values
+             (None if empty or rejected), error message (None if not rejected), cells (only if rejected))
+             and the error that stopped parsing (None if parsed completely)
+    :rtype: tuple
+    """
+
+    global CHUNK_DATE_CACHE
+
+    path, start, end, data, encoding, header = task
+    if data is None:
+        data = read_range(path, start, end)
+    if CHUNK_DATE_CACHE is None:
+        CHUNK_DATE_CACHE = DateCache()
+    mapper = RowMapper(header, grade_results_columns(CHUNK_DATE_CACHE))
+    lines = OffsetLineReader(BytesIO(data), encoding)
+    names = None
+    rows = []
+    try:
+        for row in csv_reader(lines):
+            if len(row) == 0:
+                rows.append((lines.offset, None, None, None))
+                continue
+            try:
+                values = mapper.map(row)
+                values['fingerprint'] = grade_results_fingerprint(values)
+            except Exception as ex:
+                rows.append((lines.offset, None, str(ex), row))
+                continue
+            if names is None:
+                names = list(values.keys())
+            rows.append((lines.offset, list(values.values()), None, None))
+    except Exception:
+        return len(data), names, rows, traceback.format_exc()
+    return len(data), names, rows, None
+
+
+def parallel_grade_results_rows(executor, tasks, offset, window):
+    """
+    Maps the rows of the grade results file in parallel, chunk by chunk, in file order.
+
+    :param executor: the process pool to parse the chunks with
+    :type executor: ProcessPoolExecutor
+    :param tasks: the iterable of tasks for parse_grade_results_chunk
+    :type tasks: iterable
+    :param offset: the byte offset of the first chunk
+    :type offset: int
+    :param window: the maximum number of chunks in flight
+    :type window: int
+    :return: the generator of tuples of byte offset after the row, mapped values (None if empty
+             or rejected), error message (None if not rejected) and cells (only if rejected)
+    :rtype: generator
+    """
+
+    for length, names, rows, error in ordered_map(executor, parse_grade_results_chunk, tasks, window):
+        for end, values, msg, cells in rows:
+            if values is not None:
+                values = dict(zip(names, values))
+            yield offset + end, values, msg, cells
+        if error is not None:
+            raise Exception("Failed to parse record after byte offset %d:\n%s" % (offset + (rows[-1][0] if len(rows) > 0 else 0), error))
+        offset += length
+
+
+def map_grade_results(table, csv, encoding, csvfile, lines, reader, header, mapper, rows=0, offset=0, profile=None):
+    """
+    Sets up the mapping of the grade results rows after the current position of
+    the file, parsing them in parallel for large files.
+
+    :param table: the table being imported
+    :type table: str
+    :param csv: the CSV file being imported
+    :type csv: str
+    :param encoding: the file encoding (eg utf-8)
+    :type encoding: str
+    :param csvfile: the binary file opened via open_binary
+    :type csvfile: file
+    :param lines: the line reader on top of the file
+    :type lines: OffsetLineReader
+    :param reader: the csv.reader on top of the line reader, positioned after the header
+    :type reader: object
+    :param header: the header row
+    :type header: list
+    :param mapper: the mapper for sequential parsing
+    :type mapper: RowMapper
+    :param rows: the number of rows already imported (eg when resuming)
+    :type rows: int
+    :param offset: the number of bytes already imported (eg when resuming)
+    :type offset: int
+    :param profile: the (optional) profile to record the reading/parsing phases with
+    :type profile: ImportProfile
+    :return: the tuple of generator of rows (see grade_results_rows), process pool (None if sequential)
+             and progress, for which the progress position function gets set to the current byte offset
+    :rtype: tuple
+    """
+
+    position = {'offset': lines.offset}
+    compressed = source_file(csvfile) is not csvfile
+    workers = parse_workers(os.path.getsize(csv))
+    if workers > 1:
+        # uncompressed files get split via a memory map, compressed ones decompressed here
+        executor = parse_pool(workers)
+        chunk_size = reporting.settings.IMPORT_PARSE_CHUNK_SIZE
+        if compressed:
+            fileobj = csvfile if profile is None else TimedFile(profile, "decompress", csvfile)
+            tasks = ((None, 0, 0, data, encoding, header) for data in read_chunks(fileobj, chunk_size))
+            progress = ImportProgress(table, fileobj=source_file(csvfile), rows=rows)
+        else:
+            tasks = ((csv, start, end, None, encoding, header) for start, end in split_file(csv, lines.offset, chunk_size))
+            progress = ImportProgress(table, total=os.path.getsize(csv), rows=rows, offset=offset,
+                                      position=lambda: position['offset'])
+        generator = parallel_grade_results_rows(executor, tasks, lines.offset, workers * 2)
+        if profile is not None:
+            generator = profile.timed("parse (parallel)", generator)
+        logger.info("%s: parsing with %d processes" % (table, workers))
+    else:
+        executor = None
+        if profile is not None:
+            lines.fileobj = TimedFile(profile, "decompress" if compressed else "read file", lines.fileobj)
+            reader = profile.timed("parse csv", reader)
+        generator = grade_results_rows(reader, lines, mapper)
+        progress = ImportProgress(table, fileobj=source_file(csvfile), rows=rows, offset=0 if compressed else offset)
+
+    def track():
+        for row in generator:
+            position['offset'] = row[0]
+            yield row
+
+    return track(), executor, progress
+
+
+def queue_import_grade_results(year, csv, encoding, email=None, defer_indexes=False, delete=True, differential=False, isgzip=None):
     """
     Queues the import of the grade results for a specific year (Brio/Hyperion export).
 
     :param year: the year to import the results for (eg 2015)
     :type year: int
-    :param csv: the CSV file to import, can be gzip compressed
+    :param csv: the CSV file to import, can be compressed (gzip, bz2, xz, zstd)
     :type csv: str
-    :param isgzip: true if GZIP compressed
-    :type isgzip: bool
     :param encoding: the file encoding (eg utf-8)
     :type encoding: str
     :param email: the (optional) email address to send a notification to
     :type email: str
+    :param defer_indexes: whether to drop the indexes before loading and rebuild them afterwards
+    :type defer_indexes: bool
+    :param delete: whether to delete the import file afterwards
+    :type delete: bool
+    :param differential: whether to only apply the differences to the rows of the year
+    :type differential: bool
+    :param isgzip: ignored, the compression gets detected from the file (only for jobs queued by older versions)
+    :type isgzip: bool
+    :return: None if successful, otherwise error message
+    :rtype: str
     """
 
     update_tablestatus(GradeResults._meta.db_table, "Importing...")
-    msg = import_grade_results(year, csv, isgzip, encoding, email=email)
-    # query date from import is used when current year
-    if (msg is not None) or (datetime.today().year != year):
+    if differential:
+        msg = import_grade_results_differential(year, csv, encoding, email=email, delete=delete)
+    else:
+        msg = import_grade_results(year, csv, encoding, email=email, delete=delete, defer_indexes=defer_indexes)
+    # successful imports record their timings (and the query date for the current year)
+    if msg is not None:
         update_tablestatus(GradeResults._meta.db_table, msg=msg)
+    return msg
+
 
+def uses_staging_table(table):
+    """
+    Checks whether imports of a year load into a staging table (partition or
+    shadow table) that only gets indexed after loading, in which case deferring
+    the indexes has no effect.
 
-def import_grade_results(year, csv, isgzip, encoding, email=None, delete=True):
+    :param table: the name of the table
+    :type table: str
+    :return: True if a staging table is used
+    :rtype: bool
+    """
+
+    return is_partitioned(table) or use_shadow_tables()
+
+
+def import_grade_results(year, csv, encoding, email=None, delete=True, defer_indexes=False, resume=True, dimensions=True):
     """
     Imports the grade results for a specific year (Brio/Hyperion export).
+    Deferring the indexes only applies when loading directly into the live table,
+    as staging tables (partitions, shadow tables) don't have indexes while loading.
+
+    Every batch that gets written is recorded as checkpoint (row number, byte offset)
+    in an ImportJob. If the import fails, importing the same file again continues
+    after the last checkpoint. Rows that cannot be converted are written to a
+    rejects file instead of aborting the import.
 
     :param year: the year to import the results for (eg 2015)
     :type year: int
-    :param csv: the CSV file to import, can be gzip compressed
+    :param csv: the CSV file to import, can be compressed (gzip, bz2, xz, zstd)
     :type csv: str
-    :param isgzip: true if GZIP compressed
-    :type isgzip: bool
     :param encoding: the file encoding (eg utf-8)
     :type encoding: str
     :param email: the (optional) email address to send a notification to
     :type email: str
     :param delete: whether to delete the data file
     :type delete: bool
+    :param defer_indexes: whether to drop the indexes before loading and rebuild them afterwards
+    :type defer_indexes: bool
+    :param resume: whether to resume a failed import of the same file
+    :type resume: bool
+    :param dimensions: whether to rebuild the dimensions afterwards (bulk imports rebuild them once at the end)
+    :type dimensions: bool
     :return: None if successful, otherwise error message
     :rtype: str
     """
 
     result = None
 
-    set_maintenance_mode(True)
-
     query_date = None
+    indexes = None
+    table = GradeResults._meta.db_table
+    profile = ImportProfile(table, year=year)
+
+    if defer_indexes and uses_staging_table(table):
+        logger.info("%s: staging table gets indexed after loading, ignoring deferred indexes" % table)
+        defer_indexes = False
+
+    # failed import of same file?
+    fingerprint = file_fingerprint(csv)
+    job = find_import_job(table, year, fingerprint) if resume else None
+
+    # students of the year need their dates recalculated
+    students = "select student_id from %s where year = %d" % (table, year)
+    mark_student_dates(students)
+    # partitioned/shadow: load into staging table, otherwise delete previous rows for year
+    staging = None
+    shadow = None
+    if is_partitioned(table):
+        if (job is not None) and (job.staging is not None) and job.staging.startswith(partition_name(table, year) + "_") and table_exists(job.staging):
+            staging = job.staging
+        else:
+            job = None
+            staging = create_staging(table, year)
+    elif use_shadow_tables():
+        shadow = ShadowTable(GradeResults, year=year)
+        staging = shadow.staging
+        if (job is None) or (job.staging != staging) or not table_exists(staging):
+            job = None
+            shadow.create()
+    else:
+        set_maintenance_mode(True)
+        if (job is not None) and (job.staging is not None):
+            job = None
+        if job is None:
+            mark = profile.mark()
+            GradeResults.objects.all().filter(year=year).delete()
+            profile.add_since("delete", mark)
+        if defer_indexes:
+            update_tablestatus(table, "Dropping indexes...")
+            mark = profile.mark()
+            indexes = drop_indexes(table)
+            profile.add_since("drop indexes", mark)
+    if job is None:
+        job = ImportJob(table=table, year=year, fingerprint=fingerprint, staging=staging,
+                        rejects_file=rejects_filename(table, year, fingerprint))
+    else:
+        logger.info("%s: resuming import of %d at row %d" % (table, year, job.row_number))
+    job.status = 'running'
+    job.save()
+    abandon_import_jobs(table, year, job, staging=staging)
+    written = job.written
+    rejected = job.rejected
+
+    def checkpoint(count):
+        job.written = written + count
+        job.save()
 
-    # delete previous rows for year
-    GradeResults.objects.all().filter(year=year).delete()
     # import
+    csvfile = None
+    rejects = None
+    executor = None
     try:
-        if isgzip:
-            csvfile = gzip.open(csv, mode='rt', encoding=encoding)
-        else:
-            csvfile = open(csv, encoding=encoding)
-        reader = DictReader(csvfile)
-        reader.fieldnames = [name.lower().replace(" ", "_") for name in reader.fieldnames]
-        count = 0
-        for row in reader:
-            count += 1
-            truncate_strings(row, 250)
-            encode_strings(row, 'utf-8')
-            r = GradeResults()
-            r.year = year
-            r.student_id = string_cell(row, ['student_id'])
-            r.name = string_cell(row, ['name'])
-            r.title = string_cell(row, ['title'])
-            r.prefered_given_name = string_cell(row, ['prefered_given_name'], defvalue='')
-            r.given_name = string_cell(row, ['given_name'], defvalue='')
-            r.other_given_names = string_cell(row, ['other_given_names'], defvalue='')
-            r.family_name = string_cell(row, ['family_name'], defvalue='')
-            r.previous_name = string_cell(row, ['previous_name'])
-            r.address1 = string_cell(row, ['address1', 'address_line_1'])
-            r.address2 = string_cell(row, ['address2', 'address_line_2'])
-            r.address2a = string_cell(row, ['address2a'])
-            r.address2b = string_cell(row, ['address2b'])
-            r.address3 = string_cell(row, ['address3', 'address_line_3'])
-            r.address4 = string_cell(row, ['address4', 'address_line_4'])
-            r.postcode = string_cell(row, ['postcode', 'postal_area_code'])
-            r.telephone = string_cell(row, ['telephone', 'perm_phone_number'])
-            r.cellphone = string_cell(row, ['cellphone', 'perm_cellphone_number'])
-            r.email = string_cell(row, ['email', 'perm_email_address'])
-            r.hasdisability = int_cell(row, ['hasdisability'])
-            r.isdomestic = int_cell(row, ['isdomestic', 'domestic_indicator'])
-            r.is_domiciled_locally = int_cell(row, ['is_domiciled_locally'])
-            r.citizenship = string_cell(row, ['citizenship'])
-            r.residency_status = string_cell(row, ['residency_status'])
-            r.origin = string_cell(row, ['origin'])
-            r.gender = string_cell(row, ['gender'])
-            r.ethnicity = string_cell(row, ['ethnicity'])
-            r.ethnic_group = string_cell(row, ['ethnic_group'])
-            r.all_ethnicities_string = string_cell(row, ['all_ethnicities_string'])
-            r.all_iwi_string = string_cell(row, ['all_iwi_string'])
-            r.dateofbirth = parse_grade_results_date('dateofbirth', string_cell(row, ['dateofbirth', 'date_of_birth']))
-            r.dateofdeath = string_cell(row, ['dateofdeath'])
-            r.waikato_1st = int_cell(row, ['waikato_1st'])
-            r.nz_1st = int_cell(row, ['nz_1st'])
-            r.last_year_sec = int_cell(row, ['last_year_sec'])
-            r.sec_qual_year = int_cell(row, ['sec_qual_year'])
-            r.last_sec_school = string_cell(row, ['last_sec_school'])
-            r.last_sec_school_region = string_cell(row, ['last_sec_school_region'])
-            r.highest_sec_qual = string_cell(row, ['highest_sec_qual'])
-            r.main_activity = string_cell(row, ['main_activity'])
-            r.award_title = string_cell(row, ['award_title', 'award'])
-            r.prog_abbr = string_cell(row, ['prog_abbr', 'prog_-_abbr'])
-            r.programme = string_cell(row, ['programme'])
-            r.programme_type_code = string_cell(row, ['programme_type_code'])
-            r.programme_type = string_cell(row, ['programme_type'])
-            r.ishigherdegree = int_cell(row, ['ishigherdegree'])
-            r.school_of_study = string_cell(row, ['school_of_study'])
-            r.school_of_study_clevel = fix_org_unit(string_cell(row, ['school_of_study_clevel']))
-            r.paper_master_code = string_cell(row, ['paper_master_code', 'paper_master'])
-            r.paper_occurrence = string_cell(row, ['paper_occurrence'])
-            r.paper_title = string_cell(row, ['paper_title'])
-            r.occurrence_startdate = parse_grade_results_date('occurrence_startdate', string_cell(row, ['occurrence_startdate']))
-            r.occurrence_startyear = int_cell(row, ['occurrence_startyear'])
-            r.occurrence_startweek = int_cell(row, ['occurrence_startweek'])
-            r.occurrence_enddate = parse_grade_results_date('occurrence_enddate', string_cell(row, ['occurrence_enddate']))
-            r.stage = int_cell(row, ['stage'])
-            r.credits = float_cell(row, ['credits'])
-            r.student_credit_points = float_cell(row, ['student_credit_points', 'student_credits'])
-            r.iscancelled = int_cell(row, ['iscancelled'])
-            r.isoncampus = int_cell(row, ['isoncampus'])
-            r.issemesteracourse = int_cell(row, ['issemesteracourse'])
-            r.issemesterbcourse = int_cell(row, ['issemesterbcourse'])
-            r.iswholeyearcourse = int_cell(row, ['iswholeyearcourse'])
-            r.location_code = string_cell(row, ['location_code'])
-            r.location = string_cell(row, ['location'])
-            r.owning_school_clevel = fix_org_unit(string_cell(row, ['owning_school_clevel']))
-            r.owning_school = string_cell(row, ['owning_school'])
-            r.owning_department_clevel = string_cell(row, ['owning_department_clevel'])
-            r.owning_department = string_cell(row, ['owning_department'])
-            r.owning_level4_clevel = string_cell(row, ['owning_level4_clevel'])
-            r.owning_level4_department = string_cell(row, ['owning_level4_department'])
-            r.owning_level4or3_department = string_cell(row, ['owning_level4or3_department'])
-            r.owning_level4or3_clevel = string_cell(row, ['owning_level4or3_clevel'])
-            r.delivery_mode_code = string_cell(row, ['delivery_mode_code'])
-            r.delivery_mode = string_cell(row, ['delivery_mode'])
-            r.semester_code = string_cell(row, ['semester_code'])
-            r.semester_description = string_cell(row, ['semester_description'])
-            r.isselfpaced = int_cell(row, ['isselfpaced'])
-            r.source_of_funding = string_cell(row, ['source_of_funding'])
-            r.funding_category_code = string_cell(row, ['funding_category_code'])
-            r.funding_category = string_cell(row, ['funding_category'])
-            r.cost_category_code = string_cell(row, ['cost_category_code'])
-            r.cost_category = string_cell(row, ['cost_category'])
-            r.research_supplement_code = int_cell(row, ['research_supplement_code'])
-            r.research_supplement = string_cell(row, ['research_supplement'])
-            r.classification_code = float_cell(row, ['classification_code'])
-            r.classification = string_cell(row, ['classification'])
-            r.division = string_cell(row, ['division'])
-            r.division_code = string_cell(row, ['division_code'])
-            r.specified_programme = string_cell(row, ['specified_programme'])
-            r.major = string_cell(row, ['major'])
-            r.second_major = string_cell(row, ['second_major'])
-            r.major2 = string_cell(row, ['major2'])
-            r.second_major2 = string_cell(row, ['second_major2'])
-            r.main_subject = string_cell(row, ['main_subject'])
-            r.second_subject = string_cell(row, ['second_subject'])
-            r.supporting_subject = string_cell(row, ['supporting_subject'])
-            r.teaching_1 = string_cell(row, ['teaching_1'])
-            r.teaching_2 = string_cell(row, ['teaching_2'])
-            r.teaching_3 = string_cell(row, ['teaching_3'])
-            r.teaching_4 = string_cell(row, ['teaching_4'])
-            r.subject = string_cell(row, ['subject'])
-            r.field = string_cell(row, ['field'])
-            r.specialisation = string_cell(row, ['specialisation'])
-            r.stream = string_cell(row, ['stream'])
-            r.endorsement = string_cell(row, ['endorsement'])
-            r.award_year = int_cell(row, ['award_year'])
-            r.award_completion_status = string_cell(row, ['award_completion_status'])
-            r.award_completion_date = parse_grade_results_date('award_completion_date', string_cell(row, ['award_completion_date']))
-            r.award_completion_confirmed_date = parse_grade_results_date('award_completion_confirmed_date', string_cell(row, ['award_completion_confirmed_date']))
-            r.admission_year = int_cell(row, ['admission_year'])
-            r.admission_reason = string_cell(row, ['admission_reason'])
-            r.admission_criteria = string_cell(row, ['admission_criteria'])
-            r.admission_status = string_cell(row, ['admission_status'])
-            r.grade = string_cell(row, ['grade'])
-            r.grade_status = string_cell(row, ['grade_status'])
-            r.result_status_code = string_cell(row, ['result_status_code'])
-            r.result_status = string_cell(row, ['result_status'])
-            r.grade_ranking = int_cell(row, ['grade_ranking'])
-            r.mark = float_cell(row, ['mark'])
-            r.moe_completion_code = int_cell(row, ['moe_completion_code'])
-            r.iscontinuinggrade = int_cell(row, ['iscontinuinggrade'])
-            r.ispassgrade = int_cell(row, ['ispassgrade'])
-            r.query_date = parse_grade_results_date('query_date', string_cell(row, ['query_date']))
+        mark = profile.mark()
+        csvfile = open_binary(csv)
+        lines = OffsetLineReader(csvfile, encoding)
+        reader = csv_reader(lines)
+        header = next(reader)
+        if job.byte_offset > 0:
+            lines.seek(job.byte_offset)
+        cache = DateCache()
+        mapper = RowMapper(header, grade_results_columns(cache))
+        rejects = RejectWriter(job.rejects_file, header, keep=job.rejected)
+        rows, executor, progress = map_grade_results(table, csv, encoding, csvfile, lines, reader, header, mapper,
+                                                     rows=written, offset=job.byte_offset, profile=profile)
+        writer = BulkWriter(GradeResults, table=staging, checkpoint=checkpoint, progress=progress.update)
+        for offset, values, error, row in rows:
+            job.row_number += 1
+            job.byte_offset = offset
+            if values is not None:
+                try:
+                    r = GradeResults(year=year, **values)
+                except Exception as ex:
+                    error = str(ex)
+            if error is not None:
+                job.rejected += 1
+                rejects.write(job.row_number, [] if row is None else row, error)
+                continue
+            if values is None:
+                continue
             if (query_date is None) and (r.query_date is not None):
-                query_date = datetime.strptime(parse_grade_results_date('query_date', string_cell(row, ['query_date'])), "%Y-%m-%d")
-            r.enr_year = int_cell(row, ['enr_year', 'enrolment_year'])
-            r.enrolment_status = string_cell(row, ['enrolment_status'])
-            r.final_grade = string_cell(row, ['final_grade'])
-            r.final_grade_ranking = int_cell(row, ['final_grade_ranking'])
-            r.final_grade_status = string_cell(row, ['final_grade_status'])
-            r.final_grade_result_status = string_cell(row, ['final_grade_result_status'])
-            r.papers_per_student = int_cell(row, ['papers_per_student'])
-            r.credits_per_student = float_cell(row, ['credits_per_student'])
-            r.gpa = float_cell(row, ['gpa'])
-            r.ones = int_cell(row, ['ones'])
-            r.allgradeones = int_cell(row, ['allgradeones'])
-            r.passgradeones = int_cell(row, ['passgradeones'])
-            r.retentionones = int_cell(row, ['retentionones'])
-            r.award_completion_year = int_cell(row, ['award_completion_year'])
-            r.personoid = float_cell(row, ['personoid'])
-            r.courseoccurrenceoid = float_cell(row, ['courseoccurrenceoid'])
-            r.awardenrolmentoid = float_cell(row, ['awardenrolmentoid'])
-            r.enrolmentorcosuoid = float_cell(row, ['enrolmentorcosuoid'])
-            r.isformalprogramme = int_cell(row, ['isformalprogramme'])
-            r.citizenship_simple = string_cell(row, ['citizenship_simple', 'citizenship_code'])
-            r.moe_pbrf_code = string_cell(row, ['moe_pbrf_code'])
-            r.moe_pbrf = string_cell(row, ['moe_pbrf'])
-            r.achievement_date = parse_grade_results_date('achievement_date', string_cell(row, ['achievement_date']))
-            r.te_reo = int_cell(row, ['te_reo'])
-            r.save()
-            # progress
-            if (count % 1000) == 0:
-                update_tablestatus(GradeResults._meta.db_table, "Imported " + str(count) + " rows...")
-
-        # close file
-        csvfile.close()
+                query_date = datetime.strptime(r.query_date, "%Y-%m-%d")
+            writer.add(r)
+        writer.close()
+        if executor is not None:
+            executor.shutdown()
+            executor = None
+        cache.log(table)
+        profile.add("write", writer.elapsed)
+        if cache.misses > 0:
+            profile.add("parse dates", cache.elapsed)
+        profile.add_since("convert", mark)
+        profile.rows = job.written - written
+        profile.rejected = job.rejected - rejected
+        if indexes is not None:
+            update_tablestatus(table, "Building indexes...")
+            mark = profile.mark()
+            create_indexes(table, indexes)
+            indexes = None
+            profile.add_since("build indexes", mark)
+        if shadow is not None:
+            update_tablestatus(table, "Swapping in year " + str(year) + "...")
+            mark = profile.mark()
+            shadow.swap(job.written)
+            shadow = None
+            staging = None
+            profile.add_since("swap", mark)
+        elif staging is not None:
+            update_tablestatus(table, "Swapping in year " + str(year) + "...")
+            mark = profile.mark()
+            swap_partition(table, year, staging)
+            staging = None
+            profile.add_since("swap", mark)
+        mark_student_dates(students)
+        job.status = 'finished'
+        job.staging = None
+        job.save()
     except Exception as ex:
         msg = traceback.format_exc()
         logger.error(msg=msg)
+        result = msg
+        # only the state of the last checkpoint is kept
+        try:
+            ImportJob.objects.all().filter(id=job.id).update(status='failed', message=msg)
+        except Exception as ex2:
+            logger.exception("Failed to record failure of import job")
+        profile.rows = job.written - written
+        profile.rejected = job.rejected - rejected
+        profile.finish(msg)
         return msg
     finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if csvfile is not None:
+            csvfile.close()
+        if rejects is not None:
+            rejects.close()
         if delete:
             try:
                 os.remove(csv)
@@ -314,10 +813,32 @@ def import_grade_results(year, csv, isgzip, encoding, email=None, delete=True):
                 msg = traceback.format_exc()
                 logger.error(msg=msg)
                 result = msg
+        # keep staging table of failed import for resuming it
+        if (result is None) or (job.written == 0):
+            if shadow is not None:
+                shadow.drop()
+            elif staging is not None:
+                drop_staging(staging)
+        if indexes is not None:
+            create_indexes(table, indexes)
+
+    # the data is already committed, a failure only leaves the previous dimensions in place
+    if dimensions and (result is None):
+        mark = profile.mark()
+        rebuild_dimensions(GradeResults._meta.db_table)
+        profile.add_since("dimensions", mark)
 
-    #
-    if (result is None) and (query_date is not None) and (query_date.year == datetime.today().year):
-        update_tablestatus(GradeResults._meta.db_table, timestamp=query_date)
+    # query date from import is used when current year
+    if result is None:
+        if (query_date is None) or (query_date.year != datetime.today().year):
+            query_date = None
+        msg = "Imported " + str(job.written) + " rows"
+        if job.rejected > 0:
+            msg += ", rejected " + str(job.rejected) + " rows (see " + job.rejects_file + ")"
+        msg += " (" + profile.summary() + ")"
+        logger.info(table + ": " + msg)
+        update_tablestatus(table, msg=msg, timestamp=query_date)
+    profile.finish(result)
 
     if email is not None:
         send_email(email, 'Import: grade results', 'Import succeeded' if (result is None) else 'Import failed: ' + result)
@@ -325,23 +846,283 @@ def import_grade_results(year, csv, isgzip, encoding, email=None, delete=True):
     return result
 
 
-def queue_import_coursedefs(year, csv, encoding, email=None):
+def delete_grade_results(year, ids):
+    """
+    Removes the grade results rows of the year with the specified IDs.
+
+    :param year: the year of the rows
+    :type year: int
+    :param ids: the IDs of the rows to remove
+    :type ids: list
+    """
+
+    if len(ids) == 0:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM %s WHERE year = %d AND id IN (%s)"
+                       % (GradeResults._meta.db_table, year, ",".join([str(i) for i in ids])))
+
+
+def mark_student_ids(students):
+    """
+    Marks the students for recalculating their start/end dates.
+
+    :param students: the student IDs to mark
+    :type students: set
+    """
+
+    pending = set(StudentDatesPending.objects.all().values_list('student_id', flat=True))
+    writer = BulkWriter(StudentDatesPending)
+    for student_id in sorted([s for s in students if s is not None]):
+        if student_id not in pending:
+            writer.add(StudentDatesPending(student_id=student_id))
+    writer.close()
+
+
+def import_grade_results_differential(year, csv, encoding, email=None, delete=True):
+    """
+    Imports the grade results for a specific year (Brio/Hyperion export) by only
+    applying the differences to the rows of the year that are already present,
+    eg for frequently refreshing the current year. Rows get matched by
+    GRADE_RESULTS_NATURAL_KEY and compared by fingerprint: new rows get inserted,
+    changed ones replaced and rows no longer present removed, all in a single
+    transaction. Unchanged rows keep their query_date (not part of the fingerprint).
+    Rows that cannot be converted are written to a rejects file and, as with a
+    full import, are not present afterwards.
+
+    :param year: the year to import the results for (eg 2015)
+    :type year: int
+    :param csv: the CSV file to import, can be compressed (gzip, bz2, xz, zstd)
+    :type csv: str
+    :param encoding: the file encoding (eg utf-8)
+    :type encoding: str
+    :param email: the (optional) email address to send a notification to
+    :type email: str
+    :param delete: whether to delete the data file
+    :type delete: bool
+    :return: None if successful, otherwise error message
+    :rtype: str
+    """
+
+    result = None
+    table = GradeResults._meta.db_table
+    query_date = None
+    profile = ImportProfile(table, year=year)
+    counts = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0, 'rejected': 0}
+    students = set()
+    rejects = None
+    executor = None
+    csvfile = None
+
+    try:
+        # natural keys and fingerprints of the rows present
+        mark = profile.mark()
+        existing = dict()
+        rows = GradeResults.objects.all().filter(year=year).values_list('id', 'fingerprint', *GRADE_RESULTS_NATURAL_KEY)
+        for row in rows.iterator():
+            key = tuple(row[2:])
+            if key not in existing:
+                existing[key] = []
+            existing[key].append([row[0], row[1], False])
+        profile.add_since("load keys", mark)
+
+        mark = profile.mark()
+        csvfile = open_binary(csv)
+        lines = OffsetLineReader(csvfile, encoding)
+        reader = csv_reader(lines)
+        header = next(reader)
+        cache = DateCache()
+        mapper = RowMapper(header, grade_results_columns(cache))
+        # the changes are applied in one transaction, i.e., a retry starts from scratch
+        rejects = RejectWriter(rejects_filename(table, year, file_fingerprint(csv)), header)
+        rows, executor, progress = map_grade_results(table, csv, encoding, csvfile, lines, reader, header, mapper,
+                                                     profile=profile)
+        row_number = 0
+        with transaction.atomic():
+            writer = BulkWriter(GradeResults)
+            remove = []
+            for offset, values, error, row in rows:
+                row_number += 1
+                if values is not None:
+                    try:
+                        r = GradeResults(year=year, **values)
+                    except Exception as ex:
+                        error = str(ex)
+                if error is not None:
+                    counts['rejected'] += 1
+                    rejects.write(row_number, [] if row is None else row, error)
+                    continue
+                if values is None:
+                    continue
+                if (query_date is None) and (r.query_date is not None):
+                    query_date = datetime.strptime(r.query_date, "%Y-%m-%d")
+                progress.update(row_number)
+                # same row present? otherwise replace a row with the same key (if any)
+                versions = existing.get(tuple([values[k] for k in GRADE_RESULTS_NATURAL_KEY]), [])
+                match = None
+                for version in versions:
+                    if not version[2] and (version[1] == r.fingerprint):
+                        match = version
+                        break
+                if match is not None:
+                    match[2] = True
+                    counts['unchanged'] += 1
+                    continue
+                for version in versions:
+                    if not version[2]:
+                        match = version
+                        break
+                if match is not None:
+                    match[2] = True
+                    remove.append(match[0])
+                    counts['changed'] += 1
+                else:
+                    counts['added'] += 1
+                students.add(r.student_id)
+                writer.add(r)
+                if len(remove) >= reporting.settings.IMPORT_BATCH_SIZE:
+                    delete_grade_results(year, remove)
+                    remove = []
+            writer.close()
+            # rows no longer present
+            for key, versions in existing.items():
+                for version in versions:
+                    if not version[2]:
+                        remove.append(version[0])
+                        counts['removed'] += 1
+                        students.add(key[0])
+                if len(remove) >= reporting.settings.IMPORT_BATCH_SIZE:
+                    delete_grade_results(year, remove)
+                    remove = []
+            delete_grade_results(year, remove)
+            mark_student_ids(students)
+        if executor is not None:
+            executor.shutdown()
+            executor = None
+        cache.log(table)
+        profile.add("write", writer.elapsed)
+        if cache.misses > 0:
+            profile.add("parse dates", cache.elapsed)
+        profile.add_since("compare", mark)
+    except Exception as ex:
+        msg = traceback.format_exc()
+        logger.error(msg=msg)
+        result = msg
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if csvfile is not None:
+            csvfile.close()
+        if rejects is not None:
+            rejects.close()
+        if delete:
+            try:
+                os.remove(csv)
+            except Exception as ex:
+                msg = traceback.format_exc()
+                logger.error(msg=msg)
+                result = msg
+
+    # the data is already committed, a failure only leaves the previous dimensions in place
+    if result is None:
+        mark = profile.mark()
+        rebuild_dimensions(GradeResults._meta.db_table)
+        profile.add_since("dimensions", mark)
+
+    # query date from import is used when current year
+    if result is None:
+        if (query_date is None) or (query_date.year != datetime.today().year):
+            query_date = None
+        msg = "Imported %d rows: added %d, changed %d, removed %d, unchanged %d" \
+              % (row_number - counts['rejected'], counts['added'], counts['changed'], counts['removed'], counts['unchanged'])
+        if counts['rejected'] > 0:
+            msg += ", rejected " + str(counts['rejected']) + " rows (see " + rejects.filename + ")"
+        msg += " (" + profile.summary() + ")"
+        logger.info(table + ": " + msg)
+        update_tablestatus(table, msg=msg, timestamp=query_date)
+    else:
+        update_tablestatus(table, msg=result)
+    profile.rows = counts['added'] + counts['changed'] + counts['unchanged']
+    profile.rejected = counts['rejected']
+    profile.finish(result)
+
+    if email is not None:
+        send_email(email, 'Import: grade results', 'Import succeeded' if (result is None) else 'Import failed: ' + result)
+
+    return result
+
+
+COURSEDEFS_COLUMNS = [
+    ('code', ['papercode'], None, None),
+    ('title', ['papertitle'], None, None),
+    ('description', ['paperdescription'], None, None),
+    ('type', ['papertype'], None, None),
+    ('stage', ['paperstage'], int_value, None),
+    ('points', ['paperpoints'], float_value, None),
+    ('delivery_mode', ['paperdeliverymode'], None, None),
+    ('owning_programme', ['paperowningprogramme'], None, None),
+    ('owning_programme_title', ['paperowningprogrammetitle'], None, None),
+    ('fw_level', ['paperfwlevel'], int_value, None),
+    ('hours_contact', ['paperhourscontact'], int_value, None),
+    ('hours_self_directed', ['paperhoursselfdirected'], int_value, None),
+    ('hours_other_directed', ['paperhoursotherdirected'], int_value, None),
+    ('funding_source', ['paperfundingsource'], None, None),
+    ('course_factor', ['papercoursefactor'], float_value, None),
+    ('cost_category_code', ['papercostcategorycode'], None, None),
+    ('cost_category', ['papercostcategory'], None, None),
+    ('funding_class_code', ['paperfundingclasscode'], None, None),
+    ('funding_class', ['paperfundingclass'], None, None),
+    ('individual_efts', ['paperindividualefts'], int_value, None),
+    ('nzsced_code', ['nzscedcode'], None, None),
+    ('nzsced_category', ['nzscedcategory'], None, None),
+    ('delivering_school_code', ['paperdeliveringschoolcode'], None, None),
+    ('delivering_school', ['paperdeliveringschool'], None, None),
+    ('delivering_dept_code', ['paperdeliveringdeptcode'], None, None),
+    ('delivering_dept', ['paperdeliveringdept'], None, None),
+    ('delivering_unit_code', ['paperdeliveringunitcode'], None, None),
+    ('delivering_unit', ['paperdeliveringunit'], None, None),
+    ('owning_school_code', ['paperowningschoolcode'], None, None),
+    ('owning_school', ['paperowningschool'], None, None),
+    ('owning_dept_code', ['paperowningdepartmentcode'], None, None),
+    ('owning_dept', ['paperowningdepartment'], None, None),
+    ('owning_unit_code', ['paperowningunitcode'], None, None),
+    ('owning_unit', ['paperowningunit'], None, None),
+    ('self_paced', ['papertitle'], bool_value, None),
+    ('online', ['paperonline'], bool_value, None),
+    ('active', ['paperactive'], bool_value, None),
+    ('pending', ['paperpending'], bool_value, None),
+    ('sub_status', ['papersubstatus'], None, None),
+    ('grade_method_code', ['grademethodcode'], None, None),
+    ('pbrf_eligibility', ['pbrfeligibility'], None, None),
+    ('coe_policy', ['coepolicy'], None, None),
+    ('report_academic_result', ['reportacademicresult'], bool_value, None),
+    ('internet_based', ['paperinternetbased'], None, None),
+]
+""" the column definitions of the course definitions (name, aliases, converter, default value) """
+
+
+def queue_import_coursedefs(year, csv, encoding, email=None, delete=True):
     """
     Queues the import of the course definitions for a specific year (Brio/Hyperion export).
 
     :param year: the year to import the results for (eg 2015)
     :type year: int
-    :param csv: the CSV file to import, can be gzip compressed
+    :param csv: the CSV file to import, can be compressed (gzip, bz2, xz, zstd)
     :type csv: str
     :param encoding: the file encoding (eg utf-8)
     :type encoding: str
     :param email: the (optional) email address to send a notification to
     :type email: str
+    :param delete: whether to delete the import file afterwards
+    :type delete: bool
+    :return: None if successful, otherwise error message
+    :rtype: str
     """
 
     update_tablestatus(CourseDefs._meta.db_table, "Importing...")
-    msg = import_coursedefs(year, csv, encoding, email=email)
+    msg = import_coursedefs(year, csv, encoding, email=email, delete=delete)
     update_tablestatus(CourseDefs._meta.db_table, msg=msg)
+    return msg
 
 
 def import_coursedefs(year, csv, encoding, email=None, delete=True):
@@ -350,7 +1131,7 @@ def import_coursedefs(year, csv, encoding, email=None, delete=True):
 
     :param year: the year to import the results for (eg 2015)
     :type year: int
-    :param csv: the CSV file to import, can be gzip compressed
+    :param csv: the CSV file to import, can be compressed (gzip, bz2, xz, zstd)
     :type csv: str
     :param encoding: the file encoding (eg utf-8)
     :type encoding: str
@@ -363,79 +1144,48 @@ def import_coursedefs(year, csv, encoding, email=None, delete=True):
     """
 
     result = None
+    profile = ImportProfile(CourseDefs._meta.db_table, year=year)
 
-    set_maintenance_mode(True)
-
-    # delete previous rows for year
-    CourseDefs.objects.all().filter(year=year).delete()
+    # shadow table or delete previous rows for year
+    shadow = None
+    if use_shadow_tables():
+        shadow = ShadowTable(CourseDefs, year=year)
+        shadow.create()
+    else:
+        set_maintenance_mode(True)
+        mark = profile.mark()
+        CourseDefs.objects.all().filter(year=year).delete()
+        profile.add_since("delete", mark)
     # import
+    csvfile = None
     try:
-        csvfile = open(csv, encoding=encoding)
-        reader = DictReader(csvfile)
-        reader.fieldnames = [name.lower().replace(" ", "_") for name in reader.fieldnames]
-        count = 0
-        for row in reader:
-            count += 1
-            truncate_strings(row, 250)
-            encode_strings(row, 'utf-8')
-            r = CourseDefs()
-            r.year = year
-            r.code = string_cell(row, ['papercode'])
-            r.title = string_cell(row, ['papertitle'])
-            r.description = string_cell(row, ['paperdescription'])
-            r.type = string_cell(row, ['papertype'])
-            r.stage = int_cell(row, ['paperstage'])
-            r.points = float_cell(row, ['paperpoints'])
-            r.delivery_mode = string_cell(row, ['paperdeliverymode'])
-            r.owning_programme = string_cell(row, ['paperowningprogramme'])
-            r.owning_programme_title = string_cell(row, ['paperowningprogrammetitle'])
-            r.fw_level = int_cell(row, ['paperfwlevel'])
-            r.hours_contact = int_cell(row, ['paperhourscontact'])
-            r.hours_self_directed = int_cell(row, ['paperhoursselfdirected'])
-            r.hours_other_directed = int_cell(row, ['paperhoursotherdirected'])
-            r.funding_source = string_cell(row, ['paperfundingsource'])
-            r.course_factor = float_cell(row, ['papercoursefactor'])
-            r.cost_category_code = string_cell(row, ['papercostcategorycode'])
-            r.cost_category = string_cell(row, ['papercostcategory'])
-            r.funding_class_code = string_cell(row, ['paperfundingclasscode'])
-            r.funding_class = string_cell(row, ['paperfundingclass'])
-            r.individual_efts = int_cell(row, ['paperindividualefts'])
-            r.nzsced_code = string_cell(row, ['nzscedcode'])
-            r.nzsced_category = string_cell(row, ['nzscedcategory'])
-            r.delivering_school_code = string_cell(row, ['paperdeliveringschoolcode'])
-            r.delivering_school = string_cell(row, ['paperdeliveringschool'])
-            r.delivering_dept_code = string_cell(row, ['paperdeliveringdeptcode'])
-            r.delivering_dept = string_cell(row, ['paperdeliveringdept'])
-            r.delivering_unit_code = string_cell(row, ['paperdeliveringunitcode'])
-            r.delivering_unit = string_cell(row, ['paperdeliveringunit'])
-            r.owning_school_code = string_cell(row, ['paperowningschoolcode'])
-            r.owning_school = string_cell(row, ['paperowningschool'])
-            r.owning_dept_code = string_cell(row, ['paperowningdepartmentcode'])
-            r.owning_dept = string_cell(row, ['paperowningdepartment'])
-            r.owning_unit_code = string_cell(row, ['paperowningunitcode'])
-            r.owning_unit = string_cell(row, ['paperowningunit'])
-            r.self_paced = bool_cell(row, ['papertitle'])
-            r.online = bool_cell(row, ['paperonline'])
-            r.active = bool_cell(row, ['paperactive'])
-            r.pending = bool_cell(row, ['paperpending'])
-            r.sub_status = string_cell(row, ['papersubstatus'])
-            r.grade_method_code = string_cell(row, ['grademethodcode'])
-            r.pbrf_eligibility = string_cell(row, ['pbrfeligibility'])
-            r.coe_policy = string_cell(row, ['coepolicy'])
-            r.report_academic_result = bool_cell(row, ['reportacademicresult'])
-            r.internet_based = string_cell(row, ['paperinternetbased'])
-            r.save()
-            # progress
-            if (count % 1000) == 0:
-                update_tablestatus(CourseDefs._meta.db_table, "Imported " + str(count) + " rows...")
-
-        # close file
-        csvfile.close()
+        mark = profile.mark()
+        csvfile = open_text(csv, encoding=encoding)
+        reader = csv_reader(csvfile)
+        mapper = RowMapper(next(reader), COURSEDEFS_COLUMNS)
+        progress = ImportProgress(CourseDefs._meta.db_table, fileobj=source_file(csvfile))
+        writer = BulkWriter(CourseDefs, table=None if shadow is None else shadow.staging, progress=progress.update)
+        for row in profile.timed("parse csv", reader):
+            if len(row) == 0:
+                continue
+            writer.add(CourseDefs(year=year, **mapper.map(row)))
+        count = writer.close()
+        profile.add("write", writer.elapsed)
+        profile.add_since("convert", mark)
+        profile.rows = count
+        if shadow is not None:
+            mark = profile.mark()
+            shadow.swap(count)
+            shadow = None
+            profile.add_since("swap", mark)
     except Exception as ex:
         msg = traceback.format_exc()
         logger.error(msg=msg)
+        profile.finish(msg)
         return msg
     finally:
+        if csvfile is not None:
+            csvfile.close()
         if delete:
             try:
                 os.remove(csv)
@@ -443,6 +1193,10 @@ def import_coursedefs(year, csv, encoding, email=None, delete=True):
                 msg = traceback.format_exc()
                 logger.error(msg=msg)
                 result = msg
+        if shadow is not None:
+            shadow.drop()
+
+    profile.finish(result)
 
     if email is not None:
         send_email(email, 'Import: course definitions', 'Import succeeded' if (result is None) else 'Import failed: ' + result)
@@ -450,18 +1204,98 @@ def import_coursedefs(year, csv, encoding, email=None, delete=True):
     return result
 
 
+def import_bulk_entry(row):
+    """
+    Imports a single entry of a bulk import.
+
+    :param row: the manifest row (type, year, file, encoding)
+    :type row: dict
+    :return: None if successful, otherwise error message
+    :rtype: str
+    """
+    try:
+        logger.debug("Importing: " + str(row))
+        if row['type'] == 'graderesults':
+            msg = import_grade_results(int(row['year']), row['file'], row['encoding'], delete=False, dimensions=False)
+        elif row['type'] in ['coursedefs', 'coursdefs']:
+            msg = import_coursedefs(int(row['year']), row['file'], row['encoding'], delete=False)
+            if msg is None:
+                update_tablestatus(CourseDefs._meta.db_table)
+        elif row['type'] == 'supervisors':
+            msg = import_supervisors(row['file'], row['encoding'], delete=False)
+            if msg is None:
+                update_tablestatus(Supervisors._meta.db_table)
+        elif row['type'] == 'scholarships':
+            msg = import_scholarships(row['file'], row['encoding'], delete=False, dimensions=False)
+            if msg is None:
+                update_tablestatus(Scholarship._meta.db_table)
+        elif row['type'] == 'associatedrole':
+            msg = import_associatedrole(row['file'], row['encoding'], delete=False)
+            if msg is None:
+                update_tablestatus(AssociatedRole._meta.db_table)
+        else:
+            msg = "Unhandled file type: " + str(row['type'])
+    except Exception as ex:
+        traceback.print_exc(file=sys.stdout)
+        msg = str(ex)
+    return msg
+
+
+def import_bulk_group(rows):
+    """
+    Imports the entries of a bulk import that depend on each other, one after the other.
+    Used as task for the worker processes.
+
+    :param rows: the manifest rows to import
+    :type rows: list
+    :return: the error messages
+    :rtype: list
+    """
+    result = []
+    try:
+        for row in rows:
+            msg = import_bulk_entry(row)
+            if msg is not None:
+                result.append(msg)
+    finally:
+        connections.close_all()
+    return result
+
+
+def bulk_workers(num_groups):
+    """
+    Determines the number of worker processes to use for a bulk import.
+    SQLite only allows a single writer, hence all imports run in the current process.
+
+    :param num_groups: the number of independent groups of imports
+    :type num_groups: int
+    :return: the number of workers
+    :rtype: int
+    """
+    if connection.vendor == 'sqlite':
+        return 1
+    return max(1, min(reporting.settings.IMPORT_BULK_WORKERS, num_groups))
+
+
 def import_bulk(csv, email=None):
     """
     Performs a bulk import. The CSV file has to have the following layout
     (headers must match!):
 
-    type,year,file,isgzip,encoding
-    graderesults,2007,/some/where/2007.csv.gz,True,iso-8859-1
-    graderesults,2006,/some/where/2006.csv,False,iso-8859-1
-    scholarships,,/some/where/scholarships.csv,False,iso-8859-1
-    supervisors,,/some/where/supervisors.csv,False,iso-8859-1
+    type,year,file,encoding
+    graderesults,2007,/some/where/2007.csv.gz,iso-8859-1
+    graderesults,2006,/some/where/2006.csv.xz,iso-8859-1
+    scholarships,,/some/where/scholarships.csv,iso-8859-1
+    supervisors,,/some/where/supervisors.csv.bz2,iso-8859-1
     ...
 
+    The files (and the manifest itself) can be compressed (gzip, bz2, xz, zstd),
+    which gets detected automatically. The isgzip column of older manifests is ignored.
+
+    Entries with the same type and year get imported in the order they are listed,
+    all other entries in parallel, using up to IMPORT_BULK_WORKERS processes.
+    The student dates are populated once all imports have finished.
+
     :param csv: the CSV file with the files to bulk import
     :type csv: str
     :param email: the (optional) email address to send a notification to
@@ -470,57 +1304,53 @@ def import_bulk(csv, email=None):
     :rtype: str
     """
     result = []
-    set_maintenance_mode(True)
+    groups = OrderedDict()
+    if not use_shadow_tables():
+        set_maintenance_mode(True)
     try:
-        csvfile = open(csv)
-        reader = DictReader(csvfile)
-        for row in reader:
-            if len(row) != 5:
-                continue
-            try:
-                logger.debug("Importing: " + str(row))
-                if row['type'] == 'graderesults':
-                    msg = import_grade_results(int(row['year']), row['file'], (row['isgzip'] == 'True'), row['encoding'], delete=False)
-                    if msg is None:
-                        update_tablestatus(GradeResults._meta.db_table)
-                    else:
-                        result.append(msg)
-                elif row['type'] == 'coursdefs':
-                    msg = import_grade_results(int(row['year']), row['file'], row['encoding'], delete=False)
-                    if msg is None:
-                        update_tablestatus(CourseDefs._meta.db_table)
-                    else:
-                        result.append(msg)
-                elif row['type'] == 'supervisors':
-                    msg = import_supervisors(row['file'], row['encoding'], delete=False)
-                    if msg is None:
-                        update_tablestatus(Supervisors._meta.db_table)
-                    else:
-                        result.append(msg)
-                elif row['type'] == 'scholarships':
-                    msg = import_scholarships(row['file'], row['encoding'], delete=False)
-                    if msg is None:
-                        update_tablestatus(Scholarship._meta.db_table)
-                    else:
-                        result.append(msg)
-                elif row['type'] == 'associatedrole':
-                    msg = import_associatedrole(row['file'], row['encoding'], delete=False)
-                    if msg is None:
-                        update_tablestatus(AssociatedRole._meta.db_table)
-                    else:
+        # group entries by type/year
+        with open_text(csv) as csvfile:
+            reader = DictReader(csvfile)
+            for row in reader:
+                if (row.get('type') is None) or (row.get('file') is None) or (row.get('encoding') is None):
+                    continue
+                key = (row['type'], row['year'])
+                if key not in groups:
+                    groups[key] = []
+                groups[key].append(dict(row))
+
+        workers = bulk_workers(len(groups))
+        logger.info("Bulk import: %d group(s), %d worker(s)" % (len(groups), workers))
+        if workers == 1:
+            for rows in groups.values():
+                for row in rows:
+                    msg = import_bulk_entry(row)
+                    if msg is not None:
                         result.append(msg)
-                else:
-                    result.append("Unhandled file type: " + str(row['type']))
-            except Exception as ex:
-                traceback.print_exc(file=sys.stdout)
-                result.append(str(ex))
+        else:
+            # workers must not share the connection of this process
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for msgs in executor.map(import_bulk_group, list(groups.values())):
+                    result.extend(msgs)
     except Exception as ex:
         traceback.print_exc(file=sys.stdout)
         result.append(str(ex))
 
+    # dimensions of the imported tables, once for all their entries
+    tables = []
+    for rows in groups.values():
+        for row in rows:
+            if row['type'] == 'graderesults':
+                tables.append(GradeResults._meta.db_table)
+            elif row['type'] == 'scholarships':
+                tables.append(Scholarship._meta.db_table)
+    for table in sorted(set(tables)):
+        rebuild_dimensions(table)
+
     if len(result) == 0:
         logger.info("Populating student dates")
-        populate_student_dates()
+        populate_student_dates(incremental=True)
         update_tablestatus(StudentDates._meta.db_table)
         result_msg = None
     else:
@@ -532,330 +1362,341 @@ def import_bulk(csv, email=None):
     return result_msg
 
 
-def queue_populate_student_dates(email=None):
+MASTER_PAPER_PATTERN = '([A-Z]+)59([3456789])-(.*)'
+""" the regular expression for paper occurrences that count towards a master's thesis """
+
+
+def grade_to_status(final_grade_status, final_grade):
+    """
+    Turns the final grade status and final grade of a student's latest grade
+    result into the status of the study.
+
+    :param final_grade_status: the final grade status (eg C or N)
+    :type final_grade_status: str
+    :param final_grade: the final grade (eg WD)
+    :type final_grade: str
+    :return: the status (finished/current/withdrawn), None if not available
+    :rtype: str
+    """
+
+    result = final_grade_status
+    if result == "":
+        result = None
+    if result == "C":
+        result = "finished"
+    if result == "N":
+        result = "current"
+    if final_grade == "WD":
+        result = "withdrawn"
+    return result
+
+
+def query_by_student(cursor, sql):
+    """
+    Executes the query and returns the rows as dictionary, using the first
+    column (the student ID) as key and the remaining columns as value (tuple).
+
+    :param cursor: the database cursor to use
+    :param sql: the query to execute
+    :type sql: str
+    :return: the dictionary with student ID -> remaining columns
+    :rtype: dict
+    """
+
+    result = dict()
+    cursor.execute(sql)
+    for row in cursor.fetchall():
+        result[str(row[0]).strip()] = row[1:]
+    return result
+
+
+def calculate_student_dates(students):
+    """
+    Calculates the start/end dates, months, full time flag and status of
+    master and PhD students in a set-based fashion, i.e., using a fixed number
+    of queries across all students rather than per student.
+
+    :param students: the SQL sub-query that returns the student IDs to calculate the dates for
+    :type students: str
+    :return: the list of StudentDates objects (not saved)
+    :rtype: list
+    """
+
+    table = GradeResults._meta.db_table
+    table_super = Supervisors._meta.db_table
+    cursor = connection.cursor()
+
+    # master - months, start date, end date
+    master = query_by_student(cursor, """
+        select student_id,
+          sum(credits / cast(regexp_replace(paper_occurrence, '%s', '\\2') as integer) / 30 * 12),
+          min(occurrence_startdate),
+          max(case when final_grade is not null then occurrence_enddate end)
+        from %s
+        where student_id in (%s)
+        and programme_type_code = 'MD'
+        and paper_occurrence ~ '%s'
+        group by student_id
+        """ % (MASTER_PAPER_PATTERN, table, students, MASTER_PAPER_PATTERN))
+
+    # master - school/department of earliest paper
+    master_unit = query_by_student(cursor, """
+        select distinct on (student_id) student_id, owning_school_clevel, owning_department_clevel
+        from %s
+        where student_id in (%s)
+        and programme_type_code = 'MD'
+        and paper_occurrence ~ '%s'
+        order by student_id, occurrence_startdate, id
+        """ % (table, students, MASTER_PAPER_PATTERN))
+
+    # master - full time
+    master_fulltime = query_by_student(cursor, """
+        select student_id, avg(credits) >= %d
+        from %s
+        where student_id in (%s)
+        and programme_type_code = 'MD'
+        group by student_id
+        """ % (FULL_TIME_CREDITS, table, students))
+
+    # master - status of latest year
+    master_status = query_by_student(cursor, """
+        select distinct on (student_id) student_id, final_grade_status, final_grade
+        from %s
+        where student_id in (%s)
+        and programme_type_code = 'MD'
+        and paper_occurrence ~ '%s'
+        order by student_id, year desc, id desc
+        """ % (table, students, MASTER_PAPER_PATTERN))
+
+    # PhD - months, start date, end date, full time
+    phd = query_by_student(cursor, """
+        select student_id,
+          sum(coalesce(student_credit_points, credits_per_student) / nullif(credits, 0)) * 12,
+          min(occurrence_startdate),
+          max(occurrence_enddate),
+          avg(credits_per_student) >= %d
+        from %s
+        where student_id in (%s)
+        and programme_type_code = 'DP'
+        group by student_id
+        """ % (FULL_TIME_CREDITS, table, students))
+
+    # PhD - school/department of earliest paper
+    phd_unit = query_by_student(cursor, """
+        select distinct on (student_id) student_id, owning_school_clevel, owning_department_clevel
+        from %s
+        where student_id in (%s)
+        and programme_type_code = 'DP'
+        order by student_id, occurrence_startdate, id
+        """ % (table, students))
+
+    # PhD - status of latest year
+    phd_status = query_by_student(cursor, """
+        select distinct on (student_id) student_id, final_grade_status, final_grade
+        from %s
+        where student_id in (%s)
+        and programme_type_code = 'DP'
+        and final_grade != '...'
+        and final_grade != ''
+        order by student_id, year desc, id desc
+        """ % (table, students))
+
+    # PhD - proposed enrolment/completion date from supervisors
+    phd_super = query_by_student(cursor, """
+        select student_id,
+          max(proposed_enrolment_date),
+          max(case when completion_date > '1900-01-01' then completion_date end)
+        from %s
+        where student_id in (%s)
+        and active = 'true'
+        and program = 'DP'
+        group by student_id
+        """ % (table_super, students))
+
+    result = []
+    for sid in set(phd.keys()) | set(phd_super.keys()):
+        phd_months, phd_start, phd_end, phd_fulltime = phd.get(sid, (None, None, None, None))
+        phd_school, phd_dept = phd_unit.get(sid, ('', ''))
+        proposed_start, completion = phd_super.get(sid, (None, None))
+        if (proposed_start is not None) and ((phd_start is None) or (proposed_start > phd_start)):
+            phd_start = proposed_start
+        if completion is not None:
+            phd_end = completion
+        if phd_start is None:
+            continue
+        r = StudentDates()
+        r.student_id = sid
+        r.program = "DP"
+        r.start_date = phd_start
+        r.end_date = phd_end if phd_end is not None else '9999-12-31'
+        r.months = phd_months
+        r.school = phd_school
+        r.department = phd_dept
+        r.full_time = phd_fulltime
+        r.status = grade_to_status(*phd_status[sid]) if sid in phd_status else "current"
+        result.append(r)
+
+    for sid in master.keys():
+        master_months, master_start, master_end = master[sid]
+        if master_start is None:
+            continue
+        master_school, master_dept = master_unit.get(sid, ('', ''))
+        r = StudentDates()
+        r.student_id = sid
+        r.program = "MD"
+        r.start_date = master_start
+        r.end_date = master_end if master_end is not None else '9999-12-31'
+        r.months = master_months
+        r.school = master_school
+        r.department = master_dept
+        r.full_time = master_fulltime.get(sid, (None,))[0]
+        r.status = grade_to_status(*master_status[sid]) if sid in master_status else None
+        result.append(r)
+
+    return result
+
+
+def mark_student_dates(students):
+    """
+    Marks the students for recalculating their start/end dates.
+
+    :param students: the SQL sub-query that returns the student IDs to mark
+    :type students: str
+    """
+
+    table = StudentDatesPending._meta.db_table
+    cursor = connection.cursor()
+    cursor.execute("""
+        insert into %s (student_id)
+        select distinct(s.student_id)
+        from (%s) s
+        where s.student_id is not null
+        and s.student_id not in (select student_id from %s)
+        """ % (table, students, table))
+
+
+def queue_populate_student_dates(email=None, incremental=True):
     """
     Queues the population of the student dates.
 
     :param email: the (optional) email address to send a notification to
     :type email: str
+    :param incremental: whether to only recalculate the students touched by imports
+    :type incremental: bool
+    :return: None if successful, otherwise error message
+    :rtype: str
     """
 
     update_tablestatus(StudentDates._meta.db_table, "Processing...")
-    populate_student_dates(email=email)
-    update_tablestatus(StudentDates._meta.db_table)
+    msg = populate_student_dates(email=email, incremental=incremental)
+    update_tablestatus(StudentDates._meta.db_table, msg=msg)
+    return msg
 
 
-def populate_student_dates(email=None):
+def populate_student_dates(email=None, incremental=False):
     """
-    Populates the studentdates table. Truncates the table first.
+    Populates the studentdates table. Either recalculates the dates of all
+    supervised students and replaces the content of the table or, in
+    incremental mode, only the ones of students that were marked by imports.
 
     :param email: the (optional) email address to send a notification to
     :type email: str
+    :param incremental: whether to only recalculate the students touched by imports
+    :type incremental: bool
     :return: None if successful, otherwise error message
     :rtype: str
     """
 
-    set_maintenance_mode(True)
-
-    # delete old rows
-    StudentDates.objects.all().delete()
+    result = None
+    table_pending = StudentDatesPending._meta.db_table
+    profile = ImportProfile(StudentDates._meta.db_table)
 
-    # get all students that are supervised
-    table_super = Supervisors._meta.db_table
-    cursor = connection.cursor()
-    cursor.execute("""
-        SELECT DISTINCT(student_id)
-        FROM %s
-        """ % table_super)
+    set_maintenance_mode(True)
 
-    table = GradeResults._meta.db_table
-    cursor2 = connection.cursor()
-    count = 0
-    for row in cursor.fetchall():
-        sid = str(row[0]).strip()
-        count += 1
-        logger.debug(str(count) + "/studentid: " + sid)
-
-        master_months = None
-        master_start = None
-        master_end = None
-        master_school = ''
-        master_dept = ''
-        master_fulltime = None
-        master_status = None
-        phd_months = None
-        phd_start = None
-        phd_end = None
-        phd_school = ''
-        phd_dept = ''
-        phd_fulltime = None
-        phd_status = None
-        try:
-            # master - months
-            sql = """
-                select sum(credits / cast(regexp_replace(paper_occurrence, '([A-Z]+)59([3456789])-(.*)', '\\2') as integer) / 30 * 12), count(*)
-                from %s
-                where student_id = '%s'
-                and programme_type_code = 'MD'
-                and paper_occurrence ~ '([A-Z]+)59([3456789])-(.*)'
-                group by student_id
-                """ % (table, sid)
-            cursor2.execute(sql)
-            for row2 in cursor2.fetchall():
-                master_months = row2[0]
-                break
-
-            # master - start date
-            sql = """
-                select min(occurrence_startdate), owning_school_clevel, owning_department_clevel
-                from %s
-                where student_id = '%s'
-                and programme_type_code = 'MD'
-                and paper_occurrence ~ '([A-Z]+)59([3456789])-(.*)'
-                group by student_id, owning_school_clevel, owning_department_clevel
-                """ % (table, sid)
-            cursor2.execute(sql)
-            for row2 in cursor2.fetchall():
-                master_start = row2[0]
-                master_school = row2[1]
-                master_dept = row2[2]
-                break
-
-            # master - end date
-            sql = """
-                select max(occurrence_enddate)
-                from %s
-                where student_id = '%s'
-                and programme_type_code = 'MD'
-                and paper_occurrence ~ '([A-Z]+)59([3456789])-(.*)'
-                and final_grade is not null
-                group by student_id
-                """ % (table, sid)
-            cursor2.execute(sql)
-            for row2 in cursor2.fetchall():
-                master_end = row2[0]
-                break
-
-            # master - full time
-            sql = """
-                select avg(credits) >= %d
-                from %s
-                where student_id = '%s'
-                and programme_type_code = 'MD'
-                """ % (FULL_TIME_CREDITS, table, sid)
-            cursor2.execute(sql)
-            for row2 in cursor2.fetchall():
-                master_fulltime = row2[0]
-                break
-
-            # master - status
-            sql = """
-                select student_id, name, year, final_grade_status, final_grade
-                from %s
-                where student_id = '%s'
-                and programme_type_code = 'MD'
-                and paper_occurrence ~ '([A-Z]+)59([3456789])-(.*)'
-                order by year desc
-                """ % (table, sid)
-            cursor2.execute(sql)
-            for row2 in cursor2.fetchall():
-                master_status = row2[3]
-                if master_status == "":
-                    master_status = None
-                if master_status == "C":
-                    master_status = "finished"
-                if master_status == "N":
-                    master_status = "current"
-                if row2[4] == "WD":
-                    master_status = "withdrawn"
-                break
-
-            # PhD - months
-            sql = """
-                select sum(coalesce(student_credit_points, credits_per_student) / credits) * 12, count(*)
-                from %s
-                where student_id = '%s'
-                and programme_type_code = 'DP'
-                group by student_id
-                """ % (table, sid)
-            cursor2.execute(sql)
-            for row2 in cursor2.fetchall():
-                phd_months = row2[0]
-                break
-
-            # PhD - start date (1)
-            sql = """
-                select min(occurrence_startdate), owning_school_clevel, owning_department_clevel
-                from %s
-                where student_id = '%s'
-                and programme_type_code = 'DP'
-                group by student_id, owning_school_clevel, owning_department_clevel
-                """ % (table, sid)
-            cursor2.execute(sql)
-            for row2 in cursor2.fetchall():
-                phd_start = row2[0]
-                phd_school = row2[1]
-                phd_dept = row2[2]
-                break
-
-            # PhD - start date (2)
-            sql = """
-                select proposed_enrolment_date
-                from %s
-                where student_id = '%s'
-                and active = 'true'
-                and program = 'DP'
-                """ % (table_super, sid)
-            cursor2.execute(sql)
-            for row2 in cursor2.fetchall():
-                if (phd_start is None) or (row2[0] > phd_start):
-                    phd_start = row2[0]
-                break
-
-            # PhD - end date (1)
-            sql = """
-                select completion_date
-                from %s
-                where student_id = '%s'
-                and active = 'true'
-                and program = 'DP'
-                and completion_date > '1900-01-01'
-                """ % (table_super, sid)
-            cursor2.execute(sql)
-            for row2 in cursor2.fetchall():
-                phd_end = row2[0]
-                break
-
-            # PhD - end date (2)
-            if phd_end is None:
-                sql = """
-                    select occurrence_enddate
-                    from %s
-                    where student_id = '%s'
-                    and programme_type_code = 'DP'
-                    order by occurrence_enddate desc
-                    """ % (table, sid)
-                cursor2.execute(sql)
-                for row2 in cursor2.fetchall():
-                    phd_end = row2[0]
-                    break
-
-            # PhD - full time
-            sql = """
-                select avg(credits_per_student) >= %d
-                from %s
-                where student_id = '%s'
-                and programme_type_code = 'DP'
-                """ % (FULL_TIME_CREDITS, table, sid)
-            cursor2.execute(sql)
-            for row2 in cursor2.fetchall():
-                phd_fulltime = row2[0]
-                break
-
-            # PhD - status
-            phd_status = "current"
-            sql = """
-                select student_id, name, year, final_grade_status, final_grade
-                from %s
-                where student_id = '%s'
-                and programme_type_code = 'DP'
-                and final_grade != '...'
-                and final_grade != ''
-                order by year desc
-                """ % (table, sid)
-            cursor2.execute(sql)
-            for row2 in cursor2.fetchall():
-                phd_status = row2[3]
-                if phd_status == "":
-                    phd_status = None
-                if phd_status == "C":
-                    phd_status = "finished"
-                if phd_status == "N":
-                    phd_status = "current"
-                if row2[4] == "WD":
-                    phd_status = "withdrawn"
-                break
-
-            # save
-            if phd_start is not None:
-                r = StudentDates()
-                r.student_id = sid
-                r.program = "DP"
-                r.start_date = phd_start
-                r.end_date = phd_end if phd_end is not None else '9999-12-31'
-                r.months = phd_months
-                r.school = phd_school
-                r.department = phd_dept
-                r.full_time = phd_fulltime
-                r.status = phd_status
-                r.save()
-            if master_start is not None:
-                r = StudentDates()
-                r.student_id = sid
-                r.program = "MD"
-                r.start_date = master_start
-                r.end_date = master_end if master_end is not None else '9999-12-31'
-                r.months = master_months
-                r.school = master_school
-                r.department = master_dept
-                r.full_time = master_fulltime
-                r.status = master_status
-                r.save()
-
-        except Exception as ex:
-            msg = "PhD: id=%s, start=%s, end=%s, months=%s" % (sid, phd_start, phd_end, phd_months)
-            msg += "\n" + "Master: id=%s, start=%s, end=%s, months=%s" % (sid, master_start, master_end, master_months)
-            logger.exception(msg=msg)
-
-        # progress
-        if (count % 1000) == 0:
-            update_tablestatus(StudentDates._meta.db_table, "Processed " + str(count) + " students...")
+    try:
+        # students marked up to now, later marks are left for the next run
+        max_pending = StudentDatesPending.objects.aggregate(max_id=Max('id'))['max_id']
+        if max_pending is None:
+            max_pending = 0
+        pending = "select student_id from %s where id <= %d" % (table_pending, max_pending)
+
+        # students that are supervised
+        students = "select distinct(student_id) from %s" % Supervisors._meta.db_table
+        if incremental:
+            students += " where student_id in (%s)" % pending
+        mark = profile.mark()
+        if incremental and (max_pending == 0):
+            rows = []
+        else:
+            rows = calculate_student_dates(students)
+        logger.info("Calculated %d student dates" % len(rows))
+        profile.add_since("calculate", mark)
+
+        # replace old rows
+        with transaction.atomic():
+            mark = profile.mark()
+            if incremental:
+                cursor = connection.cursor()
+                cursor.execute("delete from %s where student_id in (%s)" % (StudentDates._meta.db_table, pending))
+            else:
+                StudentDates.objects.all().delete()
+            profile.add_since("delete", mark)
+            writer = BulkWriter(StudentDates)
+            for r in rows:
+                writer.add(r)
+            profile.rows = writer.close()
+            profile.add("write", writer.elapsed)
+            StudentDatesPending.objects.all().filter(id__lte=max_pending).delete()
+    except Exception as ex:
+        msg = traceback.format_exc()
+        logger.error(msg=msg)
+        result = msg
 
     set_maintenance_mode(False)
 
+    # the data is already committed, a failure only leaves the previous dimensions in place
+    if result is None:
+        mark = profile.mark()
+        rebuild_dimensions(StudentDates._meta.db_table)
+        profile.add_since("dimensions", mark)
+    profile.finish(result)
+
     if email is not None:
-        send_email(email, 'Student dates', 'Finished calculating dates')
+        send_email(email, 'Student dates', 'Finished calculating dates' if (result is None) else 'Failed calculating dates: ' + result)
+
+    return result
+
 
-    return None
+SUPERVISORS_DATE_FORMATS = {
+    "date_agreed": "%d/%m/%Y",
+}
+""" the date formats of the supervisors per field name, all others use %d %b %Y """
 
 
-def parse_supervisors_date(name, value):
+def parse_supervisors_date(name, value, cache=None):
     """
     Parses the various date formats of the supervisors.
     :param name:
     :param value:
+    :param cache: the (optional) cache to use
     :return:
     """
     if (value == "") or (value == "*invalid*") or (value is None):
         return "0001-01-01"
-    if name == "date_agreed":
-        dformat = "%d/%m/%Y"
-    else:
-        dformat = "%d %b %Y"
-    try:
-        d = datetime.strptime(value, dformat)
-        return d.strftime("%Y-%m-%d")
-    except Exception as ex:
-        logger.exception(msg="name=" + name + ", value=" + value + ", format=" + dformat)
-        return None
+    return parse_date(name, value, SUPERVISORS_DATE_FORMATS.get(name, "%d %b %Y"), cache=cache)
 
 
-def parse_associatedrole_date(name, value):
+def parse_associatedrole_date(name, value, cache=None):
     """
     Parses the various date formats of the associated role.
     :param name:
     :param value:
+    :param cache: the (optional) cache to use
     :return:
     """
     if (value == "") or (value == "*invalid*") or (value is None):
         return "0001-01-01"
-    dformat = "%d/%m/%Y"
-    try:
-        d = datetime.strptime(value, dformat)
-        return d.strftime("%Y-%m-%d")
-    except Exception as ex:
-        logger.exception(msg="name=" + name + ", value=" + value + ", format=" + dformat)
-        return None
+    return parse_date(name, value, "%d/%m/%Y", cache=cache)
 
 
 def award_to_program(award):
@@ -877,28 +1718,57 @@ def award_to_program(award):
         return "Other"
 
 
-def queue_import_supervisors(csv, encoding, email=None):
+SUPERVISORS_COLUMNS = [
+    ('student', ['student'], None, REQUIRED),
+    ('supervisor', ['supervisor'], None, REQUIRED),
+    ('active_roles', ['active_roles'], None, REQUIRED),
+    ('entity', ['entity'], None, REQUIRED),
+    ('agreement_status', ['agreement_status'], None, REQUIRED),
+    ('date_agreed', ['date_agreed'], None, REQUIRED),
+    ('completion_date', ['completion_date'], None, REQUIRED),
+    ('proposed_enrolment_date', ['proposed_enrolment_date'], None, REQUIRED),
+    ('proposed_research_topic', ['proposed_research_topic'], None, REQUIRED),
+    ('title', ['title'], None, REQUIRED),
+    ('quals', ['quals'], None, REQUIRED),
+    ('comments', ['comments'], None, REQUIRED),
+]
+""" the column definitions of the supervisors (name, aliases, converter, default value) """
+
+SUPERVISORS_NATURAL_KEY = ('student_id', 'supervisor', 'entity')
+""" the fields identifying a supervisor row when merging """
+
+
+def queue_import_supervisors(csv, encoding, email=None, delete=True, merge=False):
     """
     Queues the import of supervisors.
 
-    :param csv: the CSV file to import
+    :param csv: the CSV file to import, can be compressed (gzip, bz2, xz, zstd)
     :type csv: str
     :param encoding: the file encoding (eg utf-8)
     :type encoding: str
     :param email: the (optional) email address to send a notification to
     :type email: str
+    :param delete: whether to delete the import file afterwards
+    :type delete: bool
+    :param merge: whether to merge the rows into the table by natural key, only applying the differences
+    :type merge: bool
+    :return: None if successful, otherwise error message
+    :rtype: str
     """
 
     update_tablestatus(Supervisors._meta.db_table, "Importing...")
-    msg = import_supervisors(csv, encoding, email=email)
-    update_tablestatus(Supervisors._meta.db_table, msg=msg)
+    msg = import_supervisors(csv, encoding, email=email, delete=delete, merge=merge)
+    # successful merges record their change summary
+    if (msg is not None) or not merge:
+        update_tablestatus(Supervisors._meta.db_table, msg=msg)
+    return msg
 
 
-def import_supervisors(csv, encoding, email=None, delete=True):
+def import_supervisors(csv, encoding, email=None, delete=True, merge=False):
     """
     Imports the supervisors (Jade Export).
 
-    :param csv: the CSV file to import
+    :param csv: the CSV file to import, can be compressed (gzip, bz2, xz, zstd)
     :type csv: str
     :param encoding: the file encoding (eg utf-8)
     :type encoding: str
@@ -906,28 +1776,48 @@ def import_supervisors(csv, encoding, email=None, delete=True):
     :type email: str
     :param delete: whether to delete the data file
     :type delete: bool
+    :param merge: whether to merge the rows into the table by natural key, only applying the differences
+    :type merge: bool
     :return: None if successful, otherwise error message
     :rtype: str
     """
 
     result = None
-
-    set_maintenance_mode(True)
-
-    # empty table
-    Supervisors.objects.all().delete()
+    profile = ImportProfile(Supervisors._meta.db_table)
+
+    # students of old and new supervisor data need their dates recalculated (merges know the affected ones)
+    students = "select student_id from %s" % Supervisors._meta.db_table
+    if not merge:
+        mark_student_dates(students)
+    # shadow table or empty table (merges write to the live table)
+    shadow = None
+    if not merge:
+        if use_shadow_tables():
+            shadow = ShadowTable(Supervisors)
+            shadow.create()
+        else:
+            set_maintenance_mode(True)
+            mark = profile.mark()
+            Supervisors.objects.all().delete()
+            profile.add_since("delete", mark)
     # import
     p1 = re.compile('.*\/')
     p2 = re.compile(' .*')
     try:
-        with open(csv, encoding=encoding) as csvfile:
-            reader = DictReader(csvfile)
-            reader.fieldnames = [name.lower().replace(" ", "_") for name in reader.fieldnames]
-            count = 0
-            for row in reader:
-                count += 1
-                truncate_strings(row, 250)
-                encode_strings(row, 'utf-8')
+        with open_text(csv, encoding=encoding) as csvfile:
+            mark = profile.mark()
+            reader = csv_reader(csvfile)
+            mapper = RowMapper(next(reader), SUPERVISORS_COLUMNS)
+            cache = DateCache()
+            progress = ImportProgress(Supervisors._meta.db_table, fileobj=source_file(csvfile))
+            if merge:
+                writer = MergeWriter(Supervisors, SUPERVISORS_NATURAL_KEY, progress=progress.update)
+            else:
+                writer = BulkWriter(Supervisors, table=None if shadow is None else shadow.staging, progress=progress.update)
+            for values in profile.timed("parse csv", reader):
+                if len(values) == 0:
+                    continue
+                row = mapper.map(values)
                 r = Supervisors()
                 r.student_id = row['student'][row['student'].rfind(' ')+1:]  # extract ID at end of string
                 r.student = row['student']
@@ -935,9 +1825,9 @@ def import_supervisors(csv, encoding, email=None, delete=True):
                 r.active_roles = row['active_roles']
                 r.entity = row['entity']
                 r.agreement_status = row['agreement_status']
-                r.date_agreed = parse_supervisors_date('date_agreed', row['date_agreed'])
-                r.completion_date = parse_supervisors_date('completion_date', row['completion_date'])
-                r.proposed_enrolment_date = parse_supervisors_date('proposed_enrolment_date', row['proposed_enrolment_date'])
+                r.date_agreed = parse_supervisors_date('date_agreed', row['date_agreed'], cache=cache)
+                r.completion_date = parse_supervisors_date('completion_date', row['completion_date'], cache=cache)
+                r.proposed_enrolment_date = parse_supervisors_date('proposed_enrolment_date', row['proposed_enrolment_date'], cache=cache)
                 r.proposed_research_topic = row['proposed_research_topic']
                 # normalize title a bit
                 title = row['title']
@@ -955,10 +1845,23 @@ def import_supervisors(csv, encoding, email=None, delete=True):
                 # determine program type
                 program = p2.sub('', p1.sub('', row['entity'])).upper()
                 r.program = award_to_program(program)
-                r.save()
-                # progress
-                if (count % 1000) == 0:
-                    update_tablestatus(Supervisors._meta.db_table, "Imported " + str(count) + " rows...")
+                writer.add(r)
+            count = writer.close()
+            cache.log(Supervisors._meta.db_table)
+            profile.add("write", writer.elapsed)
+            profile.add("parse dates", cache.elapsed)
+            profile.add_since("convert", mark)
+            profile.rows = count
+        if shadow is not None:
+            mark = profile.mark()
+            shadow.swap(count)
+            shadow = None
+            profile.add_since("swap", mark)
+        if merge:
+            mark_student_ids(writer.students)
+            update_tablestatus(Supervisors._meta.db_table, msg=writer.summary())
+        else:
+            mark_student_dates(students)
     except Exception as ex:
         msg = traceback.format_exc()
         logger.error(msg=msg)
@@ -971,6 +1874,10 @@ def import_supervisors(csv, encoding, email=None, delete=True):
                 msg = traceback.format_exc()
                 logger.error(msg=msg)
                 result = msg
+        if shadow is not None:
+            shadow.drop()
+
+    profile.finish(result)
 
     if email is not None:
         send_email(email, 'Import: supervisors', 'Import succeeded' if (result is None) else 'Import failed: ' + result)
@@ -978,28 +1885,50 @@ def import_supervisors(csv, encoding, email=None, delete=True):
     return result
 
 
-def queue_import_scholarships(csv, encoding, email=None):
+SCHOLARSHIPS_COLUMNS = [
+    ('person_id', ['person_id'], None, REQUIRED),
+    ('template', ['template'], None, REQUIRED),
+    ('status', ['status'], None, REQUIRED),
+    ('decision', ['decision'], None, REQUIRED),
+    ('year', ['year'], None, REQUIRED),
+]
+""" the column definitions of the scholarships (name, aliases, converter, default value) """
+
+SCHOLARSHIPS_NATURAL_KEY = ('student_id', 'name', 'year')
+""" the fields identifying a scholarship row when merging """
+
+
+def queue_import_scholarships(csv, encoding, email=None, delete=True, merge=False):
     """
     Queues the import of scholarships.
 
-    :param csv: the CSV file to import
+    :param csv: the CSV file to import, can be compressed (gzip, bz2, xz, zstd)
     :type csv: str
     :param encoding: the file encoding (eg utf-8)
     :type encoding: str
     :param email: the (optional) email address to send a notification to
     :type email: str
+    :param delete: whether to delete the import file afterwards
+    :type delete: bool
+    :param merge: whether to merge the rows into the table by natural key, only applying the differences
+    :type merge: bool
+    :return: None if successful, otherwise error message
+    :rtype: str
     """
 
     update_tablestatus(Scholarship._meta.db_table, "Importing...")
-    msg = import_scholarships(csv, encoding, email=email)
-    update_tablestatus(Scholarship._meta.db_table, msg=msg)
+    msg = import_scholarships(csv, encoding, email=email, delete=delete, merge=merge)
+    # successful merges record their change summary
+    if (msg is not None) or not merge:
+        update_tablestatus(Scholarship._meta.db_table, msg=msg)
+    return msg
 
 
-def import_scholarships(csv, encoding, email=None, delete=True):
+def import_scholarships(csv, encoding, email=None, delete=True, merge=False, dimensions=True):
     """
     Imports the scholarships (Jade Export).
 
-    :param csv: the CSV file to import
+    :param csv: the CSV file to import, can be compressed (gzip, bz2, xz, zstd)
     :type csv: str
     :param encoding: the file encoding (eg utf-8)
     :type encoding: str
@@ -1007,36 +1936,61 @@ def import_scholarships(csv, encoding, email=None, delete=True):
     :type email: str
     :param delete: whether to delete the data file
     :type delete: bool
+    :param merge: whether to merge the rows into the table by natural key, only applying the differences
+    :type merge: bool
+    :param dimensions: whether to rebuild the dimensions afterwards (bulk imports rebuild them once at the end)
+    :type dimensions: bool
     :return: None if successful, otherwise error message
     :rtype: str
     """
 
     result = None
-
-    set_maintenance_mode(True)
-
-    # empty table
-    Scholarship.objects.all().delete()
+    profile = ImportProfile(Scholarship._meta.db_table)
+
+    # shadow table or empty table (merges write to the live table)
+    shadow = None
+    if not merge:
+        if use_shadow_tables():
+            shadow = ShadowTable(Scholarship)
+            shadow.create()
+        else:
+            set_maintenance_mode(True)
+            mark = profile.mark()
+            Scholarship.objects.all().delete()
+            profile.add_since("delete", mark)
     # import
     try:
-        with open(csv, encoding=encoding) as csvfile:
-            reader = DictReader(csvfile)
-            reader.fieldnames = [name.lower().replace(" ", "_") for name in reader.fieldnames]
-            count = 0
-            for row in reader:
-                count += 1
-                truncate_strings(row, 250)
-                encode_strings(row, 'utf-8')
+        with open_text(csv, encoding=encoding) as csvfile:
+            mark = profile.mark()
+            reader = csv_reader(csvfile)
+            mapper = RowMapper(next(reader), SCHOLARSHIPS_COLUMNS)
+            progress = ImportProgress(Scholarship._meta.db_table, fileobj=source_file(csvfile))
+            if merge:
+                writer = MergeWriter(Scholarship, SCHOLARSHIPS_NATURAL_KEY, progress=progress.update)
+            else:
+                writer = BulkWriter(Scholarship, table=None if shadow is None else shadow.staging, progress=progress.update)
+            for values in profile.timed("parse csv", reader):
+                if len(values) == 0:
+                    continue
+                row = mapper.map(values)
                 r = Scholarship()
                 r.student_id = row['person_id']
                 r.name = row['template']
                 r.status = row['status']
                 r.decision = row['decision']
                 r.year = int(row['year'])
-                r.save()
-                # progress
-                if (count % 1000) == 0:
-                    update_tablestatus(Scholarship._meta.db_table, "Imported " + str(count) + " rows...")
+                writer.add(r)
+            count = writer.close()
+            profile.add("write", writer.elapsed)
+            profile.add_since("convert", mark)
+            profile.rows = count
+        if shadow is not None:
+            mark = profile.mark()
+            shadow.swap(count)
+            shadow = None
+            profile.add_since("swap", mark)
+        if merge:
+            update_tablestatus(Scholarship._meta.db_table, msg=writer.summary())
 
     except Exception as ex:
         msg = traceback.format_exc()
@@ -1050,6 +2004,15 @@ def import_scholarships(csv, encoding, email=None, delete=True):
                 msg = traceback.format_exc()
                 logger.error(msg=msg)
                 result = msg
+        if shadow is not None:
+            shadow.drop()
+
+    # the data is already committed, a failure only leaves the previous dimensions in place
+    if dimensions and (result is None):
+        mark = profile.mark()
+        rebuild_dimensions(Scholarship._meta.db_table)
+        profile.add_since("dimensions", mark)
+    profile.finish(result)
 
     if email is not None:
         send_email(email, 'Import: scholarships', 'Import succeeded' if (result is None) else 'Import failed: ' + result)
@@ -1057,28 +2020,50 @@ def import_scholarships(csv, encoding, email=None, delete=True):
     return result
 
 
-def queue_import_associatedrole(csv, encoding, email=None):
+ASSOCIATEDROLE_COLUMNS = [
+    ('role', ['role'], None, REQUIRED),
+    ('person', ['person'], None, REQUIRED),
+    ('entity', ['entity'], None, REQUIRED),
+    ('valid_from', ['valid_from'], None, REQUIRED),
+    ('valid_to', ['valid_to'], None, REQUIRED),
+]
+""" the column definitions of the associated role (name, aliases, converter, default value) """
+
+ASSOCIATEDROLE_NATURAL_KEY = ('person', 'role', 'entity')
+""" the fields identifying an associated role row when merging """
+
+
+def queue_import_associatedrole(csv, encoding, email=None, delete=True, merge=False):
     """
     Queues the import of associate role.
 
-    :param csv: the CSV file to import
+    :param csv: the CSV file to import, can be compressed (gzip, bz2, xz, zstd)
     :type csv: str
     :param encoding: the file encoding (eg utf-8)
     :type encoding: str
     :param email: the (optional) email address to send a notification to
     :type email: str
+    :param delete: whether to delete the import file afterwards
+    :type delete: bool
+    :param merge: whether to merge the rows into the table by natural key, only applying the differences
+    :type merge: bool
+    :return: None if successful, otherwise error message
+    :rtype: str
     """
 
     update_tablestatus(AssociatedRole._meta.db_table, "Importing...")
-    msg = import_associatedrole(csv, encoding, email=email)
-    update_tablestatus(AssociatedRole._meta.db_table, msg=msg)
+    msg = import_associatedrole(csv, encoding, email=email, delete=delete, merge=merge)
+    # successful merges record their change summary
+    if (msg is not None) or not merge:
+        update_tablestatus(AssociatedRole._meta.db_table, msg=msg)
+    return msg
 
 
-def import_associatedrole(csv, encoding, email=None, delete=True):
+def import_associatedrole(csv, encoding, email=None, delete=True, merge=False):
     """
     Imports the associated role (Jade Export).
 
-    :param csv: the CSV file to import
+    :param csv: the CSV file to import, can be compressed (gzip, bz2, xz, zstd)
     :type csv: str
     :param encoding: the file encoding (eg utf-8)
     :type encoding: str
@@ -1086,32 +2071,48 @@ def import_associatedrole(csv, encoding, email=None, delete=True):
     :type email: str
     :param delete: whether to delete the data file
     :type delete: bool
+    :param merge: whether to merge the rows into the table by natural key, only applying the differences
+    :type merge: bool
     :return: None if successful, otherwise error message
     :rtype: str
     """
 
     result = None
-
-    set_maintenance_mode(True)
-
-    # empty table
-    AssociatedRole.objects.all().delete()
+    profile = ImportProfile(AssociatedRole._meta.db_table)
+
+    # shadow table or empty table (merges write to the live table)
+    shadow = None
+    if not merge:
+        if use_shadow_tables():
+            shadow = ShadowTable(AssociatedRole)
+            shadow.create()
+        else:
+            set_maintenance_mode(True)
+            mark = profile.mark()
+            AssociatedRole.objects.all().delete()
+            profile.add_since("delete", mark)
     # import
     try:
-        with open(csv, encoding=encoding) as csvfile:
-            reader = DictReader(csvfile)
-            reader.fieldnames = [name.lower().replace(" ", "_") for name in reader.fieldnames]
-            count = 0
-            for row in reader:
-                count += 1
-                truncate_strings(row, 250)
-                encode_strings(row, 'utf-8')
+        with open_text(csv, encoding=encoding) as csvfile:
+            mark = profile.mark()
+            reader = csv_reader(csvfile)
+            mapper = RowMapper(next(reader), ASSOCIATEDROLE_COLUMNS)
+            cache = DateCache()
+            progress = ImportProgress(AssociatedRole._meta.db_table, fileobj=source_file(csvfile))
+            if merge:
+                writer = MergeWriter(AssociatedRole, ASSOCIATEDROLE_NATURAL_KEY, progress=progress.update)
+            else:
+                writer = BulkWriter(AssociatedRole, table=None if shadow is None else shadow.staging, progress=progress.update)
+            for values in profile.timed("parse csv", reader):
+                if len(values) == 0:
+                    continue
+                row = mapper.map(values)
                 r = AssociatedRole()
                 r.role = row['role']
                 r.person = row['person']
                 r.entity = row['entity']
-                r.valid_from = parse_associatedrole_date('valid_from', row['valid_from'])
-                r.valid_to = parse_associatedrole_date('valid_to', row['valid_to'])
+                r.valid_from = parse_associatedrole_date('valid_from', row['valid_from'], cache=cache)
+                r.valid_to = parse_associatedrole_date('valid_to', row['valid_to'], cache=cache)
                 r.active = len(row['valid_to'].strip()) == 0
                 if " - " in r.entity:
                     r.student_id = r.entity[(r.entity.index(" - ") + 3):]
@@ -1119,10 +2120,20 @@ def import_associatedrole(csv, encoding, email=None, delete=True):
                     r.student = r.entity[r.entity.index("Award/") + 6:]
                     r.program = award_to_program(r.student[0:r.student.index(" ")].upper())
                     r.student = r.student[r.student.index(" ") + 1:]
-                r.save()
-                # progress
-                if (count % 1000) == 0:
-                    update_tablestatus(AssociatedRole._meta.db_table, "Imported " + str(count) + " rows...")
+                writer.add(r)
+            count = writer.close()
+            cache.log(AssociatedRole._meta.db_table)
+            profile.add("write", writer.elapsed)
+            profile.add("parse dates", cache.elapsed)
+            profile.add_since("convert", mark)
+            profile.rows = count
+        if shadow is not None:
+            mark = profile.mark()
+            shadow.swap(count)
+            shadow = None
+            profile.add_since("swap", mark)
+        if merge:
+            update_tablestatus(AssociatedRole._meta.db_table, msg=writer.summary())
 
     except Exception as ex:
         msg = traceback.format_exc()
@@ -1136,6 +2147,15 @@ def import_associatedrole(csv, encoding, email=None, delete=True):
                 msg = traceback.format_exc()
                 logger.error(msg=msg)
                 result = msg
+        if shadow is not None:
+            shadow.drop()
+
+    # the data is already committed, a failure only leaves the previous name index in place
+    if result is None:
+        mark = profile.mark()
+        update_name_index()
+        profile.add_since("name index", mark)
+    profile.finish(result)
 
     if email is not None:
         send_email(email, 'Import: associated role', 'Import succeeded' if (result is None) else 'Import failed: ' + result)
@@ -1145,7 +2165,8 @@ def import_associatedrole(csv, encoding, email=None, delete=True):
 
 def update_tablestatus(table, msg=None, timestamp=None):
     """
-    Updates the table status of the specified table.
+    Updates the table status of the specified table, clearing any progress information,
+    and increments its data version.
 
     :param table: the table to update the status for
     :type table: str
@@ -1158,12 +2179,19 @@ def update_tablestatus(table, msg=None, timestamp=None):
     if timestamp is None:
         timestamp = datetime.now()
 
-    TableStatus.objects.all().filter(table=table).delete()
-    r = TableStatus()
-    r.table = table
-    r.timestamp = timestamp
-    r.message = msg
-    r.save()
+    set_tablestatus(table, timestamp, msg)
+    bump_data_version(table)
+
+
+def bump_data_version(table):
+    """
+    Increments the data version of the table, which invalidates the cached reports using the table.
+
+    :param table: the table that got (or is about to get) modified
+    :type table: str
+    """
+
+    TableStatus.objects.all().filter(table=table).update(version=F('version') + 1)
 
 
 def get_tablestatus(table):
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+from django.db import connection, transaction
+from django.db.models import Min, Max
+from dbbackend.models import Dimension, GradeResults
+from supervisors.models import StudentDates, Scholarship
+import traceback
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+DIMENSIONS = OrderedDict([
+    ('graderesults.school', (GradeResults._meta.db_table, 'owning_school_clevel', None, 'year')),
+    ('graderesults.department', (GradeResults._meta.db_table, 'owning_department_clevel', 'owning_school_clevel', 'year')),
+    ('graderesults.paper', (GradeResults._meta.db_table, 'paper_master_code', None, 'year')),
+    ('graderesults.year', (GradeResults._meta.db_table, 'year', None, 'year')),
+    ('studentdates.school', (StudentDates._meta.db_table, 'school', None, 'start_date')),
+    ('scholarship.name', (Scholarship._meta.db_table, 'name', None, 'year')),
+])
+""" the dimensions: table, value column, parent column (or None), year/date column """
+
+
+def year_sql(table, column):
+    """
+    Generates the SQL expression for the year of the column.
+
+    :param table: the table the column belongs to
+    :type table: str
+    :param column: the year or date column
+    :type column: str
+    :return: the SQL expression
+    :rtype: str
+    """
+
+    if table == StudentDates._meta.db_table:
+        # dates up to 1900-01-01 are placeholders
+        return "case when %s > '1900-01-01' then %s end" % (column, connection.ops.date_extract_sql('year', column))
+    return column
+
+
+def rebuild_dimensions(table):
+    """
+    Rebuilds the dimensions of the table, replacing the old values in a single transaction.
+
+    :param table: the table to rebuild the dimensions for (eg dbbackend_graderesults)
+    :type table: str
+    :return: None if successful, otherwise error message
+    :rtype: str
+    """
+
+    names = [name for name in DIMENSIONS if DIMENSIONS[name][0] == table]
+    if len(names) == 0:
+        return None
+
+    try:
+        with transaction.atomic():
+            cursor = connection.cursor()
+            # concurrent rebuilds (eg imports of different years) would insert the values twice
+            if connection.vendor == 'postgresql':
+                cursor.execute("LOCK TABLE %s IN SHARE ROW EXCLUSIVE MODE" % Dimension._meta.db_table)
+            Dimension.objects.all().filter(dimension__in=names).delete()
+            for name in names:
+                _, column, parent, year = DIMENSIONS[name]
+                group = column if parent is None else column + ", " + parent
+                cursor.execute("""
+                    insert into %s (dimension, value, parent, count, min_year, max_year)
+                    select '%s', cast(%s as varchar(250)), %s, count(*), min(%s), max(%s)
+                    from %s
+                    group by %s
+                    """ % (Dimension._meta.db_table, name, column, "null" if parent is None else parent,
+                           year_sql(table, year), year_sql(table, year), table, group))
+        logger.info("%s: rebuilt dimensions %s" % (table, ", ".join(names)))
+        return None
+    except Exception as ex:
+        msg = traceback.format_exc()
+        logger.error("%s: failed to rebuild dimensions, keeping the previous values:\n%s" % (table, msg))
+        return msg
+
+
+def ensure_dimension(name):
+    """
+    Rebuilds the dimension's table dimensions if the dimension has no values yet (eg after upgrading).
+    Empty tables get skipped, as there would be nothing to rebuild.
+
+    :param name: the dimension, see DIMENSIONS
+    :type name: str
+    """
+
+    if Dimension.objects.all().filter(dimension=name).exists():
+        return
+    table = DIMENSIONS[name][0]
+    cursor = connection.cursor()
+    cursor.execute("select 1 from %s limit 1" % table)
+    if cursor.fetchone() is not None:
+        rebuild_dimensions(table)
+
+
+def dimension_values(name, parents=None, pattern=None, non_empty=False, latest_first=False):
+    """
+    Returns the sorted distinct values of the dimension.
+
+    :param name: the dimension, see DIMENSIONS
+    :type name: str
+    :param parents: the parent values to restrict the values to, all if None
+    :type parents: list
+    :param pattern: the (like) pattern the values have to match (eg PSYC9%), all if None
+    :type pattern: str
+    :param non_empty: whether to skip empty values
+    :type non_empty: bool
+    :param latest_first: whether to sort by year (latest first) rather than by value
+    :type latest_first: bool
+    :return: the values
+    :rtype: list
+    """
+
+    ensure_dimension(name)
+    values = Dimension.objects.all().filter(dimension=name)
+    if parents is not None:
+        values = values.filter(parent__in=parents)
+    if pattern is not None:
+        values = values.extra(where=["value like %s"], params=[pattern])
+    if non_empty:
+        values = values.exclude(value__isnull=True).exclude(value='')
+    if latest_first:
+        values = values.order_by('-max_year', 'value')
+    else:
+        values = values.order_by('value')
+    # departments can belong to several schools
+    result = []
+    seen = set()
+    for value in values.values_list('value', flat=True):
+        if value not in seen:
+            seen.add(value)
+            result.append(value)
+    return result
+
+
+def dimension_years(name):
+    """
+    Returns the range of years of the dimension.
+
+    :param name: the dimension, see DIMENSIONS
+    :type name: str
+    :return: the tuple of minimum and maximum year, None if no years
+    :rtype: tuple
+    """
+
+    ensure_dimension(name)
+    years = Dimension.objects.all().filter(dimension=name).aggregate(min_year=Min('min_year'), max_year=Max('max_year'))
+    return years['min_year'], years['max_year']
@@ -0,0 +1,79 @@
+from django.db import connection
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def secondary_indexes(cursor, table):
+    """
+    Returns the indexes of the table that don't back a constraint (eg primary key).
+
+    :param cursor: the cursor to use
+    :type cursor: object
+    :param table: the name of the table
+    :type table: str
+    :return: the list of tuples of index name and CREATE INDEX statement
+    :rtype: list
+    """
+
+    if connection.vendor == 'postgresql':
+        cursor.execute("""
+            select c.relname, pg_get_indexdef(i.indexrelid)
+            from pg_index i, pg_class c, pg_class t
+            where i.indexrelid = c.oid
+            and i.indrelid = t.oid
+            and t.relname = %s
+            and pg_table_is_visible(t.oid)
+            and not exists (select 1 from pg_constraint k where k.conindid = i.indexrelid)
+            order by c.relname
+            """, [table])
+    elif connection.vendor == 'sqlite':
+        cursor.execute("""
+            select name, sql
+            from sqlite_master
+            where type = 'index'
+            and tbl_name = %s
+            and sql is not null
+            order by name
+            """, [table])
+    else:
+        return []
+    return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+def drop_indexes(table):
+    """
+    Removes the secondary indexes of the table, eg before loading a large number of rows.
+
+    :param table: the name of the table
+    :type table: str
+    :return: the removed indexes (name, CREATE INDEX statement)
+    :rtype: list
+    """
+
+    with connection.cursor() as cursor:
+        indexes = secondary_indexes(cursor, table)
+        for name, definition in indexes:
+            cursor.execute("DROP INDEX %s" % name)
+    logger.info("%s: dropped %d indexes" % (table, len(indexes)))
+    return indexes
+
+
+def create_indexes(table, indexes):
+    """
+    Recreates indexes removed with drop_indexes. On PostgreSQL, the indexes get
+    built concurrently (i.e., without blocking writes) unless inside a transaction.
+
+    :param table: the name of the table
+    :type table: str
+    :param indexes: the indexes to create (name, CREATE INDEX statement)
+    :type indexes: list
+    """
+
+    concurrently = (connection.vendor == 'postgresql') and not connection.in_atomic_block
+    with connection.cursor() as cursor:
+        for name, definition in indexes:
+            if concurrently:
+                definition = definition.replace("INDEX %s ON" % name, "INDEX CONCURRENTLY %s ON" % name, 1)
+            cursor.execute(definition)
+    logger.info("%s: created %d indexes" % (table, len(indexes)))
@@ -0,0 +1,366 @@
+from dbbackend.models import Job, GradeResults, CourseDefs
+from supervisors.models import Supervisors, Scholarship, AssociatedRole, StudentDates
+from dbbackend import dbimport
+from django.db import connection, connections, transaction
+from datetime import datetime, timedelta
+import multiprocessing
+import traceback
+import signal
+import socket
+import json
+import time
+import os
+from reporting.tempfile_utils import cleanup_uploads
+import reporting.settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+HANDLERS = {
+    'import_grade_results': (dbimport.queue_import_grade_results, GradeResults._meta.db_table),
+    'import_coursedefs': (dbimport.queue_import_coursedefs, CourseDefs._meta.db_table),
+    'import_supervisors': (dbimport.queue_import_supervisors, Supervisors._meta.db_table),
+    'import_scholarships': (dbimport.queue_import_scholarships, Scholarship._meta.db_table),
+    'import_associatedrole': (dbimport.queue_import_associatedrole, AssociatedRole._meta.db_table),
+    'populate_student_dates': (dbimport.queue_populate_student_dates, StudentDates._meta.db_table),
+    'import_bulk': (dbimport.import_bulk, None),
+}
+""" the job types with their handler (returns None if successful, otherwise error message) and the table they update """
+
+ACTIVE_STATUSES = ['queued', 'running']
+""" the statuses of jobs that haven't completed yet """
+
+UPLOAD_CLEANUP_INTERVAL = 60 * 60
+""" the number of seconds between removing stale files from the upload staging area """
+
+
+class JobCancelled(BaseException):
+    """
+    Raised in the process of a running job when it gets cancelled, derived from
+    BaseException so that the handlers' error handling doesn't swallow it
+    (but their finally blocks still run).
+    """
+    pass
+
+
+def worker_name():
+    """
+    Returns the name identifying the current process as worker.
+
+    :return: the name (host:pid)
+    :rtype: str
+    """
+
+    return "%s:%d" % (socket.gethostname(), os.getpid())
+
+
+def concurrency(job_type):
+    """
+    Returns the maximum number of jobs of the type that can run at the same time.
+
+    :param job_type: the type of job
+    :type job_type: str
+    :return: the maximum number
+    :rtype: int
+    """
+
+    return reporting.settings.JOB_CONCURRENCY.get(job_type, reporting.settings.JOB_DEFAULT_CONCURRENCY)
+
+
+def enqueue(job_type, parameters, user=None, files=None, max_attempts=None):
+    """
+    Adds a job to the queue.
+
+    :param job_type: the type of job, see HANDLERS
+    :type job_type: str
+    :param parameters: the keyword arguments for the handler (must be JSON serializable)
+    :type parameters: dict
+    :param user: the (optional) name of the user that submitted the job
+    :type user: str
+    :param files: the (optional) files to delete once the job has completed
+    :type files: list
+    :param max_attempts: how often to try the job if it gets interrupted, uses JOB_MAX_ATTEMPTS if None
+    :type max_attempts: int
+    :return: the job
+    :rtype: Job
+    """
+
+    if job_type not in HANDLERS:
+        raise Exception("Unknown job type: %s" % job_type)
+    if files is None:
+        files = []
+    if max_attempts is None:
+        max_attempts = reporting.settings.JOB_MAX_ATTEMPTS
+    job = Job()
+    job.job_type = job_type
+    job.parameters = json.dumps(parameters)
+    job.files = json.dumps(files)
+    job.user = user
+    job.max_attempts = max(1, max_attempts)
+    job.run_after = datetime.now()
+    job.save()
+    logger.info("Queued job: %s" % str(job))
+    return job
+
+
+def is_active(job_type):
+    """
+    Checks whether a job of the type is queued or running.
+
+    :param job_type: the type of job
+    :type job_type: str
+    :return: True if queued or running
+    :rtype: bool
+    """
+
+    return Job.objects.all().filter(job_type=job_type, status__in=ACTIVE_STATUSES).exists()
+
+
+def cancel(job_id):
+    """
+    Cancels the job. Queued jobs get cancelled straight away, running ones get
+    terminated by their worker.
+
+    :param job_id: the ID of the job to cancel
+    :type job_id: int
+    :return: True if the job was still queued or running
+    :rtype: bool
+    """
+
+    with transaction.atomic():
+        jobs = Job.objects.select_for_update().filter(id=job_id, status__in=ACTIVE_STATUSES)
+        for job in jobs:
+            if job.status == 'queued':
+                complete(job, 'cancelled', "Cancelled")
+            else:
+                job.cancel_requested = True
+                job.save()
+            return True
+    return False
+
+
+def cleanup(job):
+    """
+    Removes the files of the job.
+
+    :param job: the job to clean up after
+    :type job: Job
+    """
+
+    for f in job.get_files():
+        if os.path.exists(f):
+            os.remove(f)
+
+
+def complete(job, status, msg):
+    """
+    Marks the job as completed (finished, failed, cancelled) and removes its files.
+
+    :param job: the job to complete
+    :type job: Job
+    :param status: the final status
+    :type status: str
+    :param msg: the message to store with the job
+    :type msg: str
+    """
+
+    job.status = status
+    job.message = msg
+    job.finished = datetime.now()
+    job.save()
+    try:
+        cleanup(job)
+    except Exception:
+        logger.exception("Failed to remove files of job %d" % job.id)
+    if (status == 'cancelled') and (HANDLERS[job.job_type][1] is not None):
+        dbimport.update_tablestatus(HANDLERS[job.job_type][1], msg=msg)
+    logger.info("Job %s: %s" % (str(job), "" if msg is None else msg))
+
+
+def fail(job, msg):
+    """
+    Records the interrupted attempt of the job (worker stopped, process died),
+    requeuing it (with increasing delay) if it has attempts left. Jobs whose
+    handler returned an error don't get retried, see execute.
+
+    :param job: the job that got interrupted
+    :type job: Job
+    :param msg: the error message
+    :type msg: str
+    """
+
+    if job.attempts < job.max_attempts:
+        job.status = 'queued'
+        job.message = msg
+        job.worker = None
+        job.run_after = datetime.now() + timedelta(seconds=reporting.settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+        job.save()
+        logger.info("Job %s: attempt %d of %d failed, retrying after %s"
+                    % (str(job), job.attempts, job.max_attempts, str(job.run_after)))
+    else:
+        complete(job, 'failed', msg)
+
+
+def claim_next():
+    """
+    Claims the next queued job that is due and whose type hasn't reached its concurrency limit.
+
+    :return: the job, None if there is nothing to run
+    :rtype: Job
+    """
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # serializes claiming across workers, so that the concurrency limits hold
+            with connection.cursor() as cursor:
+                cursor.execute("select pg_advisory_xact_lock(hashtext('dbbackend_job'))")
+        running = dict()
+        for job_type in Job.objects.all().filter(status='running').values_list('job_type', flat=True):
+            running[job_type] = running.get(job_type, 0) + 1
+        jobs = Job.objects.all().filter(status='queued', run_after__lte=datetime.now()).order_by('id')
+        if connection.vendor == 'postgresql':
+            jobs = jobs.select_for_update(skip_locked=True)
+        for job in jobs:
+            if running.get(job.job_type, 0) >= concurrency(job.job_type):
+                continue
+            job.status = 'running'
+            job.attempts += 1
+            job.started = datetime.now()
+            job.worker = worker_name()
+            job.save()
+            return job
+    return None
+
+
+def raise_cancelled(signum, frame):
+    """
+    Signal handler that turns the termination of a job process into an exception.
+    """
+
+    raise JobCancelled()
+
+
+def execute(job_id):
+    """
+    Runs the job, to be called in the job's own process.
+
+    :param job_id: the ID of the job to run
+    :type job_id: int
+    """
+
+    signal.signal(signal.SIGTERM, raise_cancelled)
+    try:
+        job = Job.objects.get(id=job_id)
+        handler = HANDLERS[job.job_type][0]
+        try:
+            msg = handler(**job.get_parameters())
+        except JobCancelled:
+            complete(job, 'cancelled', "Cancelled")
+            return
+        except Exception:
+            msg = traceback.format_exc()
+            logger.error(msg=msg)
+        # errors of the handler (eg invalid files) wouldn't go away by running it again
+        if msg is None:
+            complete(job, 'finished', None)
+        else:
+            complete(job, 'failed', msg)
+    finally:
+        connections.close_all()
+
+
+def cleanup_stale_uploads():
+    """
+    Removes stale files from the upload staging area, keeping the ones of queued and running jobs.
+    """
+
+    keep = []
+    for job in Job.objects.all().filter(status__in=ACTIVE_STATUSES):
+        keep.extend(job.get_files())
+    try:
+        cleanup_uploads(keep=keep)
+    except Exception:
+        logger.exception("Failed to clean up upload staging area")
+
+
+def recover():
+    """
+    Deals with jobs that were running on this host when the worker stopped,
+    counting them as failed attempts.
+    """
+
+    host = socket.gethostname()
+    for job in Job.objects.all().filter(status='running'):
+        if (job.worker is not None) and (job.worker.split(':')[0] != host):
+            continue
+        if job.cancel_requested:
+            complete(job, 'cancelled', "Cancelled")
+        else:
+            fail(job, "Interrupted (worker %s stopped)" % job.worker)
+
+
+def run_worker(once=False, sleep=None):
+    """
+    Executes queued jobs, each in its own process, using up to JOB_WORKERS processes at a time.
+
+    :param once: whether to stop once the queue is empty (including jobs waiting to be retried)
+    :type once: bool
+    :param sleep: the number of seconds to wait between polling the queue, uses JOB_POLL_INTERVAL if None
+    :type sleep: float
+    """
+
+    if sleep is None:
+        sleep = reporting.settings.JOB_POLL_INTERVAL
+    context = multiprocessing.get_context('fork')
+    processes = dict()
+    recover()
+    cleaned = 0.0
+    logger.info("Job worker %s started" % worker_name())
+    while True:
+        if time.time() - cleaned >= UPLOAD_CLEANUP_INTERVAL:
+            cleanup_stale_uploads()
+            cleaned = time.time()
+
+        # completed processes
+        for job_id, process in list(processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del processes[job_id]
+            job = Job.objects.get(id=job_id)
+            if job.status == 'running':
+                if job.cancel_requested:
+                    complete(job, 'cancelled', "Cancelled")
+                else:
+                    fail(job, "Job process exited with code %s" % str(process.exitcode))
+
+        # cancelled jobs
+        if len(processes) > 0:
+            for job in Job.objects.all().filter(id__in=list(processes.keys()), status='running', cancel_requested=True):
+                logger.info("Cancelling job: %s" % str(job))
+                process = processes[job.id]
+                process.terminate()
+                process.join(reporting.settings.JOB_CANCEL_TIMEOUT)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+
+        # new jobs
+        started = 0
+        while len(processes) < reporting.settings.JOB_WORKERS:
+            job = claim_next()
+            if job is None:
+                break
+            # the job process must not share the connection of this process
+            connections.close_all()
+            process = context.Process(target=execute, args=(job.id,))
+            process.start()
+            processes[job.id] = process
+            started += 1
+            logger.info("Started job %s (pid %d)" % (str(job), process.pid))
+
+        if once and (len(processes) == 0) and (started == 0) and not Job.objects.all().filter(status='queued').exists():
+            break
+        time.sleep(sleep)
+    logger.info("Job worker %s stopped" % worker_name())
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template.defaultfilters import filesizeformat
+from dbbackend import benchmark
+import reporting.settings
+
+
+class Command(BaseCommand):
+    help = 'Measures the throughput of the imports using synthetic exports (replaces the supervisors, ' \
+           'scholarships and associated role tables, do not run against a production database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='the number of rows to generate per export')
+        parser.add_argument('--only', default=None,
+                            help='comma-separated benchmarks to run: ' + ", ".join(benchmark.BENCHMARKS.keys()))
+        parser.add_argument('--compression', default=None, choices=sorted(benchmark.EXTENSIONS.keys()),
+                            help='the compression to apply to the exports')
+        parser.add_argument('--dir', default=None, help='the directory for the generated exports (reused if present)')
+        parser.add_argument('--seed', type=int, default=1, help='the seed for generating the exports')
+        parser.add_argument('--baseline', default=None, help='the JSON file with the baseline throughputs')
+        parser.add_argument('--save-baseline', action='store_true', help='store the throughputs in the baseline file')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='the fraction the throughput may drop below the baseline (default: 0.2)')
+
+    def handle(self, *args, **options):
+        if reporting.settings.PRODUCTION:
+            raise CommandError("Benchmarks replace table contents, not running in production mode!")
+        if options['save_baseline'] and (options['baseline'] is None):
+            raise CommandError("No baseline file specified!")
+        names = list(benchmark.BENCHMARKS.keys())
+        if options['only'] is not None:
+            names = [n.strip() for n in options['only'].split(",")]
+            for name in names:
+                if name not in benchmark.BENCHMARKS:
+                    raise CommandError("Unknown benchmark: %s" % name)
+
+        self.stdout.write("Database: %s, rows: %d, compression: %s"
+                          % (connection.vendor, options['rows'], options['compression'] or "none"))
+        self.stdout.write("%-26s %10s %12s %12s %10s" % ("benchmark", "seconds", "rows/s", "peak RSS", "queries"))
+        results = []
+        try:
+            for name in names:
+                result = benchmark.run_benchmark(name, options['rows'], workdir=options['dir'],
+                                                 compression=options['compression'], seed=options['seed'])
+                results.append(result)
+                if result['error'] is None:
+                    self.stdout.write("%-26s %10.2f %12.0f %12s %10d"
+                                      % (name, result['duration'], result['rows_per_sec'],
+                                         filesizeformat(result['peak_rss']), result['queries']))
+                else:
+                    self.stdout.write("%-26s failed: %s" % (name, result['error'].splitlines()[-1]))
+        finally:
+            benchmark.cleanup()
+
+        baseline = benchmark.load_baseline(options['baseline'])
+        if options['save_baseline']:
+            benchmark.save_baseline(options['baseline'], baseline, results)
+            self.stdout.write("Baseline saved: " + options['baseline'])
+        failed = [r['name'] for r in results if r['error'] is not None]
+        if len(failed) > 0:
+            raise CommandError("Failed benchmarks: " + ", ".join(failed))
+        regressed = benchmark.regressions(baseline, results, options['tolerance'])
+        if len(regressed) > 0:
+            raise CommandError("Throughput regressions:\n" + "\n".join(regressed))
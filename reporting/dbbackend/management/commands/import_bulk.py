@@ -0,0 +1,20 @@
+from dbbackend.cli import ImportCommand, set_workers
+from dbbackend import dbimport
+
+
+class Command(ImportCommand):
+    help = 'Imports the files listed in a manifest (type,year,file,encoding) and populates the student dates'
+    job_type = 'import_bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='the CSV file listing the files to import, can be compressed')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='the processes for importing in parallel (default: IMPORT_BULK_WORKERS)')
+        parser.add_argument('--parse-workers', type=int, default=None,
+                            help='the processes for parsing large grade results files (default: IMPORT_PARSE_WORKERS)')
+        super(Command, self).add_arguments(parser)
+
+    def run(self, options):
+        set_workers('IMPORT_BULK_WORKERS', options['workers'])
+        set_workers('IMPORT_PARSE_WORKERS', options['parse_workers'])
+        return dbimport.import_bulk(options['file'], email=options['email'])
@@ -0,0 +1,16 @@
+from dbbackend.cli import ImportCommand
+from dbbackend import dbimport
+
+
+class Command(ImportCommand):
+    help = 'Imports the course definitions for a year (Brio/Hyperion export)'
+    job_type = 'import_coursedefs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int, help='the year to import the course definitions for')
+        self.add_file_arguments(parser)
+        super(Command, self).add_arguments(parser)
+
+    def run(self, options):
+        return dbimport.queue_import_coursedefs(options['year'], options['file'], options['encoding'],
+                                                email=options['email'], delete=False)
@@ -0,0 +1,23 @@
+from dbbackend.cli import ImportCommand, set_workers
+from dbbackend import dbimport
+
+
+class Command(ImportCommand):
+    help = 'Imports the grade results for a year (Brio/Hyperion export)'
+    job_type = 'import_grade_results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int, help='the year to import the results for')
+        self.add_file_arguments(parser)
+        parser.add_argument('--defer-indexes', action='store_true', help='rebuild the indexes after loading (ignored with shadow tables or partitions, '
+                                 'whose staging tables always get indexed after loading)')
+        parser.add_argument('--differential', action='store_true', help='only write the changed rows')
+        parser.add_argument('--parse-workers', type=int, default=None,
+                            help='the processes for parsing large files (default: IMPORT_PARSE_WORKERS)')
+        super(Command, self).add_arguments(parser)
+
+    def run(self, options):
+        set_workers('IMPORT_PARSE_WORKERS', options['parse_workers'])
+        return dbimport.queue_import_grade_results(options['year'], options['file'], options['encoding'],
+                                                   email=options['email'], defer_indexes=options['defer_indexes'],
+                                                   delete=False, differential=options['differential'])
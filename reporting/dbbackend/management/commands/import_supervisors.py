@@ -0,0 +1,16 @@
+from dbbackend.cli import ImportCommand
+from dbbackend import dbimport
+
+
+class Command(ImportCommand):
+    help = 'Imports the supervisors (Jade export)'
+    job_type = 'import_supervisors'
+
+    def add_arguments(self, parser):
+        self.add_file_arguments(parser)
+        parser.add_argument('--merge', action='store_true', help='only write the changed rows')
+        super(Command, self).add_arguments(parser)
+
+    def run(self, options):
+        return dbimport.queue_import_supervisors(options['file'], options['encoding'], email=options['email'],
+                                                 delete=False, merge=options['merge'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from dbbackend.models import GradeResults
+from dbbackend.partitions import partition_table
+
+
+class Command(BaseCommand):
+    help = 'Turns the grade results table into a table partitioned by year (PostgreSQL 11+)'
+
+    def handle(self, *args, **options):
+        partition_table(GradeResults._meta.db_table)
+        self.stdout.write("Partitioned: " + GradeResults._meta.db_table)
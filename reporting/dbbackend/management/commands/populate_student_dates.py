@@ -0,0 +1,15 @@
+from dbbackend.cli import ImportCommand
+from dbbackend import dbimport
+
+
+class Command(ImportCommand):
+    help = 'Recalculates the start/end dates of the supervised students'
+    job_type = 'populate_student_dates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='recalculate all students rather than only the ones touched by imports since the last run')
+        super(Command, self).add_arguments(parser)
+
+    def run(self, options):
+        return dbimport.queue_populate_student_dates(email=options['email'], incremental=not options['full'])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from dbbackend.dimensions import DIMENSIONS, rebuild_dimensions
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the dimension tables (schools, departments, years, papers, scholarships) from the imported data'
+
+    def handle(self, *args, **options):
+        tables = []
+        for name in DIMENSIONS:
+            if DIMENSIONS[name][0] not in tables:
+                tables.append(DIMENSIONS[name][0])
+        for table in tables:
+            msg = rebuild_dimensions(table)
+            if msg is not None:
+                raise CommandError(msg)
+            self.stdout.write("Rebuilt: " + table)
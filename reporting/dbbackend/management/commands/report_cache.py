@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+import reporting.report_cache as report_cache
+
+
+class Command(BaseCommand):
+    help = 'Outputs the statistics of the report cache (entries, size, hit rate), optionally clearing it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='removes all cached reports and the statistics')
+
+    def handle(self, *args, **options):
+        if not report_cache.is_enabled():
+            raise CommandError("The report cache is disabled (REPORT_CACHE)!")
+        if report_cache.is_local():
+            raise CommandError("The report cache is local to each process (LocMemCache), use a file-based or "
+                               "database cache (REPORT_CACHE) to inspect or clear it from the command-line!")
+        stats = report_cache.statistics()
+        self.stdout.write("Entries: %d" % stats['entries'])
+        self.stdout.write("Size: %d bytes" % stats['size'])
+        self.stdout.write("Hits: %d" % stats['hits'])
+        self.stdout.write("Misses: %d" % stats['misses'])
+        if stats['hit_rate'] is None:
+            self.stdout.write("Hit rate: N/A")
+        else:
+            self.stdout.write("Hit rate: %.1f%%" % (100.0 * stats['hit_rate']))
+        self.stdout.write("Evictions: %d" % stats['evictions'])
+        if options['clear']:
+            report_cache.clear()
+            self.stdout.write("Cleared")
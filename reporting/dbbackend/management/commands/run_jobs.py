@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from dbbackend.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Executes the queued background jobs (imports, student dates)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='stop once the queue is empty')
+        parser.add_argument('--sleep', type=float, default=None, help='the seconds between checking the queue')
+
+    def handle(self, *args, **options):
+        run_worker(once=options['once'], sleep=options['sleep'])
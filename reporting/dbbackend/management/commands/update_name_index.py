@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand, CommandError
+from supervisors.namesearch import update_name_index
+
+
+class Command(BaseCommand):
+    help = 'Updates the index of the supervisor/student name search (pg_trgm indexes or trigram table)'
+
+    def handle(self, *args, **options):
+        msg = update_name_index()
+        if msg is not None:
+            raise CommandError(msg)
+        self.stdout.write("Updated name index")
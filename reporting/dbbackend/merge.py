@@ -0,0 +1,191 @@
+from django.db import connection, transaction
+from django.db.models import AutoField
+from datetime import datetime
+from csv import writer as csv_writer
+from dbbackend.bulk import BulkWriter
+from reporting.tempfile_utils import gettempdir
+import reporting.settings
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def changelog_filename(table):
+    """
+    Generates the name of the file for storing the change log of a merge import.
+
+    :param table: the table being imported
+    :type table: str
+    :return: the file name
+    :rtype: str
+    """
+
+    return os.path.join(gettempdir(), "%s-%s.changes.csv" % (table, datetime.now().strftime("%Y%m%d-%H%M%S")))
+
+
+def delete_ids(table, ids):
+    """
+    Removes the rows with the specified IDs from the table.
+
+    :param table: the table to remove the rows from
+    :type table: str
+    :param ids: the IDs of the rows to remove
+    :type ids: list
+    """
+
+    if len(ids) == 0:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM %s WHERE id IN (%s)" % (table, ",".join([str(i) for i in ids])))
+
+
+class MergeWriter(object):
+    """
+    Merges the rows of an import into the live table rather than replacing its
+    content: rows get matched on a natural key and compared on all their values.
+    Only the differences get applied (new rows inserted, changed ones replaced,
+    vanished ones removed), all in a single transaction when closing the writer.
+    Offers the same add/close interface as BulkWriter.
+    """
+
+    def __init__(self, model, key, progress=None, student_field='student_id'):
+        """
+        Initializes the writer, loading the natural keys and values of the rows present.
+
+        :param model: the model class of the instances to merge
+        :type model: type
+        :param key: the names of the fields that make up the natural key
+        :type key: tuple
+        :param progress: the (optional) function to call with the number of rows processed
+        :type progress: function
+        :param student_field: the field with the student ID, for collecting the students affected by the changes
+        :type student_field: str
+        """
+
+        self.model = model
+        self.key = key
+        self.progress = progress
+        self.table = model._meta.db_table
+        self.fields = [f for f in model._meta.concrete_fields if not isinstance(f, AutoField)]
+        names = [f.attname for f in self.fields]
+        self.key_index = [names.index(k) for k in key]
+        self.student_index = names.index(student_field) if student_field in names else None
+        self.existing = dict()
+        for row in model.objects.all().values_list('id', *names).iterator():
+            values = self.normalize(row[1:])
+            k = tuple([values[i] for i in self.key_index])
+            if k not in self.existing:
+                self.existing[k] = []
+            self.existing[k].append([row[0], values, False])
+        self.inserts = []
+        self.deletes = []
+        self.changes = []
+        self.students = set()
+        self.counts = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0}
+        self.count = 0
+        self.changelog = None
+        self.elapsed = 0.0
+
+    def normalize(self, values):
+        """
+        Turns the values into their Python types, so that imported and stored values can be compared.
+
+        :param values: the values in order of the fields
+        :type values: list
+        :return: the normalized values
+        :rtype: tuple
+        """
+
+        return tuple([f.to_python(v) for f, v in zip(self.fields, values)])
+
+    def record(self, action, values):
+        """
+        Records a change.
+
+        :param action: the type of change (added, changed, removed)
+        :type action: str
+        :param values: the (normalized) values of the row
+        :type values: tuple
+        """
+
+        self.counts[action] += 1
+        self.changes.append([action] + [values[i] for i in self.key_index])
+        if self.student_index is not None:
+            self.students.add(values[self.student_index])
+
+    def add(self, obj):
+        """
+        Compares the model instance against the rows present.
+
+        :param obj: the instance to merge
+        :type obj: object
+        """
+
+        values = self.normalize([getattr(obj, f.attname) for f in self.fields])
+        versions = self.existing.get(tuple([values[i] for i in self.key_index]), [])
+        self.count += 1
+        if (self.progress is not None) and (self.count % reporting.settings.IMPORT_BATCH_SIZE == 0):
+            self.progress(self.count)
+        for version in versions:
+            if not version[2] and (version[1] == values):
+                version[2] = True
+                self.counts['unchanged'] += 1
+                return
+        self.inserts.append(obj)
+        for version in versions:
+            if not version[2]:
+                version[2] = True
+                self.deletes.append(version[0])
+                self.record('changed', values)
+                return
+        self.record('added', values)
+
+    def close(self):
+        """
+        Applies the differences and writes the change log (if there were any changes).
+
+        :return: the total number of rows processed
+        :rtype: int
+        """
+
+        for versions in self.existing.values():
+            for version in versions:
+                if not version[2]:
+                    self.deletes.append(version[0])
+                    self.record('removed', version[1])
+        start = time.perf_counter()
+        with transaction.atomic():
+            batch_size = reporting.settings.IMPORT_BATCH_SIZE
+            for i in range(0, len(self.deletes), batch_size):
+                delete_ids(self.table, self.deletes[i:i + batch_size])
+            writer = BulkWriter(self.model)
+            for obj in self.inserts:
+                writer.add(obj)
+            writer.close()
+        self.elapsed = time.perf_counter() - start
+        if len(self.changes) > 0:
+            self.changelog = changelog_filename(self.table)
+            with open(self.changelog, 'w', newline='', encoding='utf-8') as f:
+                writer = csv_writer(f)
+                writer.writerow(['change'] + list(self.key))
+                writer.writerows(self.changes)
+        if self.progress is not None:
+            self.progress(self.count)
+        logger.info("%s: %s" % (self.table, self.summary()))
+        return self.count
+
+    def summary(self):
+        """
+        Returns the summary of the changes, for the table status.
+
+        :return: the summary
+        :rtype: str
+        """
+
+        result = "Merged %d rows: added %d, changed %d, removed %d, unchanged %d" \
+                 % (self.count, self.counts['added'], self.counts['changed'], self.counts['removed'], self.counts['unchanged'])
+        if self.changelog is not None:
+            result += " (see " + self.changelog + ")"
+        return result
@@ -70,6 +70,15 @@ class TableStatus(models.Model):
     table = models.CharField(max_length=250, db_index=True)
     timestamp = models.DateTimeField()
     message = models.TextField(null=True)
+    # progress of a running import
+    started = models.DateTimeField(null=True, blank=True, default=None)
+    rows = models.BigIntegerField(null=True, blank=True, default=None)
+    rows_per_sec = models.FloatField(null=True, blank=True, default=None)
+    bytes_read = models.BigIntegerField(null=True, blank=True, default=None)
+    bytes_total = models.BigIntegerField(null=True, blank=True, default=None)
+    eta = models.FloatField(null=True, blank=True, default=None)
+    # incremented whenever an import updates the status, for invalidating cached reports
+    version = models.BigIntegerField(default=0)
 
     class Meta:
         permissions = (
@@ -78,6 +87,139 @@ class TableStatus(models.Model):
         )
 
 
+class ImportJob(models.Model):
+    """
+    Checkpoints of an import, for resuming a failed import of the same file.
+    """
+
+    STATUS_CHOICES = (
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+        ('finished', 'Finished'),
+        ('abandoned', 'Abandoned'),
+    )
+
+    table = models.CharField(max_length=250, db_index=True)
+    year = models.IntegerField(null=True, db_index=True)
+    fingerprint = models.CharField(max_length=100, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, db_index=True, default='running')
+    staging = models.CharField(max_length=250, null=True, blank=True, default=None)
+    row_number = models.IntegerField(default=0)
+    byte_offset = models.BigIntegerField(default=0)
+    written = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+    rejects_file = models.CharField(max_length=1024, null=True, blank=True, default=None)
+    started = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    message = models.TextField(null=True, blank=True, default=None)
+
+    def __str__(self):
+        return str(self.id) + "-" + self.table + "-" + str(self.year) + "-" + self.status
+
+
+class Dimension(models.Model):
+    """
+    The distinct values of a column of an imported table (eg the schools of the
+    grade results), with their number of rows and range of years. Rebuilt by the
+    imports, so that index pages don't have to scan the tables themselves.
+    """
+
+    dimension = models.CharField(max_length=100, db_index=True)
+    value = models.CharField(max_length=250, null=True, blank=True, default=None)
+    parent = models.CharField(max_length=250, null=True, blank=True, default=None)
+    count = models.BigIntegerField(default=0)
+    min_year = models.IntegerField(null=True, blank=True, default=None)
+    max_year = models.IntegerField(null=True, blank=True, default=None)
+
+    def __str__(self):
+        return self.dimension + "-" + str(self.value)
+
+
+class Job(models.Model):
+    """
+    Background job (eg an import), executed by the run_jobs management command.
+    """
+
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('finished', 'Finished'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    )
+
+    job_type = models.CharField(max_length=100, db_index=True)
+    parameters = models.TextField(default='{}')
+    files = models.TextField(default='[]')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, db_index=True, default='queued')
+    user = models.CharField(max_length=150, null=True, blank=True, default=None)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=1)
+    run_after = models.DateTimeField(db_index=True)
+    cancel_requested = models.BooleanField(default=False)
+    worker = models.CharField(max_length=250, null=True, blank=True, default=None)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True, default=None)
+    finished = models.DateTimeField(null=True, blank=True, default=None)
+    message = models.TextField(null=True, blank=True, default=None)
+
+    def get_parameters(self):
+        """
+        Returns the keyword arguments for the job's handler.
+
+        :return: the parameters
+        :rtype: dict
+        """
+        return json.loads(self.parameters)
+
+    def get_files(self):
+        """
+        Returns the files that get deleted once the job has finished, failed or got cancelled.
+
+        :return: the files
+        :rtype: list
+        """
+        return json.loads(self.files)
+
+    def __str__(self):
+        return str(self.id) + "-" + self.job_type + "-" + self.status
+
+
+class ImportRun(models.Model):
+    """
+    Instrumentation of an import run (phase timings, rows, peak memory), for spotting regressions.
+    """
+
+    STATUS_CHOICES = (
+        ('finished', 'Finished'),
+        ('failed', 'Failed'),
+    )
+
+    table = models.CharField(max_length=250, db_index=True)
+    year = models.IntegerField(null=True, blank=True, default=None)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='finished')
+    started = models.DateTimeField(db_index=True)
+    duration = models.FloatField(default=0.0)
+    rows = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+    rows_per_sec = models.FloatField(null=True, blank=True, default=None)
+    peak_memory = models.BigIntegerField(null=True, blank=True, default=None)
+    phases = models.TextField(default='[]')
+    message = models.TextField(null=True, blank=True, default=None)
+
+    def get_phases(self):
+        """
+        Returns the time spent per phase.
+
+        :return: the list of tuples of phase name and duration in seconds
+        :rtype: list
+        """
+        return [tuple(p) for p in json.loads(self.phases)]
+
+    def __str__(self):
+        return str(self.id) + "-" + self.table + "-" + str(self.year) + "-" + self.status
+
+
 class GradeResults(models.Model):
     """
     Grade results.
@@ -234,6 +376,8 @@ class GradeResults(models.Model):
     moe_pbrf = models.CharField(max_length=250, null=True, blank=True)
     achievement_date = models.DateField(null=True)
     te_reo = models.IntegerField(null=True)
+    # MD5 of the imported values (excluding query_date), for differential imports
+    fingerprint = models.CharField(max_length=32, null=True, blank=True)
 
     class Meta:
         permissions = (
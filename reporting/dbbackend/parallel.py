@@ -0,0 +1,182 @@
+from collections import deque
+from django.db import connection, connections
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import tracemalloc
+import mmap
+import os
+import reporting.settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def parse_workers(size):
+    """
+    Determines the number of processes to use for parsing a file of the given size.
+
+    :param size: the size of the file in bytes
+    :type size: int
+    :return: the number of processes, 1 if the file should be parsed sequentially
+    :rtype: int
+    """
+
+    if size < reporting.settings.IMPORT_PARSE_MIN_SIZE:
+        return 1
+    return max(1, reporting.settings.IMPORT_PARSE_WORKERS)
+
+
+def record_boundary(data):
+    """
+    Locates the end of the last complete CSV record in the data, i.e., the last
+    newline that is not inside a quoted cell. The data must start at a record
+    boundary. Escaped quotes ("") don't change the quote parity.
+
+    :param data: the data to search
+    :type data: bytes
+    :return: the number of bytes up to and including the newline, -1 if none found
+    :rtype: int
+    """
+
+    end = data.rfind(b'\n')
+    if end < 0:
+        return -1
+    quotes = data.count(b'"', 0, end)
+    while quotes % 2 == 1:
+        prev = data.rfind(b'\n', 0, end)
+        if prev < 0:
+            return -1
+        quotes -= data.count(b'"', prev, end)
+        end = prev
+    return end + 1
+
+
+def split_file(path, start, chunk_size):
+    """
+    Splits the (uncompressed) file into chunks of complete CSV records, using a memory map.
+
+    :param path: the file to split
+    :type path: str
+    :param start: the offset of the first record
+    :type start: int
+    :param chunk_size: the approximate size of the chunks in bytes
+    :type chunk_size: int
+    :return: the generator of tuples of start and end offset
+    :rtype: generator
+    """
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if start >= size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            while start < size:
+                length = chunk_size
+                while True:
+                    if start + length >= size:
+                        end = size
+                        break
+                    boundary = record_boundary(mm[start:start + length])
+                    if boundary > 0:
+                        end = start + boundary
+                        break
+                    # record longer than chunk
+                    length *= 2
+                yield start, end
+                start = end
+
+
+def read_chunks(fileobj, chunk_size):
+    """
+    Reads chunks of complete CSV records from the stream (eg a gzip file).
+
+    :param fileobj: the binary stream to read from, positioned at a record boundary
+    :type fileobj: file
+    :param chunk_size: the approximate size of the chunks in bytes
+    :type chunk_size: int
+    :return: the generator of chunks
+    :rtype: generator
+    """
+
+    rest = b''
+    while True:
+        block = fileobj.read(chunk_size)
+        if len(block) == 0:
+            if len(rest) > 0:
+                yield rest
+            return
+        data = rest + block
+        boundary = record_boundary(data)
+        if boundary <= 0:
+            rest = data
+            continue
+        yield data[:boundary]
+        rest = data[boundary:]
+
+
+def read_range(path, start, end):
+    """
+    Reads the range of the (uncompressed) file via a memory map.
+
+    :param path: the file to read from
+    :type path: str
+    :param start: the start offset
+    :type start: int
+    :param end: the end offset (excluded)
+    :type end: int
+    :return: the data
+    :rtype: bytes
+    """
+
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[start:end]
+
+
+def ordered_map(executor, func, tasks, window):
+    """
+    Applies the function to the tasks in the executor and yields the results in
+    order of the tasks, keeping at most window tasks in flight so that results
+    don't pile up when the consumer is slower than the workers.
+
+    :param executor: the executor to use
+    :type executor: Executor
+    :param func: the function to apply
+    :type func: function
+    :param tasks: the iterable of task arguments
+    :type tasks: iterable
+    :param window: the maximum number of tasks in flight
+    :type window: int
+    :return: the generator of results
+    :rtype: generator
+    """
+
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(func, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while len(pending) > 0:
+        yield pending.popleft().result()
+
+
+def parse_pool(workers):
+    """
+    Creates the process pool for parsing chunks. Closes the database connections
+    first, as the forked processes must not share them.
+
+    :param workers: the number of processes
+    :type workers: int
+    :return: the executor
+    :rtype: ProcessPoolExecutor
+    """
+
+    if connection.in_atomic_block:
+        raise Exception("Cannot parse in parallel inside a transaction!")
+    connections.close_all()
+    # memory tracing (import profiling) only applies to the importing process
+    result = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                 initializer=tracemalloc.stop)
+    # the processes get started with the first task, which must happen before a connection gets opened again
+    result.submit(int).result()
+    return result
@@ -0,0 +1,203 @@
+from django.db import connection, transaction
+from dbbackend.indexes import secondary_indexes
+from dbbackend.checkpoint import table_exists
+import uuid
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+PARTITION_COLUMN = "year"
+""" the column that tables get partitioned by (list partitioning) """
+
+
+def supports_partitions():
+    """
+    Checks whether the database backend supports list partitioning with
+    primary keys and default partitions (PostgreSQL 11+).
+
+    :return: True if supported
+    :rtype: bool
+    """
+
+    return (connection.vendor == 'postgresql') and (connection.pg_version >= 110000)
+
+
+def is_partitioned(table):
+    """
+    Checks whether the table is a partitioned table.
+
+    :param table: the name of the table
+    :type table: str
+    :return: True if partitioned
+    :rtype: bool
+    """
+
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            select count(*)
+            from pg_partitioned_table p, pg_class c
+            where p.partrelid = c.oid
+            and c.relname = %s
+            and pg_table_is_visible(c.oid)
+            """, [table])
+        return cursor.fetchone()[0] > 0
+
+
+def partition_name(table, year):
+    """
+    Generates the name of the partition for the year.
+
+    :param table: the name of the partitioned table
+    :type table: str
+    :param year: the year
+    :type year: int
+    :return: the name of the partition
+    :rtype: str
+    """
+
+    return "%s_y%d" % (table, year)
+
+
+def default_partition_name(table):
+    """
+    Generates the name of the default partition, which receives all rows for years without a partition.
+
+    :param table: the name of the partitioned table
+    :type table: str
+    :return: the name of the partition
+    :rtype: str
+    """
+
+    return "%s_default" % table
+
+
+def retarget_index(definition, table, name):
+    """
+    Changes table and name of the CREATE INDEX statement.
+
+    :param definition: the CREATE INDEX statement
+    :type definition: str
+    :param table: the new table
+    :type table: str
+    :param name: the new name of the index
+    :type name: str
+    :return: the updated statement
+    :rtype: str
+    """
+
+    definition = re.sub(r'^(CREATE (UNIQUE )?INDEX) \S+ ON (ONLY )?\S+ ', r'\1 %s ON %s ' % (name, table), definition)
+    return definition
+
+
+def create_staging(table, year):
+    """
+    Creates an empty staging table with the same layout (and id sequence) as the
+    partitioned table for loading the rows of the year.
+
+    :param table: the name of the partitioned table
+    :type table: str
+    :param year: the year that the data is for
+    :type year: int
+    :return: the name of the staging table
+    :rtype: str
+    """
+
+    staging = "%s_%s" % (partition_name(table, year), uuid.uuid4().hex[:8])
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS)" % (staging, table))
+    logger.info("%s: created staging table %s" % (table, staging))
+    return staging
+
+
+def drop_staging(staging):
+    """
+    Removes the staging table, eg after a failed import.
+
+    :param staging: the name of the staging table
+    :type staging: str
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS %s" % staging)
+
+
+def swap_partition(table, year, staging):
+    """
+    Indexes the staging table and replaces the partition of the year with it.
+    Readers see either the old or the new rows of the year, never a partially
+    loaded year. The indexes are built before the swap, the swap itself only
+    needs a brief lock on the partitioned table.
+
+    :param table: the name of the partitioned table
+    :type table: str
+    :param year: the year that the data is for
+    :type year: int
+    :param staging: the name of the staging table with the new rows
+    :type staging: str
+    """
+
+    partition = partition_name(table, year)
+    with connection.cursor() as cursor:
+        # indexes and constraints matching the parent, so that attaching doesn't need to build or validate anything
+        cursor.execute("ALTER TABLE %s ADD PRIMARY KEY (id, %s)" % (staging, PARTITION_COLUMN))
+        for i, (name, definition) in enumerate(secondary_indexes(cursor, table)):
+            cursor.execute(retarget_index(definition, staging, "%s_%d" % (staging, i)))
+        cursor.execute("ALTER TABLE %s ADD CONSTRAINT %s_check CHECK (%s IS NOT NULL AND %s = %d)"
+                       % (staging, staging, PARTITION_COLUMN, PARTITION_COLUMN, year))
+        cursor.execute("ANALYZE %s" % staging)
+
+        with transaction.atomic():
+            if table_exists(partition):
+                cursor.execute("ALTER TABLE %s DETACH PARTITION %s" % (table, partition))
+                cursor.execute("DROP TABLE %s" % partition)
+            default = default_partition_name(table)
+            if table_exists(default):
+                cursor.execute("DELETE FROM %s WHERE %s = %d" % (default, PARTITION_COLUMN, year))
+            cursor.execute("ALTER TABLE %s RENAME TO %s" % (staging, partition))
+            cursor.execute("ALTER TABLE %s ATTACH PARTITION %s FOR VALUES IN (%d)" % (table, partition, year))
+    logger.info("%s: swapped in partition %s" % (table, partition))
+
+
+def partition_table(table):
+    """
+    Turns the table into a table that is list-partitioned by year, with one
+    partition per year and a default partition. Requires PostgreSQL 11+.
+
+    :param table: the name of the table to partition
+    :type table: str
+    """
+
+    if not supports_partitions():
+        raise Exception("Partitioning requires PostgreSQL 11 or later!")
+    if is_partitioned(table):
+        logger.info("%s: already partitioned" % table)
+        return
+
+    old = "%s_unpartitioned" % table
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("select pg_get_serial_sequence(%s, 'id')", [table])
+            sequence = cursor.fetchone()[0]
+            indexes = secondary_indexes(cursor, table)
+            cursor.execute("ALTER TABLE %s RENAME TO %s" % (table, old))
+            for name, definition in indexes:
+                cursor.execute("DROP INDEX %s" % name)
+
+            cursor.execute("CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS) PARTITION BY LIST (%s)" % (table, old, PARTITION_COLUMN))
+            cursor.execute("ALTER TABLE %s ADD PRIMARY KEY (id, %s)" % (table, PARTITION_COLUMN))
+            for name, definition in indexes:
+                cursor.execute(definition)
+            cursor.execute("CREATE TABLE %s PARTITION OF %s DEFAULT" % (default_partition_name(table), table))
+            cursor.execute("select distinct %s from %s where %s is not null order by %s" % (PARTITION_COLUMN, old, PARTITION_COLUMN, PARTITION_COLUMN))
+            for row in cursor.fetchall():
+                cursor.execute("CREATE TABLE %s PARTITION OF %s FOR VALUES IN (%d)" % (partition_name(table, row[0]), table, row[0]))
+            cursor.execute("INSERT INTO %s SELECT * FROM %s" % (table, old))
+            if sequence is not None:
+                cursor.execute("ALTER SEQUENCE %s OWNED BY %s.id" % (sequence, table))
+            cursor.execute("DROP TABLE %s" % old)
+            cursor.execute("ANALYZE %s" % table)
+    logger.info("%s: partitioned by %s" % (table, PARTITION_COLUMN))
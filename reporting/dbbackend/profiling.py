@@ -0,0 +1,237 @@
+from dbbackend.models import ImportRun
+from collections import OrderedDict
+from datetime import datetime
+import reporting.settings
+import tracemalloc
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def format_phases(phases):
+    """
+    Turns the phase timings into a string, eg "load: 12.3s, build indexes: 4.5s".
+
+    :param phases: the list of tuples of phase name and duration in seconds
+    :type phases: list
+    :return: the generated string
+    :rtype: str
+    """
+
+    return ", ".join(["%s: %.1fs" % (name, duration) for name, duration in phases])
+
+
+def format_memory(size):
+    """
+    Turns the number of bytes into a short string, eg "12.3 MB".
+
+    :param size: the number of bytes, can be None
+    :type size: int
+    :return: the generated string, empty if None
+    :rtype: str
+    """
+
+    if size is None:
+        return ""
+    if size >= 1024 * 1024 * 1024:
+        return "%.1f GB" % (size / 1024 / 1024 / 1024)
+    if size >= 1024 * 1024:
+        return "%.1f MB" % (size / 1024 / 1024)
+    return "%.1f KB" % (size / 1024)
+
+
+class TimedFile(object):
+    """
+    Wraps a file object and records the time spent in read/readline as a phase,
+    eg for measuring the decompression of gzip files.
+    """
+
+    def __init__(self, profile, name, fileobj):
+        """
+        Initializes the wrapper.
+
+        :param profile: the profile to record the time with
+        :type profile: ImportProfile
+        :param name: the name of the phase
+        :type name: str
+        :param fileobj: the file to wrap
+        :type fileobj: file
+        """
+
+        self.profile = profile
+        self.name = name
+        self.fileobj = fileobj
+
+    def read(self, *args):
+        start = time.perf_counter()
+        result = self.fileobj.read(*args)
+        self.profile.add(self.name, time.perf_counter() - start)
+        return result
+
+    def readline(self, *args):
+        start = time.perf_counter()
+        result = self.fileobj.readline(*args)
+        self.profile.add(self.name, time.perf_counter() - start)
+        return result
+
+    def __getattr__(self, item):
+        return getattr(self.fileobj, item)
+
+
+class ImportProfile(object):
+    """
+    Collects the instrumentation of a single import run: the time spent per
+    phase, the number of rows and rejects and (if IMPORT_TRACE_MEMORY is
+    enabled) the peak memory allocated by the process, sampled via tracemalloc.
+    Phases are exclusive, i.e., the time of phases recorded while another
+    phase is being timed (eg reading the file while loading) is not counted
+    twice. Gets saved as ImportRun, trimming the history to IMPORT_HISTORY_LENGTH
+    runs per table.
+    """
+
+    def __init__(self, table, year=None):
+        """
+        Initializes the profile and starts tracing memory allocations.
+
+        :param table: the table being imported
+        :type table: str
+        :param year: the year being imported, None if not year-based
+        :type year: int
+        """
+
+        self.table = table
+        self.year = year
+        self.phases = OrderedDict()
+        self.total = 0.0
+        self.rows = 0
+        self.rejected = 0
+        self.started = datetime.now()
+        self.start = time.perf_counter()
+        self.tracing = False
+        if reporting.settings.IMPORT_TRACE_MEMORY and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+
+    def add(self, name, seconds):
+        """
+        Adds the time to the phase.
+
+        :param name: the name of the phase
+        :type name: str
+        :param seconds: the time spent
+        :type seconds: float
+        """
+
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        self.total += seconds
+
+    def mark(self):
+        """
+        Returns the marker for timing a phase from now on, see add_since.
+
+        :return: the marker
+        :rtype: tuple
+        """
+
+        return time.perf_counter(), self.total
+
+    def add_since(self, name, mark):
+        """
+        Adds the time since the marker to the phase, excluding the time of phases recorded in the meantime.
+
+        :param name: the name of the phase
+        :type name: str
+        :param mark: the marker obtained via mark()
+        :type mark: tuple
+        """
+
+        start, total = mark
+        self.add(name, time.perf_counter() - start - (self.total - total))
+
+    def timed(self, name, iterable):
+        """
+        Records the time spent on retrieving the items of the iterable as phase, eg the rows of a csv.reader.
+
+        :param name: the name of the phase
+        :type name: str
+        :param iterable: the iterable to time
+        :type iterable: iterable
+        :return: the generator of items
+        :rtype: generator
+        """
+
+        it = iter(iterable)
+        while True:
+            mark = self.mark()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add_since(name, mark)
+                return
+            self.add_since(name, mark)
+            yield item
+
+    def peak_memory(self):
+        """
+        Returns the peak of the memory allocated since the profile was started.
+
+        :return: the number of bytes, None if not tracing
+        :rtype: int
+        """
+
+        if not self.tracing:
+            return None
+        return tracemalloc.get_traced_memory()[1]
+
+    def summary(self):
+        """
+        Returns the phase timings as string.
+
+        :return: the timings
+        :rtype: str
+        """
+
+        return format_phases(self.phases.items())
+
+    def finish(self, msg=None):
+        """
+        Stops tracing memory allocations and saves the run.
+
+        :param msg: None if successful, otherwise the error message
+        :type msg: str
+        :return: the saved run, None if failed to save
+        :rtype: ImportRun
+        """
+
+        duration = time.perf_counter() - self.start
+        peak = self.peak_memory()
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+        run = ImportRun()
+        run.table = self.table
+        run.year = self.year
+        run.status = 'finished' if msg is None else 'failed'
+        run.started = self.started
+        run.duration = duration
+        run.rows = self.rows
+        run.rejected = self.rejected
+        if duration > 0:
+            run.rows_per_sec = self.rows / duration
+        run.peak_memory = peak
+        run.phases = json.dumps([[name, seconds] for name, seconds in self.phases.items()])
+        run.message = msg
+        try:
+            run.save()
+            ids = ImportRun.objects.all().filter(table=self.table).order_by('-started') \
+                .values_list('id', flat=True)[reporting.settings.IMPORT_HISTORY_LENGTH:]
+            ImportRun.objects.all().filter(id__in=list(ids)).delete()
+        except Exception:
+            logger.exception("Failed to record import run of %s" % self.table)
+            return None
+        memory = "" if peak is None else ", peak memory " + format_memory(peak)
+        logger.info("%s: %d rows in %.1fs%s (%s)" % (self.table, self.rows, duration, memory, self.summary()))
+        return run
+
@@ -0,0 +1,205 @@
+from dbbackend.models import TableStatus
+from datetime import datetime
+import reporting.settings
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def set_tablestatus(table, timestamp, message, started=None, rows=None, rows_per_sec=None,
+                    bytes_read=None, bytes_total=None, eta=None):
+    """
+    Updates the status row of the table in place (creating it if necessary).
+
+    :param table: the table to update the status for
+    :type table: str
+    :param timestamp: the timestamp to store
+    :type timestamp: datetime
+    :param message: the message, can be None
+    :type message: str
+    :param started: when the running import started, None if no import running
+    :type started: datetime
+    :param rows: the number of rows imported so far
+    :type rows: int
+    :param rows_per_sec: the throughput of the import
+    :type rows_per_sec: float
+    :param bytes_read: the number of bytes of the file read so far
+    :type bytes_read: int
+    :param bytes_total: the size of the file
+    :type bytes_total: int
+    :param eta: the estimated number of seconds (from timestamp) until the file has been read
+    :type eta: float
+    """
+
+    fields = {
+        'timestamp': timestamp,
+        'message': message,
+        'started': started,
+        'rows': rows,
+        'rows_per_sec': rows_per_sec,
+        'bytes_read': bytes_read,
+        'bytes_total': bytes_total,
+        'eta': eta,
+    }
+    if TableStatus.objects.all().filter(table=table).update(**fields) == 0:
+        TableStatus(table=table, **fields).save()
+
+
+def file_position(fileobj):
+    """
+    Returns the position in the binary file, without disturbing any readers.
+
+    :param fileobj: the file to get the position for
+    :type fileobj: file
+    :return: the position, None if not available (eg closed)
+    :rtype: int
+    """
+
+    try:
+        return fileobj.tell()
+    except Exception:
+        return None
+
+
+def format_duration(seconds):
+    """
+    Turns the number of seconds into a short string, eg "1h 02m" or "3m 05s".
+
+    :param seconds: the number of seconds
+    :type seconds: float
+    :return: the generated string
+    :rtype: str
+    """
+
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return "%dh %02dm" % (seconds // 3600, (seconds % 3600) // 60)
+    if seconds >= 60:
+        return "%dm %02ds" % (seconds // 60, seconds % 60)
+    return "%ds" % seconds
+
+
+def progress_info(status, now=None):
+    """
+    Returns the progress of a running import from its table status.
+
+    :param status: the table status
+    :type status: TableStatus
+    :param now: the current time, uses datetime.now() if None
+    :type now: datetime
+    :return: the dictionary with rows, rows_per_sec, bytes_read, bytes_total, percent and eta (seconds),
+             None if no import is running
+    :rtype: dict
+    """
+
+    if status.started is None:
+        return None
+    if now is None:
+        now = datetime.now()
+    result = {
+        'rows': status.rows,
+        'rows_per_sec': status.rows_per_sec,
+        'bytes_read': status.bytes_read,
+        'bytes_total': status.bytes_total,
+        'percent': None,
+        'eta': None,
+    }
+    if (status.bytes_read is not None) and status.bytes_total:
+        result['percent'] = min(100.0, 100.0 * status.bytes_read / status.bytes_total)
+    if status.eta is not None:
+        result['eta'] = max(0.0, status.eta - (now - status.timestamp).total_seconds())
+    return result
+
+
+class ImportProgress(object):
+    """
+    Collects the progress of an import (rows written, bytes read) in memory and
+    writes it to the table status at most every IMPORT_PROGRESS_INTERVAL seconds.
+    Throughput and ETA only take the rows/bytes of the current run into account,
+    i.e., not the ones of a failed import that is being resumed.
+    """
+
+    def __init__(self, table, fileobj=None, total=None, rows=0, offset=0, interval=None, position=None):
+        """
+        Initializes the progress.
+
+        :param table: the table being imported
+        :type table: str
+        :param fileobj: the (optional) binary file being read, for tracking the bytes read
+        :type fileobj: file
+        :param total: the size of the file, determined from fileobj if None
+        :type total: int
+        :param rows: the number of rows already imported (eg when resuming)
+        :type rows: int
+        :param offset: the number of bytes already imported (eg when resuming)
+        :type offset: int
+        :param interval: the minimum number of seconds between updates, uses IMPORT_PROGRESS_INTERVAL if None
+        :type interval: float
+        :param position: the (optional) function returning the number of bytes read, instead of using fileobj
+        :type position: function
+        """
+
+        if interval is None:
+            interval = reporting.settings.IMPORT_PROGRESS_INTERVAL
+        if (total is None) and (fileobj is not None):
+            try:
+                total = os.fstat(fileobj.fileno()).st_size
+            except Exception:
+                total = None
+        self.table = table
+        self.fileobj = fileobj
+        self.position = position
+        self.total = total
+        self.base_rows = rows
+        self.base_offset = offset
+        self.rows = rows
+        self.interval = interval
+        self.started = datetime.now()
+        self.last = 0.0
+
+    def update(self, rows):
+        """
+        Records the number of rows written, writes the progress if the interval has passed.
+
+        :param rows: the number of rows written by this run of the import
+        :type rows: int
+        """
+
+        self.rows = self.base_rows + rows
+        now = time.time()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the current progress to the table status.
+        """
+
+        now = datetime.now()
+        elapsed = (now - self.started).total_seconds()
+        rows_per_sec = None
+        if elapsed > 0:
+            rows_per_sec = (self.rows - self.base_rows) / elapsed
+        bytes_read = None
+        eta = None
+        if self.position is not None:
+            bytes_read = self.position()
+        elif self.fileobj is not None:
+            bytes_read = file_position(self.fileobj)
+        if (bytes_read is not None) and self.total and (elapsed > 0) and (bytes_read > self.base_offset):
+            bytes_per_sec = (bytes_read - self.base_offset) / elapsed
+            eta = max(0.0, (self.total - bytes_read) / bytes_per_sec)
+        set_tablestatus(self.table, now, "Imported " + str(self.rows) + " rows...",
+                        started=self.started, rows=self.rows, rows_per_sec=rows_per_sec,
+                        bytes_read=bytes_read, bytes_total=self.total, eta=eta)
+        msg = "%s: imported %d rows" % (self.table, self.rows)
+        if rows_per_sec is not None:
+            msg += ", %.0f rows/s" % rows_per_sec
+        if (bytes_read is not None) and self.total:
+            msg += ", %.1f%%" % min(100.0, 100.0 * bytes_read / self.total)
+        if eta is not None:
+            msg += ", ETA " + format_duration(eta)
+        logger.info(msg)
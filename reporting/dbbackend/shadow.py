@@ -0,0 +1,193 @@
+from django.db import connection, transaction
+from django.db.models import AutoField
+from maintenance_mode.core import get_maintenance_mode, set_maintenance_mode
+from dbbackend.indexes import secondary_indexes
+import reporting.settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def use_shadow_tables():
+    """
+    Checks whether imports should load into shadow tables, i.e., if it is
+    enabled and the database backend is PostgreSQL or SQLite.
+
+    :return: True if shadow tables are used
+    :rtype: bool
+    """
+
+    return reporting.settings.IMPORT_SHADOW_TABLES and (connection.vendor in ['postgresql', 'sqlite'])
+
+
+class ShadowTable(object):
+    """
+    Staging table that an import loads its rows into while the live table stays
+    online. Once validated and indexed, the staging table replaces the live table
+    (rename), with maintenance mode only active during the rename. Imports of a
+    single year replace the year's rows of the live table in a single transaction.
+    """
+
+    def __init__(self, model, year=None):
+        """
+        Initializes the shadow table.
+
+        :param model: the model of the live table
+        :type model: type
+        :param year: the year the import is for, None if it replaces the whole table
+        :type year: int
+        """
+
+        self.model = model
+        self.year = year
+        self.table = model._meta.db_table
+        if year is None:
+            self.staging = "%s_staging" % self.table
+        else:
+            self.staging = "%s_staging_%d" % (self.table, year)
+        self.columns = [f.column for f in model._meta.concrete_fields if not isinstance(f, AutoField)]
+        self.indexes = []
+
+    def create(self):
+        """
+        Creates the (empty) staging table with the same layout as the live table,
+        removing any left-overs from previous imports.
+        """
+
+        self.drop()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS)" % (self.staging, self.table))
+            else:
+                cursor.execute("select sql from sqlite_master where type = 'table' and name = %s", [self.table])
+                sql = cursor.fetchone()[0]
+                cursor.execute(sql.replace('"%s"' % self.table, '"%s"' % self.staging, 1))
+        logger.info("%s: created shadow table %s" % (self.table, self.staging))
+
+    def drop(self):
+        """
+        Removes the staging table, if present.
+        """
+
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS %s" % self.staging)
+
+    def validate(self, expected):
+        """
+        Checks that the staging table contains the expected, non-zero number of rows.
+
+        :param expected: the number of rows written
+        :type expected: int
+        """
+
+        with connection.cursor() as cursor:
+            cursor.execute("select count(*) from %s" % self.staging)
+            count = cursor.fetchone()[0]
+        if count == 0:
+            raise Exception("No rows imported into %s, keeping current data!" % self.staging)
+        if count != expected:
+            raise Exception("Expected %d rows in %s, but found %d, keeping current data!" % (expected, self.staging, count))
+
+    def index(self):
+        """
+        Builds primary key and indexes of the live table on the staging table
+        (PostgreSQL only), so that the swap itself doesn't have to.
+        """
+
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            definitions = secondary_indexes(cursor, self.table)
+            cursor.execute("ALTER TABLE %s ADD CONSTRAINT %s_pkey PRIMARY KEY (id)" % (self.staging, self.staging))
+            self.indexes = []
+            for i, (name, definition) in enumerate(definitions):
+                staging_name = "%s_%d" % (self.staging, i)
+                definition = definition.replace("INDEX %s ON" % name, "INDEX %s ON" % staging_name, 1)
+                definition = definition.replace(" ON %s " % self.table, " ON %s " % self.staging, 1)
+                definition = definition.replace(" ON public.%s " % self.table, " ON public.%s " % self.staging, 1)
+                cursor.execute(definition)
+                self.indexes.append((staging_name, name))
+            cursor.execute("ANALYZE %s" % self.staging)
+
+    def swap(self, expected):
+        """
+        Validates the staging table and swaps it in. Whole tables get replaced
+        with maintenance mode enabled only for the final rename, the rows of a
+        single year within a single transaction (readers see the previous rows
+        until it commits).
+
+        :param expected: the number of rows written to the staging table
+        :type expected: int
+        """
+
+        self.validate(expected)
+        if self.year is not None:
+            with transaction.atomic():
+                self.swap_year()
+            self.drop()
+            logger.info("%s: swapped in year %d from %s" % (self.table, self.year, self.staging))
+            return
+
+        self.index()
+        maintenance = get_maintenance_mode()
+        try:
+            set_maintenance_mode(True)
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    self.swap_postgresql()
+                else:
+                    self.swap_sqlite()
+        finally:
+            if not maintenance:
+                set_maintenance_mode(False)
+        self.drop()
+        logger.info("%s: swapped in %s" % (self.table, self.staging))
+
+    def swap_year(self):
+        """
+        Replaces the rows of the year in the live table with the staging rows.
+        """
+
+        columns = ", ".join([connection.ops.quote_name(c) for c in self.columns])
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM %s WHERE year = %d" % (self.table, self.year))
+            cursor.execute("INSERT INTO %s (%s) SELECT %s FROM %s" % (self.table, columns, columns, self.staging))
+
+    def swap_postgresql(self):
+        """
+        Replaces the live table with the staging table, keeping sequence, primary key and index names.
+        """
+
+        with connection.cursor() as cursor:
+            cursor.execute("select pg_get_serial_sequence(%s, 'id')", [self.table])
+            sequence = cursor.fetchone()[0]
+            cursor.execute("""
+                select k.conname
+                from pg_constraint k, pg_class t
+                where k.conrelid = t.oid
+                and k.contype = 'p'
+                and t.relname = %s
+                and pg_table_is_visible(t.oid)
+                """, [self.table])
+            row = cursor.fetchone()
+            pkey = row[0] if row is not None else "%s_pkey" % self.table
+            # the staging table already uses the sequence (LIKE ... INCLUDING DEFAULTS)
+            if sequence is not None:
+                cursor.execute("ALTER SEQUENCE %s OWNED BY %s.id" % (sequence, self.staging))
+            cursor.execute("DROP TABLE %s" % self.table)
+            cursor.execute("ALTER TABLE %s RENAME TO %s" % (self.staging, self.table))
+            cursor.execute("ALTER TABLE %s RENAME CONSTRAINT %s_pkey TO %s" % (self.table, self.staging, pkey))
+            for staging_name, name in self.indexes:
+                cursor.execute("ALTER INDEX %s RENAME TO %s" % (staging_name, name))
+
+    def swap_sqlite(self):
+        """
+        Replaces the live table with the staging table and recreates the indexes.
+        """
+
+        with connection.cursor() as cursor:
+            definitions = secondary_indexes(cursor, self.table)
+            cursor.execute("DROP TABLE %s" % self.table)
+            cursor.execute("ALTER TABLE %s RENAME TO %s" % (self.staging, self.table))
+            for name, definition in definitions:
+                cursor.execute(definition)
@@ -0,0 +1,297 @@
+from dbbackend.dbimport import grade_results_columns, fix_org_unit, GRADE_RESULTS_DATE_FORMATS, COURSEDEFS_COLUMNS
+from dbbackend.models import CourseDefs
+from reporting.db import int_value, float_value
+from csv import writer as csv_writer
+from datetime import date, timedelta
+import random
+import gzip
+import bz2
+import lzma
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+POOL_SIZE = 64
+""" the number of distinct values generated per column for the columns without specific values """
+
+AWARDS = ['PHD', 'PHD', 'PHD', 'MPHIL', 'DMA', 'EDD', 'IPC']
+""" the awards to pick from for the Jade exports """
+
+SUPERVISOR_NAMES = ['Prof Jane Smith', 'Dr Bob Jones', 'Dr Alice Brown', "Dr Mary O'Neil", 'Assoc Prof Tane Walker',
+                    'Dr Wei Chen', 'Prof Hemi Parata', 'Dr Sarah Miller', 'Dr Raj Patel', 'Professor Anna Novak']
+""" the supervisor names to pick from for the Jade exports """
+
+
+def open_export(path, compression=None):
+    """
+    Opens the file for writing a CSV export.
+
+    :param path: the file to write to
+    :type path: str
+    :param compression: the compression to apply (gzip, bz2, xz, zstd), None for uncompressed
+    :type compression: str
+    :return: the file object
+    :rtype: file
+    """
+
+    if compression is None:
+        return open(path, mode='w', newline='', encoding='utf-8')
+    if compression == 'gzip':
+        return gzip.open(path, mode='wt', newline='', encoding='utf-8')
+    if compression == 'bz2':
+        return bz2.open(path, mode='wt', newline='', encoding='utf-8')
+    if compression == 'xz':
+        return lzma.open(path, mode='wt', newline='', encoding='utf-8')
+    if compression == 'zstd':
+        import zstandard
+        writer = zstandard.ZstdCompressor().stream_writer(open(path, mode='wb'), closefd=True)
+        return io.TextIOWrapper(writer, newline='', encoding='utf-8')
+    raise Exception("Unsupported compression: %s" % compression)
+
+
+def random_date(rnd, start_year, end_year):
+    """
+    Generates a random date.
+
+    :param rnd: the random number generator to use
+    :type rnd: random.Random
+    :param start_year: the first year
+    :type start_year: int
+    :param end_year: the last year
+    :type end_year: int
+    :return: the date
+    :rtype: date
+    """
+
+    return date(rnd.randint(start_year, end_year), rnd.randint(1, 12), rnd.randint(1, 28))
+
+
+def column_pool(rnd, name, converter, year):
+    """
+    Generates the values to pick from for a grade results column, based on its converter.
+
+    :param rnd: the random number generator to use
+    :type rnd: random.Random
+    :param name: the name of the column
+    :type name: str
+    :param converter: the converter of the column (see grade_results_columns)
+    :type converter: function
+    :param year: the year of the export
+    :type year: int
+    :return: the list of values
+    :rtype: list
+    """
+
+    if name in GRADE_RESULTS_DATE_FORMATS:
+        return [''] + [random_date(rnd, year - 30, year).strftime(GRADE_RESULTS_DATE_FORMATS[name]) for i in range(POOL_SIZE)]
+    if converter is int_value:
+        return ['', '0', '1'] + [str(rnd.randint(0, 2100)) for i in range(POOL_SIZE)]
+    if converter is float_value:
+        return ['', '0', '1,200'] + ["%.2f" % (rnd.random() * 1000) for i in range(POOL_SIZE)]
+    if converter is fix_org_unit:
+        return ['SCMS', 'FCMS', 'FASS', 'SMST', 'WMS', 'FEDU', 'SSEN']
+    if converter is None:
+        return [''] + ["%s %d" % (name.replace('_', ' ').title(), i) for i in range(POOL_SIZE)]
+    # date converters of the grade results
+    return [''] + [random_date(rnd, year - 30, year).strftime("%d/%m/%y") for i in range(POOL_SIZE)]
+
+
+def generate_grade_results(path, rows, year, compression=None, seed=1):
+    """
+    Writes a synthetic grade results export (Brio/Hyperion), with about 5 papers per student.
+
+    :param path: the file to write to
+    :type path: str
+    :param rows: the number of rows to generate
+    :type rows: int
+    :param year: the year of the results
+    :type year: int
+    :param compression: the compression to apply (gzip, bz2, xz, zstd), None for uncompressed
+    :type compression: str
+    :param seed: the seed for the random number generator
+    :type seed: int
+    """
+
+    rnd = random.Random(seed)
+    columns = grade_results_columns()
+    names = [c[0] for c in columns]
+    pools = [column_pool(rnd, name, converter, year) for name, aliases, converter, defvalue in columns]
+    index = dict([(name, i) for i, name in enumerate(names)])
+    students = max(1, rows // 5)
+    query_date = date(year, 12, 31).strftime(GRADE_RESULTS_DATE_FORMATS['query_date'])
+    with open_export(path, compression=compression) as f:
+        writer = csv_writer(f)
+        # mixed case, as in the actual exports
+        writer.writerow([c[1][0].upper() if i % 3 == 0 else c[1][0] for i, c in enumerate(columns)])
+        for i in range(rows):
+            row = [rnd.choice(pool) for pool in pools]
+            student_id = 1000000 + rnd.randint(0, students)
+            program = rnd.choice(['DP', 'MD', 'BD', 'BD', 'BD'])
+            if program == 'DP':
+                paper = 'COMP900'
+            elif program == 'MD':
+                paper = 'COMP59%d' % rnd.choice([3, 4, 9])
+            else:
+                paper = 'COMP%d' % rnd.randint(100, 399)
+            start = date(year, rnd.randint(1, 6), rnd.randint(1, 28))
+            end = start + timedelta(days=rnd.randint(60, 300))
+            row[index['student_id']] = str(student_id)
+            row[index['name']] = 'Student "%d", Given%d' % (student_id, student_id % 97)
+            row[index['email']] = 's%d@example.com' % student_id
+            row[index['programme_type_code']] = program
+            row[index['paper_master_code']] = paper
+            row[index['paper_occurrence']] = '%s-%02d%s (HAM)' % (paper, year % 100, rnd.choice(['A', 'B']))
+            row[index['occurrence_startdate']] = start.strftime(GRADE_RESULTS_DATE_FORMATS['occurrence_startdate'])
+            row[index['occurrence_enddate']] = end.strftime(GRADE_RESULTS_DATE_FORMATS['occurrence_enddate'])
+            row[index['occurrence_startyear']] = str(year)
+            row[index['final_grade']] = rnd.choice(['A+', 'A', 'B', 'C', 'WD', '...', ''])
+            row[index['enrolmentorcosuoid']] = str(rnd.randint(1, 10 ** 9))
+            row[index['query_date']] = query_date
+            writer.writerow(row)
+    logger.info("Generated %d grade results rows: %s" % (rows, path))
+
+
+def generate_coursedefs(path, rows, compression=None, seed=1):
+    """
+    Writes a synthetic course definitions export.
+
+    :param path: the file to write to
+    :type path: str
+    :param rows: the number of rows to generate
+    :type rows: int
+    :param compression: the compression to apply (gzip, bz2, xz, zstd), None for uncompressed
+    :type compression: str
+    :param seed: the seed for the random number generator
+    :type seed: int
+    """
+
+    rnd = random.Random(seed)
+    header = []
+    pools = []
+    for name, aliases, converter, defvalue in COURSEDEFS_COLUMNS:
+        if aliases[0] in header:
+            continue
+        header.append(aliases[0])
+        # based on the model, as not all columns have a converter
+        field = CourseDefs._meta.get_field(name)
+        kind = field.get_internal_type()
+        if kind in ['BooleanField', 'NullBooleanField']:
+            pools.append(['0', '1'])
+        elif kind == 'IntegerField':
+            pools.append([str(rnd.choice([15, 30, 60, 120, rnd.randint(0, 500)])) for i in range(POOL_SIZE)])
+        elif kind == 'FloatField':
+            pools.append(["%.3f" % rnd.random() for i in range(POOL_SIZE)])
+        else:
+            pools.append([("%d %s" % (i, name.replace('_', ' ').title()))[:field.max_length] for i in range(POOL_SIZE)])
+    with open_export(path, compression=compression) as f:
+        writer = csv_writer(f)
+        writer.writerow(header)
+        for i in range(rows):
+            row = [rnd.choice(pool) for pool in pools]
+            row[0] = 'COMP%d' % (100 + i)
+            writer.writerow(row)
+    logger.info("Generated %d course definitions rows: %s" % (rows, path))
+
+
+def generate_supervisors(path, rows, compression=None, seed=1):
+    """
+    Writes a synthetic supervisors export (Jade), with about 2 supervisors per student.
+
+    :param path: the file to write to
+    :type path: str
+    :param rows: the number of rows to generate
+    :type rows: int
+    :param compression: the compression to apply (gzip, bz2, xz, zstd), None for uncompressed
+    :type compression: str
+    :param seed: the seed for the random number generator
+    :type seed: int
+    """
+
+    rnd = random.Random(seed)
+    students = max(1, rows // 2)
+    with open_export(path, compression=compression) as f:
+        writer = csv_writer(f)
+        writer.writerow(['Student', 'Supervisor', 'Active Roles', 'Entity', 'Agreement Status', 'Date Agreed',
+                         'Completion Date', 'Proposed Enrolment Date', 'Proposed Research Topic', 'Title', 'Quals',
+                         'Comments'])
+        for i in range(rows):
+            student_id = 1000000 + rnd.randint(0, students)
+            student = 'Given%d Family%d' % (student_id % 97, student_id)
+            supervisor = rnd.choice(SUPERVISOR_NAMES)
+            writer.writerow([
+                '%s %d' % (student, student_id),
+                supervisor,
+                rnd.choice(['Chief Supervisor', 'Supervisor', 'Supervisor']),
+                'Award/%s %s' % (rnd.choice(AWARDS), student),
+                rnd.choice(['Agreed', 'Pending']),
+                random_date(rnd, 2005, 2020).strftime('%d/%m/%Y'),
+                rnd.choice(['', random_date(rnd, 2010, 2024).strftime('%d %b %Y')]),
+                rnd.choice(['', '*invalid*', random_date(rnd, 2005, 2020).strftime('%d %b %Y')]),
+                'Topic %d' % rnd.randint(1, 1000),
+                supervisor.split(' ')[0] + rnd.choice(['', '', ' (removed)', ' (replaced)']),
+                rnd.choice(['PhD', 'MSc', 'PhD, MSc']),
+                '',
+            ])
+    logger.info("Generated %d supervisors rows: %s" % (rows, path))
+
+
+def generate_scholarships(path, rows, compression=None, seed=1):
+    """
+    Writes a synthetic scholarships export (Jade).
+
+    :param path: the file to write to
+    :type path: str
+    :param rows: the number of rows to generate
+    :type rows: int
+    :param compression: the compression to apply (gzip, bz2, xz, zstd), None for uncompressed
+    :type compression: str
+    :param seed: the seed for the random number generator
+    :type seed: int
+    """
+
+    rnd = random.Random(seed)
+    with open_export(path, compression=compression) as f:
+        writer = csv_writer(f)
+        writer.writerow(['Person ID', 'Template', 'Status', 'Decision', 'Year'])
+        for i in range(rows):
+            writer.writerow([
+                str(1000000 + rnd.randint(0, max(1, rows))),
+                rnd.choice(['University of Waikato Doctoral Scholarship', 'Masters Research Scholarship', 'Other']),
+                rnd.choice(['Active', 'Completed', 'Withdrawn']),
+                rnd.choice(['Accepted', 'Declined', 'Pending']),
+                str(rnd.randint(2005, 2024)),
+            ])
+    logger.info("Generated %d scholarships rows: %s" % (rows, path))
+
+
+def generate_associatedrole(path, rows, compression=None, seed=1):
+    """
+    Writes a synthetic associated role export (Jade).
+
+    :param path: the file to write to
+    :type path: str
+    :param rows: the number of rows to generate
+    :type rows: int
+    :param compression: the compression to apply (gzip, bz2, xz, zstd), None for uncompressed
+    :type compression: str
+    :param seed: the seed for the random number generator
+    :type seed: int
+    """
+
+    rnd = random.Random(seed)
+    students = max(1, rows // 2)
+    with open_export(path, compression=compression) as f:
+        writer = csv_writer(f)
+        writer.writerow(['Role', 'Person', 'Entity', 'Valid From', 'Valid To'])
+        for i in range(rows):
+            student_id = 1000000 + rnd.randint(0, students)
+            writer.writerow([
+                rnd.choice(['Chief Supervisor', 'Supervisor', 'Supervisor', '']),
+                rnd.choice(SUPERVISOR_NAMES),
+                'Award/%s Given%d Family%d - %d' % (rnd.choice(AWARDS), student_id % 97, student_id, student_id),
+                random_date(rnd, 2005, 2020).strftime('%d/%m/%Y'),
+                rnd.choice(['', '', random_date(rnd, 2010, 2024).strftime('%d/%m/%Y')]),
+            ])
+    logger.info("Generated %d associated role rows: %s" % (rows, path))
@@ -0,0 +1,622 @@
+from django.test import TestCase, SimpleTestCase
+from django.db import connection
+from unittest.mock import patch
+from csv import reader as csv_reader, writer as csv_writer
+from io import BytesIO
+from datetime import date
+from dbbackend.models import GradeResults, ImportJob, Dimension
+from supervisors.models import Scholarship, Supervisors, StudentDates, StudentDatesPending
+from dbbackend.bulk import BulkWriter
+from dbbackend.checkpoint import OffsetLineReader
+from dbbackend.compression import open_binary, open_text, source_file, detect_compression, DecompressingReader
+from dbbackend.dbimport import import_grade_results, map_grade_results, grade_results_columns, DateCache
+from dbbackend.dbimport import import_scholarships, get_tablestatus, SCHOLARSHIPS_NATURAL_KEY
+from dbbackend.dbimport import mark_student_dates, populate_student_dates
+from dbbackend.merge import MergeWriter
+from dbbackend.parallel import record_boundary, split_file, read_chunks, read_range
+from dbbackend.shadow import ShadowTable
+from dbbackend.dimensions import rebuild_dimensions, dimension_values, dimension_years
+import dbbackend.dimensions as dimensions
+from reporting.db import RowMapper
+import reporting.settings
+import tempfile
+import shutil
+import gzip
+import bz2
+import lzma
+import io
+import os
+
+
+GRADE_RESULTS_HEADER = ["student_id", "name", "paper_master_code", "hasdisability"]
+""" the columns of the grade results files used for testing """
+
+
+def write_csv(rows, header=GRADE_RESULTS_HEADER):
+    """
+    Writes the rows to a temporary CSV file.
+
+    :param rows: the rows to write
+    :type rows: list
+    :param header: the header row
+    :type header: list
+    :return: the file name
+    :rtype: str
+    """
+
+    fd, filename = tempfile.mkstemp(suffix=".csv")
+    with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+        writer = csv_writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return filename
+
+
+class BulkWriterTestCase(TestCase):
+    """
+    Checks that the bulk writer writes the rows in batches, each batch with its checkpoint (without COPY).
+    """
+
+    def setUp(self):
+        self.patcher = patch.object(reporting.settings, 'IMPORT_USE_COPY', False)
+        self.patcher.start()
+        self.shadow = None
+
+    def tearDown(self):
+        self.patcher.stop()
+        if self.shadow is not None:
+            self.shadow.drop()
+
+    def rows(self, count):
+        return [GradeResults(year=2016, student_id=str(1000000 + i), name="Student %d" % i, paper_master_code="COMP100")
+                for i in range(count)]
+
+    def count(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute("select count(*) from %s" % table)
+            return cursor.fetchone()[0]
+
+    def test_batches(self):
+        checkpoints = []
+        progress = []
+
+        def checkpoint(count):
+            checkpoints.append((count, self.count(GradeResults._meta.db_table)))
+
+        with patch.object(reporting.settings, 'IMPORT_BATCH_SIZE', 10):
+            writer = BulkWriter(GradeResults, progress=progress.append, checkpoint=checkpoint)
+        self.assertFalse(writer.use_copy)
+        for row in self.rows(25):
+            writer.add(row)
+        self.assertEqual(writer.count, 20)
+        self.assertEqual(len(writer.pending), 5)
+        self.assertEqual(writer.close(), 25)
+        # the checkpoints see the rows of their batch
+        self.assertEqual(checkpoints, [(10, 10), (20, 20), (25, 25)])
+        self.assertEqual(progress, [10, 20, 25])
+        self.assertEqual(sorted(GradeResults.objects.all().values_list('student_id', flat=True)),
+                         [str(1000000 + i) for i in range(25)])
+
+    def test_failed_checkpoint(self):
+        def checkpoint(count):
+            if count > 10:
+                raise Exception("simulated checkpoint failure")
+
+        writer = BulkWriter(GradeResults, batch_size=10, checkpoint=checkpoint)
+        with self.assertRaises(Exception):
+            for row in self.rows(15):
+                writer.add(row)
+            writer.close()
+        # the batch of the failed checkpoint got rolled back
+        self.assertEqual(writer.count, 10)
+        self.assertEqual(GradeResults.objects.all().count(), 10)
+
+    def test_insert(self):
+        self.shadow = ShadowTable(GradeResults)
+        self.shadow.create()
+        writer = BulkWriter(GradeResults, batch_size=10, table=self.shadow.staging)
+        for row in self.rows(15):
+            writer.add(row)
+        self.assertEqual(writer.close(), 15)
+        self.assertEqual(self.count(self.shadow.staging), 15)
+        self.assertEqual(GradeResults.objects.all().count(), 0)
+        with connection.cursor() as cursor:
+            cursor.execute("select student_id, name, year from %s where student_id = '1000003'" % self.shadow.staging)
+            self.assertEqual(cursor.fetchall(), [("1000003", "Student 3", 2016)])
+
+
+class ImportTestCase(TestCase):
+    """
+    Runs imports with the maintenance mode state in a temporary directory,
+    leaving the one of the site alone.
+    """
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.maintenance = self.settings(
+            MAINTENANCE_MODE_STATE_FILE_PATH=os.path.join(self.state_dir, "maintenance_mode_state.txt"))
+        self.maintenance.enable()
+
+    def tearDown(self):
+        self.maintenance.disable()
+        shutil.rmtree(self.state_dir)
+
+
+class ResumeTestCase(ImportTestCase):
+    """
+    Checks that a failed grade results import continues after its last checkpoint.
+    """
+
+    BAD_ROWS = [3, 25, 47]
+
+    def setUp(self):
+        super(ResumeTestCase, self).setUp()
+        rows = []
+        for i in range(50):
+            rows.append([str(1000000 + i), "Student %d" % i, "COMP100", "xx" if i in self.BAD_ROWS else "0"])
+        self.csv = write_csv(rows)
+
+    def tearDown(self):
+        os.remove(self.csv)
+        for job in ImportJob.objects.all():
+            if os.path.exists(job.rejects_file):
+                os.remove(job.rejects_file)
+        super(ResumeTestCase, self).tearDown()
+
+    def test_resume(self):
+        flush = BulkWriter.flush
+        batches = [0]
+
+        def failing_flush(writer):
+            if len(writer.pending) > 0:
+                batches[0] += 1
+                if batches[0] == 3:
+                    raise Exception("simulated connection loss")
+            flush(writer)
+
+        with patch.object(reporting.settings, 'IMPORT_BATCH_SIZE', 10):
+            with patch.object(BulkWriter, 'flush', failing_flush):
+                self.assertIsNotNone(import_grade_results(2016, self.csv, 'utf-8', delete=False))
+            job = ImportJob.objects.get()
+            self.assertEqual(job.status, 'failed')
+            self.assertEqual((job.written, job.rejected), (20, 1))
+            self.assertIsNone(import_grade_results(2016, self.csv, 'utf-8', delete=False))
+
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, 'finished')
+        self.assertEqual((job.written, job.rejected), (47, 3))
+        self.assertEqual(GradeResults.objects.all().filter(year=2016).count(), 47)
+        self.assertEqual(GradeResults.objects.all().filter(student_id="1000025").count(), 0)
+        # rows rejected before the failure are only listed once
+        with open(job.rejects_file, newline='', encoding='utf-8') as f:
+            rejects = list(csv_reader(f))
+        self.assertEqual(rejects[0], ['row', 'error'] + GRADE_RESULTS_HEADER)
+        self.assertEqual([r[0] for r in rejects[1:]], [str(i + 1) for i in self.BAD_ROWS])
+
+
+class StudentDatesTestCase(ImportTestCase):
+    """
+    Checks that incremental student dates runs only recalculate the marked students
+    (calculation stubbed, as it uses PostgreSQL-specific SQL).
+    """
+
+    def setUp(self):
+        super(StudentDatesTestCase, self).setUp()
+        for student_id in ["1000001", "1000003"]:
+            Supervisors(student_id=student_id, student="Student", supervisor="Dr Jones", active_roles="Supervisor",
+                        entity="", agreement_status="", date_agreed="", title="", quals="", comments="",
+                        active=True).save()
+        for student_id in ["1000001", "1000002", "1000003"]:
+            self.dates(student_id, "DP").save()
+        # 1000002 is no longer supervised
+        mark_student_dates("select student_id from %s where student_id in ('1000001', '1000002')"
+                           % StudentDates._meta.db_table)
+        self.calculated = []
+
+    def dates(self, student_id, program):
+        return StudentDates(student_id=student_id, program=program, start_date=date(2015, 3, 1),
+                            end_date=date(2018, 12, 31), school="FCMS", department="COMP")
+
+    def calculate(self, students):
+        with connection.cursor() as cursor:
+            cursor.execute(students)
+            student_ids = sorted([row[0] for row in cursor.fetchall()])
+        self.calculated.append(student_ids)
+        # marked by an import while calculating
+        StudentDatesPending(student_id="1000003").save()
+        return [self.dates(student_id, "MD") for student_id in student_ids]
+
+    def state(self):
+        return sorted(StudentDates.objects.all().values_list('student_id', 'program'))
+
+    def test_mark(self):
+        self.assertEqual(sorted(StudentDatesPending.objects.all().values_list('student_id', flat=True)),
+                         ["1000001", "1000002"])
+        # already marked and NULL students get skipped
+        mark_student_dates("select student_id from %s union all select null" % StudentDates._meta.db_table)
+        self.assertEqual(sorted(StudentDatesPending.objects.all().values_list('student_id', flat=True)),
+                         ["1000001", "1000002", "1000003"])
+
+    def test_incremental(self):
+        with patch('dbbackend.dbimport.calculate_student_dates', side_effect=self.calculate):
+            self.assertIsNone(populate_student_dates(incremental=True))
+        # only the marked students that are still supervised
+        self.assertEqual(self.calculated, [["1000001"]])
+        self.assertEqual(self.state(), [("1000001", "MD"), ("1000003", "DP")])
+        # marks added during the run are left for the next one
+        self.assertEqual(list(StudentDatesPending.objects.all().values_list('student_id', flat=True)), ["1000003"])
+
+        with patch('dbbackend.dbimport.calculate_student_dates', side_effect=self.calculate):
+            self.assertIsNone(populate_student_dates(incremental=True))
+        self.assertEqual(self.calculated, [["1000001"], ["1000003"]])
+        self.assertEqual(self.state(), [("1000001", "MD"), ("1000003", "MD")])
+
+    def test_nothing_pending(self):
+        StudentDatesPending.objects.all().delete()
+        with patch('dbbackend.dbimport.calculate_student_dates', side_effect=self.calculate):
+            self.assertIsNone(populate_student_dates(incremental=True))
+        self.assertEqual(self.calculated, [])
+        self.assertEqual(self.state(), [("1000001", "DP"), ("1000002", "DP"), ("1000003", "DP")])
+
+    def test_full(self):
+        with patch('dbbackend.dbimport.calculate_student_dates', side_effect=self.calculate):
+            self.assertIsNone(populate_student_dates(incremental=False))
+        self.assertEqual(self.calculated, [["1000001", "1000003"]])
+        self.assertEqual(self.state(), [("1000001", "MD"), ("1000003", "MD")])
+
+
+TRICKY_CSV = (b'student_id,name,paper_master_code,hasdisability\n'
+              b'1000001,"Multi\nline ""quoted""\nname",COMP100,0\n'
+              b'1000002,"""",COMP200,1\n'
+              b'\n'
+              b'1000003,"a,b\n""\n""c",COMP300,xx\n'
+              b'1000004,"' + b'long ' * 40 + b'\n' + b'record' * 20 + b'",COMP400,0\n'
+              b'1000005,"\xc3\xa9l\xc3\xa8ve ""\n""",COMP500,0')
+""" grade results with quoted newlines, escaped quotes, an empty line, a rejected row, a long record
+and no trailing newline """
+
+
+def parse_records(data):
+    """
+    Parses the CSV data.
+
+    :param data: the data to parse
+    :type data: bytes
+    :return: the records
+    :rtype: list
+    """
+
+    return list(csv_reader(data.decode('utf-8').splitlines(keepends=True)))
+
+
+class ParallelParseTestCase(SimpleTestCase):
+    """
+    Checks that splitting grade results files into chunks of complete records
+    neither corrupts nor drops rows.
+    """
+
+    def setUp(self):
+        self.header_size = TRICKY_CSV.index(b'\n') + 1
+        self.records = parse_records(TRICKY_CSV[self.header_size:])
+        self.csv = None
+
+    def tearDown(self):
+        if self.csv is not None:
+            os.remove(self.csv)
+
+    def write(self, compress=False):
+        fd, self.csv = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(gzip.compress(TRICKY_CSV) if compress else TRICKY_CSV)
+        return self.csv
+
+    def test_record_boundary(self):
+        # newline inside a quoted cell, after an escaped quote
+        self.assertEqual(record_boundary(b'1,"a\n""b""\nc"\n2,"x\n'), len(b'1,"a\n""b""\nc"\n'))
+        self.assertEqual(record_boundary(b'1,"a\n""b'), -1)
+        self.assertEqual(record_boundary(b'1,2'), -1)
+
+    def test_split_file(self):
+        path = self.write()
+        # every chunk edge, including chunks smaller than a single record
+        for chunk_size in range(1, len(TRICKY_CSV) + 2):
+            chunks = list(split_file(path, self.header_size, chunk_size))
+            self.assertEqual(chunks[0][0], self.header_size)
+            self.assertEqual(chunks[-1][1], len(TRICKY_CSV))
+            records = []
+            for i, (start, end) in enumerate(chunks):
+                data = read_range(path, start, end)
+                if i < len(chunks) - 1:
+                    self.assertEqual(record_boundary(data), len(data), "chunk size %d" % chunk_size)
+                    self.assertEqual(chunks[i + 1][0], end)
+                records.extend(parse_records(data))
+            self.assertEqual(records, self.records, "chunk size %d" % chunk_size)
+
+    def test_read_chunks(self):
+        for chunk_size in range(1, len(TRICKY_CSV) + 2):
+            records = []
+            for data in read_chunks(BytesIO(TRICKY_CSV[self.header_size:]), chunk_size):
+                records.extend(parse_records(data))
+            self.assertEqual(records, self.records, "chunk size %d" % chunk_size)
+
+    def map_rows(self, path):
+        csvfile = open_binary(path)
+        try:
+            lines = OffsetLineReader(csvfile, 'utf-8')
+            reader = csv_reader(lines)
+            header = next(reader)
+            mapper = RowMapper(header, grade_results_columns(DateCache()))
+            rows, executor, progress = map_grade_results("dbbackend_graderesults", path, 'utf-8', csvfile, lines,
+                                                         reader, header, mapper)
+            result = [(offset, values, error) for offset, values, error, cells in rows]
+            if executor is not None:
+                executor.shutdown()
+            return result, executor is not None
+        finally:
+            csvfile.close()
+
+    def test_parallel(self):
+        for compress in [False, True]:
+            path = self.write(compress=compress)
+            sequential, parallel = self.map_rows(path)
+            self.assertFalse(parallel)
+            with patch.object(reporting.settings, 'IMPORT_PARSE_MIN_SIZE', 0), \
+                    patch.object(reporting.settings, 'IMPORT_PARSE_WORKERS', 2), \
+                    patch.object(reporting.settings, 'IMPORT_PARSE_CHUNK_SIZE', 16):
+                rows, parallel = self.map_rows(path)
+            self.assertTrue(parallel)
+            self.assertEqual(rows, sequential)
+            self.assertEqual(len(rows), len(self.records))
+            self.assertEqual([r[1]['student_id'] for r in rows if r[1] is not None],
+                             ["1000001", "1000002", "1000004", "1000005"])
+            self.assertIsNotNone(rows[3][2])
+            os.remove(path)
+            self.csv = None
+
+
+COMPRESSORS = [
+    ('gzip', gzip.compress),
+    ('bz2', bz2.compress),
+    ('xz', lzma.compress),
+]
+""" the compression formats of the standard library with their compression function """
+
+
+class CompressionTestCase(SimpleTestCase):
+    """
+    Checks that compressed files get detected and decompressed, including seeking forward.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data = "".join(["%d,Student %d,COMP%d,0\n" % (1000000 + i, i, i % 1000) for i in range(500)]).encode('utf-8')
+        self.files = dict()
+        self.files[None] = self.write("plain.csv", self.data)
+        for codec, compress in COMPRESSORS:
+            self.files[codec] = self.write(codec + ".csv", compress(self.data))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def read(self, reader, size):
+        # raw reads return at most the rest of the current block
+        result = b''
+        while len(result) < size:
+            data = reader.read(size - len(result))
+            if len(data) == 0:
+                break
+            result += data
+        return result
+
+    def test_detect(self):
+        for codec in self.files:
+            self.assertEqual(detect_compression(self.files[codec]), codec)
+        # zstd frame header
+        self.assertEqual(detect_compression(self.write("zstd.csv", b'\x28\xb5\x2f\xfd\x00\x00')), 'zstd')
+        self.assertIsNone(detect_compression(self.write("empty.csv", b'')))
+
+    def test_round_trip(self):
+        for codec in self.files:
+            with open_binary(self.files[codec]) as f:
+                self.assertEqual(f.read(), self.data, codec)
+                self.assertEqual(source_file(f).name, self.files[codec])
+            with open_text(self.files[codec], encoding='utf-8') as f:
+                self.assertEqual(f.read(), self.data.decode('utf-8'), codec)
+            if codec is not None:
+                # blocks smaller than the lines, buffer smaller than the file
+                reader = DecompressingReader(open(self.files[codec], 'rb'), codec, block_size=7, blocks=2)
+                self.assertEqual(reader.read(), self.data, codec)
+                self.assertEqual(reader.read(), b'', codec)
+                reader.close()
+
+    def test_zstd(self):
+        try:
+            import zstandard
+        except ImportError:
+            path = self.write("zstd.csv", b'\x28\xb5\x2f\xfd\x00\x00')
+            with self.assertRaisesRegex(Exception, "zstandard"):
+                open_binary(path)
+            return
+        path = self.write("zstd.csv", zstandard.ZstdCompressor().compress(self.data))
+        with open_binary(path) as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_seek(self):
+        for codec, _ in COMPRESSORS:
+            reader = DecompressingReader(open(self.files[codec], 'rb'), codec, block_size=64, blocks=2)
+            self.assertEqual(self.read(reader, 10), self.data[:10])
+            self.assertEqual(reader.seek(500), 500)
+            self.assertEqual(self.read(reader, 100), self.data[500:600])
+            self.assertEqual(reader.seek(10, io.SEEK_CUR), 610)
+            self.assertEqual(reader.tell(), 610)
+            self.assertEqual(self.read(reader, 5), self.data[610:615])
+            with self.assertRaises(io.UnsupportedOperation):
+                reader.seek(100)
+            with self.assertRaises(io.UnsupportedOperation):
+                reader.seek(0, io.SEEK_END)
+            # seeking past the end stops at the end
+            self.assertEqual(reader.seek(len(self.data) + 100), len(self.data))
+            self.assertEqual(reader.read(), b'')
+            reader.close()
+
+    def test_close(self):
+        # closing before reading everything stops the thread waiting for buffer space
+        reader = DecompressingReader(open(self.files['gzip'], 'rb'), 'gzip', block_size=16, blocks=1)
+        self.assertEqual(self.read(reader, 16), self.data[:16])
+        reader.close()
+        self.assertFalse(reader.thread.is_alive())
+        self.assertTrue(reader.closed)
+        reader.close()
+
+
+SCHOLARSHIPS_HEADER = ["Person ID", "Template", "Status", "Decision", "Year"]
+""" the columns of the scholarships files used for testing """
+
+SCHOLARSHIPS = [
+    ["1000001", "Doctoral", "Active", "Active", "2016"],
+    ["1000002", "Doctoral", "Active", "Active", "2016"],
+    ["1000003", "Masters", "Active", "Active", "2017"],
+    ["1000004", "Masters", "Active", "Active", "2017"],
+    ["1000004", "Masters", "Active", "Active", "2017"],
+]
+""" the scholarships of the initial import, including a duplicate row """
+
+
+class MergeTestCase(ImportTestCase):
+    """
+    Checks that merge imports only apply the differences and record them in the change log.
+    """
+
+    def setUp(self):
+        super(MergeTestCase, self).setUp()
+        # the change logs get written to the temp directory
+        self.tmp_dir = tempfile.mkdtemp()
+        self.patcher = patch.object(reporting.settings, 'TMP_DIR', self.tmp_dir)
+        self.patcher.start()
+        self.assertIsNone(self.merge(SCHOLARSHIPS))
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.tmp_dir)
+        super(MergeTestCase, self).tearDown()
+
+    def merge(self, rows):
+        return import_scholarships(write_csv(rows, header=SCHOLARSHIPS_HEADER), 'utf-8', delete=True, merge=True)
+
+    def state(self):
+        return sorted(Scholarship.objects.all().values_list('student_id', 'name', 'status', 'decision', 'year'))
+
+    def writer(self, rows):
+        writer = MergeWriter(Scholarship, SCHOLARSHIPS_NATURAL_KEY)
+        for row in rows:
+            writer.add(Scholarship(student_id=row[0], name=row[1], status=row[2], decision=row[3], year=int(row[4])))
+        writer.close()
+        return writer
+
+    def test_unchanged(self):
+        ids = sorted(Scholarship.objects.all().values_list('id', flat=True))
+        self.assertTrue(get_tablestatus(Scholarship._meta.db_table).startswith("Merged 5 rows: added 5, changed 0, removed 0, unchanged 0"))
+        self.assertIsNone(self.merge(SCHOLARSHIPS))
+        self.assertEqual(get_tablestatus(Scholarship._meta.db_table), "Merged 5 rows: added 0, changed 0, removed 0, unchanged 5")
+        # order of the rows is irrelevant
+        writer = self.writer(list(reversed(SCHOLARSHIPS)))
+        self.assertEqual(writer.counts, {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 5})
+        self.assertIsNone(writer.changelog)
+        self.assertEqual(sorted(Scholarship.objects.all().values_list('id', flat=True)), ids)
+
+    def test_changes(self):
+        unchanged = Scholarship.objects.get(student_id="1000001").id
+        rows = [
+            SCHOLARSHIPS[0],
+            ["1000002", "Doctoral", "Suspended", "Active", "2016"],
+            SCHOLARSHIPS[3],
+            ["1000005", "Doctoral", "Active", "Pending", "2018"],
+        ]
+        writer = self.writer(rows)
+        self.assertEqual(writer.counts, {'added': 1, 'changed': 1, 'removed': 2, 'unchanged': 2})
+        self.assertEqual(writer.students, {"1000002", "1000003", "1000004", "1000005"})
+        self.assertEqual(self.state(), sorted([
+            ("1000001", "Doctoral", "Active", "Active", 2016),
+            ("1000002", "Doctoral", "Suspended", "Active", 2016),
+            ("1000004", "Masters", "Active", "Active", 2017),
+            ("1000005", "Doctoral", "Active", "Pending", 2018),
+        ]))
+        self.assertEqual(Scholarship.objects.get(student_id="1000001").id, unchanged)
+        with open(writer.changelog, newline='', encoding='utf-8') as f:
+            changes = list(csv_reader(f))
+        self.assertEqual(changes[0], ['change'] + list(SCHOLARSHIPS_NATURAL_KEY))
+        self.assertEqual(sorted(changes[1:]), [
+            ["added", "1000005", "Doctoral", "2018"],
+            ["changed", "1000002", "Doctoral", "2016"],
+            ["removed", "1000003", "Masters", "2017"],
+            ["removed", "1000004", "Masters", "2017"],
+        ])
+
+
+class DimensionsTestCase(TestCase):
+    """
+    Checks that the dimensions summarize the imported data and only get rebuilt when needed.
+    """
+
+    def setUp(self):
+        for year, school, department, paper in [(2015, "FCMS", "COMP", "COMP100"),
+                                                (2016, "FCMS", "COMP", "COMP200"),
+                                                (2015, "FCMS", "COMP", "COMP200"),
+                                                (2016, "FCMS", "MATH", "MATH100"),
+                                                (2016, "FASS", "COMP", "COMP100"),
+                                                (2014, "FASS", "COMP", "COMP100")]:
+            GradeResults(year=year, student_id="1000001", owning_school_clevel=school,
+                         owning_department_clevel=department, paper_master_code=paper).save()
+
+    def test_rebuild(self):
+        self.assertIsNone(rebuild_dimensions(GradeResults._meta.db_table))
+        year = Dimension.objects.get(dimension='graderesults.paper', value="COMP100")
+        self.assertEqual((year.count, year.min_year, year.max_year), (3, 2014, 2016))
+        # departments of several schools
+        self.assertEqual(Dimension.objects.all().filter(dimension='graderesults.department', value="COMP").count(), 2)
+        # old values get replaced
+        GradeResults.objects.all().filter(owning_department_clevel="MATH").delete()
+        self.assertIsNone(rebuild_dimensions(GradeResults._meta.db_table))
+        self.assertEqual(dimension_values('graderesults.department'), ["COMP"])
+        self.assertIsNone(rebuild_dimensions("unknown_table"))
+
+    def test_values(self):
+        self.assertEqual(dimension_values('graderesults.school'), ["FASS", "FCMS"])
+        self.assertEqual(dimension_values('graderesults.department'), ["COMP", "MATH"])
+        self.assertEqual(dimension_values('graderesults.department', parents=["FASS"]), ["COMP"])
+        self.assertEqual(dimension_values('graderesults.department', parents=["FCMS", "FASS"]), ["COMP", "MATH"])
+        self.assertEqual(dimension_values('graderesults.paper', pattern="COMP%"), ["COMP100", "COMP200"])
+        self.assertEqual(dimension_values('graderesults.year', latest_first=True), ["2016", "2015", "2014"])
+        self.assertEqual(dimension_years('graderesults.paper'), (2014, 2016))
+
+    def test_latest_first(self):
+        GradeResults(year=2017, student_id="1000001", owning_school_clevel="FCMS",
+                     owning_department_clevel="STAT", paper_master_code="STAT100").save()
+        # sorted by latest year, then value, each value only once
+        self.assertEqual(dimension_values('graderesults.department', latest_first=True), ["STAT", "COMP", "MATH"])
+        self.assertEqual(dimension_values('graderesults.paper', latest_first=True),
+                         ["STAT100", "COMP100", "COMP200", "MATH100"])
+
+    def test_placeholder_dates(self):
+        for start_date, school in [(date(1900, 1, 1), "FCMS"), (date(2015, 3, 1), "FCMS"), (date(2016, 3, 1), "")]:
+            StudentDates(student_id="1000001", program="DP", start_date=start_date, end_date=date(9999, 12, 31),
+                         school=school).save()
+        self.assertEqual(dimension_years('studentdates.school'), (2015, 2016))
+        self.assertEqual(dimension_values('studentdates.school', non_empty=True), ["FCMS"])
+
+    def test_ensure(self):
+        with patch('dbbackend.dimensions.rebuild_dimensions', wraps=dimensions.rebuild_dimensions) as rebuild:
+            # nothing to rebuild from
+            self.assertEqual(dimension_values('scholarship.name'), [])
+            self.assertEqual(dimension_values('scholarship.name'), [])
+            self.assertEqual(rebuild.call_count, 0)
+            # only rebuilt the first time
+            self.assertEqual(dimension_values('graderesults.school'), ["FASS", "FCMS"])
+            self.assertEqual(dimension_values('graderesults.department'), ["COMP", "MATH"])
+            self.assertEqual(rebuild.call_count, 1)
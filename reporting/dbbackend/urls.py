@@ -10,7 +10,10 @@ urlpatterns = [
     url(r'^scholarships$', views.database_scholarships, name='database_scholarships'),
     url(r'^associatedrole$', views.database_associatedrole, name='database_associatedrole'),
     url(r'^studentdates$', views.database_studentdates, name='database_studentdates'),
+    url(r'^tablestatus/json$', views.database_tablestatus_json, name='database_tablestatus_json'),
     url(r'^tablestatus', views.database_tablestatus, name='database_tablestatus'),
+    url(r'^jobs$', views.database_jobs, name='database_jobs'),
+    url(r'^jobs/cancel$', views.cancel_job, name='cancel_job'),
     url(r'^import/graderesults$', views.import_graderesults, name='import_graderesults'),
     url(r'^import/coursedefs$', views.import_coursedefs, name='import_coursedefs'),
     url(r'^import/bulk$', views.import_bulk, name='import_bulk'),
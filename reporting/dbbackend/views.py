@@ -1,19 +1,24 @@
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+from django.template.defaultfilters import filesizeformat
+from django.utils.formats import localize
+from django.utils.timezone import template_localtime
 from django.template import loader
 import reporting.applist as applist
 from django.template.defaulttags import register
 from django.contrib.auth.decorators import login_required, permission_required, user_passes_test
+from django.views.decorators.http import require_POST
 from . import dbimport
-from datetime import date
-import threading
+from . import jobs
+from datetime import date, datetime
 import logging
-from reporting.tempfile_utils import create_temp_copy
+from reporting.tempfile_utils import stage_upload, UploadQuotaExceeded
 import reporting.settings
 from dbbackend.models import read_last_parameter, write_last_parameter
 
-from dbbackend.models import TableStatus, GradeResults, CourseDefs
-from supervisors.models import Supervisors, Scholarship, StudentDates, AssociatedRole
+from dbbackend.models import TableStatus, GradeResults, Job, ImportRun
 from reporting.form_utils import get_variable
+from dbbackend.progress import progress_info, format_duration
+from dbbackend.profiling import format_phases
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +29,7 @@ def database_bulk(request):
     template = loader.get_template('dbbackend/import_bulk.html')
     context = applist.template_context()
     context['title'] = 'Bulk import'
+    context['active_import'] = jobs.is_active('import_bulk')
     context['email_notification'] = read_last_parameter(request.user, 'dbbackend.database_bulk.email', '')
     return HttpResponse(template.render(context, request))
 
@@ -35,12 +41,12 @@ def database_graderesults(request):
     for year in range(2003, date.today().year + 1):
         years.append(year)
     years.reverse()
-    tablestatus = dbimport.get_tablestatus(GradeResults._meta.db_table)
     template = loader.get_template('dbbackend/import_graderesults.html')
     context = applist.template_context()
     context['title'] = 'Import grade results'
     context['years'] = years
-    context['active_import'] = tablestatus is not None
+    context['active_import'] = jobs.is_active('import_grade_results')
+    context['defer_indexes'] = not dbimport.uses_staging_table(GradeResults._meta.db_table)
     context['email_notification'] = read_last_parameter(request.user, 'dbbackend.database_graderesults.email', '')
     return HttpResponse(template.render(context, request))
 
@@ -52,12 +58,11 @@ def database_coursedefs(request):
     for year in range(2003, date.today().year + 1):
         years.append(year)
     years.reverse()
-    tablestatus = dbimport.get_tablestatus(CourseDefs._meta.db_table)
     template = loader.get_template('dbbackend/import_coursedefs.html')
     context = applist.template_context()
     context['title'] = 'Import course definitions'
     context['years'] = years
-    context['active_import'] = tablestatus is not None
+    context['active_import'] = jobs.is_active('import_coursedefs')
     context['email_notification'] = read_last_parameter(request.user, 'dbbackend.database_coursedefs.email', '')
     return HttpResponse(template.render(context, request))
 
@@ -66,10 +71,9 @@ def database_coursedefs(request):
 @permission_required("supervisors.can_manage_supervisors")
 def database_supervisors(request):
     template = loader.get_template('dbbackend/import_supervisors.html')
-    tablestatus = dbimport.get_tablestatus(Supervisors._meta.db_table)
     context = applist.template_context()
     context['title'] = 'Import supervisors'
-    context['active_import'] = tablestatus is not None
+    context['active_import'] = jobs.is_active('import_supervisors')
     context['email_notification'] = read_last_parameter(request.user, 'dbbackend.database_supervisors.email', '')
     return HttpResponse(template.render(context, request))
 
@@ -78,10 +82,9 @@ def database_supervisors(request):
 @permission_required("supervisors.can_manage_scholarship")
 def database_scholarships(request):
     template = loader.get_template('dbbackend/import_scholarships.html')
-    tablestatus = dbimport.get_tablestatus(Scholarship._meta.db_table)
     context = applist.template_context()
     context['title'] = 'Import scholarships'
-    context['active_import'] = tablestatus is not None
+    context['active_import'] = jobs.is_active('import_scholarships')
     context['email_notification'] = read_last_parameter(request.user, 'dbbackend.database_scholarships.email', '')
     return HttpResponse(template.render(context, request))
 
@@ -90,10 +93,9 @@ def database_scholarships(request):
 @permission_required("supervisors.can_manage_associatedrole")
 def database_associatedrole(request):
     template = loader.get_template('dbbackend/import_associatedrole.html')
-    tablestatus = dbimport.get_tablestatus(AssociatedRole._meta.db_table)
     context = applist.template_context()
     context['title'] = 'Import associated role'
-    context['active_import'] = tablestatus is not None
+    context['active_import'] = jobs.is_active('import_associatedrole')
     context['email_notification'] = read_last_parameter(request.user, 'dbbackend.database_associatedrole.email', '')
     return HttpResponse(template.render(context, request))
 
@@ -102,48 +104,194 @@ def database_associatedrole(request):
 @permission_required("supervisors.can_manage_student_dates")
 def database_studentdates(request):
     template = loader.get_template('dbbackend/update_studentdates.html')
-    tablestatus = dbimport.get_tablestatus(StudentDates._meta.db_table)
     context = applist.template_context()
     context['title'] = 'Update student dates'
-    context['active_import'] = tablestatus is not None
+    context['active_import'] = jobs.is_active('populate_student_dates')
     context['email_notification'] = read_last_parameter(request.user, 'dbbackend.database_studentdates.email', '')
     return HttpResponse(template.render(context, request))
 
 
-@login_required
-@permission_required("dbbackend.can_access_table_status")
-def database_tablestatus(request):
-    template = loader.get_template('dbbackend/table_status.html')
+def format_timestamp(timestamp):
+    """
+    Formats the timestamp the same way as the templates output datetime values,
+    so that refreshed rows look like the ones rendered with the page.
+
+    :param timestamp: the timestamp to format
+    :type timestamp: datetime
+    :return: the formatted timestamp, empty string if None
+    :rtype: str
+    """
+
+    if timestamp is None:
+        return ""
+    return localize(template_localtime(timestamp))
+
+
+def tablestatus_rows():
+    """
+    Generates the rows for the table status, including the progress of running imports.
+
+    :return: the list of dictionaries (table, timestamp, message, progress)
+    :rtype: list
+    """
+
     tables = []
+    now = datetime.now()
     for t in TableStatus.objects.all().order_by('table'):
         row = dict()
         row['table'] = t.table
-        row['timestamp'] = t.timestamp
+        row['timestamp'] = format_timestamp(t.timestamp)
         row['message'] = t.message
+        info = progress_info(t, now=now)
+        progress = ""
+        if info is not None:
+            parts = []
+            if info['rows_per_sec'] is not None:
+                parts.append("%.0f rows/s" % info['rows_per_sec'])
+            if info['percent'] is not None:
+                parts.append("%.1f%% of %s" % (info['percent'], filesizeformat(info['bytes_total'])))
+            if info['eta'] is not None:
+                parts.append("ETA " + format_duration(info['eta']))
+            progress = ", ".join(parts)
+        row['progress'] = progress
+        row['info'] = info
         tables.append(row)
+    return tables
+
+
+def importrun_rows():
+    """
+    Generates the rows for the import history, most recent runs first.
+
+    :return: the list of dictionaries (started, table, year, status, duration, rows, rejected, rows_per_sec, peak_memory, phases)
+    :rtype: list
+    """
+
+    runs = []
+    for r in ImportRun.objects.all().order_by('-started')[:reporting.settings.IMPORT_HISTORY_LENGTH]:
+        row = dict()
+        row['started'] = format_timestamp(r.started)
+        row['table'] = r.table
+        row['year'] = "" if r.year is None else r.year
+        row['status'] = r.status
+        row['duration'] = format_duration(r.duration)
+        row['rows'] = r.rows
+        row['rejected'] = r.rejected
+        row['rows_per_sec'] = "" if r.rows_per_sec is None else "%.0f" % r.rows_per_sec
+        row['peak_memory'] = "" if r.peak_memory is None else filesizeformat(r.peak_memory)
+        row['phases'] = format_phases(r.get_phases())
+        runs.append(row)
+    return runs
+
+
+@login_required
+@permission_required("dbbackend.can_access_table_status")
+def database_tablestatus(request):
+    template = loader.get_template('dbbackend/table_status.html')
     context = applist.template_context()
     context['title'] = 'Table status'
-    context['tables'] = tables
+    context['tables'] = tablestatus_rows()
+    context['runs'] = importrun_rows()
+    context['refresh_interval'] = reporting.settings.TABLE_STATUS_REFRESH_INTERVAL
+    return HttpResponse(template.render(context, request))
+
+
+@login_required
+@permission_required("dbbackend.can_access_table_status")
+def database_tablestatus_json(request):
+    tables = []
+    for row in tablestatus_rows():
+        tables.append({
+            'table': row['table'],
+            'timestamp': row['timestamp'],
+            'message': row['message'],
+            'progress': row['progress'],
+            'info': row['info'],
+        })
+    return JsonResponse({'tables': tables, 'runs': importrun_rows()})
+
+
+@login_required
+@permission_required("dbbackend.can_access_table_status")
+def database_jobs(request):
+    template = loader.get_template('dbbackend/jobs.html')
+    rows = []
+    for j in Job.objects.all().order_by('-id')[:reporting.settings.JOB_HISTORY_LENGTH]:
+        row = dict()
+        row['id'] = j.id
+        row['job_type'] = j.job_type
+        row['user'] = j.user
+        row['status'] = j.status
+        row['attempts'] = "%d/%d" % (j.attempts, j.max_attempts)
+        row['created'] = j.created
+        row['started'] = j.started
+        row['finished'] = j.finished
+        row['message'] = j.message
+        row['cancellable'] = (j.status in jobs.ACTIVE_STATUSES) and not j.cancel_requested
+        rows.append(row)
+    context = applist.template_context()
+    context['title'] = 'Jobs'
+    context['jobs'] = rows
+    context['can_cancel'] = request.user.has_perm("dbbackend.can_manage_table_status")
     context['refresh_interval'] = reporting.settings.TABLE_STATUS_REFRESH_INTERVAL
     return HttpResponse(template.render(context, request))
 
 
+@login_required
+@permission_required("dbbackend.can_manage_table_status")
+@require_POST
+def cancel_job(request):
+    job_id = int(get_variable(request, 'id', def_value='-1'))
+    template = loader.get_template('message.html')
+    context = applist.template_context()
+    if jobs.cancel(job_id):
+        context['message'] = "Cancelled job %d." % job_id
+    else:
+        context['message'] = "Job %d is neither queued nor running." % job_id
+    context['back_link'] = "/dbbackend/jobs"
+    context['back_text'] = "Jobs"
+    return HttpResponse(template.render(context, request))
+
+
+def upload_failed(request, msg):
+    """
+    Generates the response for an upload that could not be staged.
+
+    :param request: the request
+    :type request: HttpRequest
+    :param msg: the error message
+    :type msg: str
+    :return: the response
+    :rtype: HttpResponse
+    """
+
+    template = loader.get_template('message.html')
+    context = applist.template_context()
+    context['message'] = msg
+    context['back_link'] = "/dbbackend/jobs"
+    context['back_text'] = "Jobs"
+    return HttpResponse(template.render(context, request))
+
+
 @login_required
 @permission_required("supervisors.can_manage_supervisors")
 def import_supervisors(request):
     # configure template
-    csv = create_temp_copy(request.FILES['datafile'].temporary_file_path())
+    try:
+        csv = stage_upload(request.FILES['datafile'], prefix='supervisors')
+    except UploadQuotaExceeded as ex:
+        return upload_failed(request, str(ex))
     enc = get_variable(request, 'encoding')
+    merge = (get_variable(request, 'merge', def_value='off') == 'on')
     email = get_variable(request, 'email_notification')
     write_last_parameter(request.user, 'dbbackend.database_supervisors.email', email)
     if len(email) == 0:
         email = None
-    t = threading.Thread(target=dbimport.queue_import_supervisors, args=(csv, enc), kwargs={'email': email})
-    t.setDaemon(True)
-    t.start()
+    jobs.enqueue('import_supervisors', {'csv': csv, 'encoding': enc, 'email': email, 'merge': merge, 'delete': False},
+                 user=request.user.username, files=[csv])
     template = loader.get_template('message.html')
     context = applist.template_context()
-    context['message'] = "Started import of supervisors... Check 'Table status' page for progress."
+    context['message'] = "Queued import of supervisors... Check 'Table status' page for progress."
     context['back_link'] = "/dbbackend/tablestatus"
     context['back_text'] = "Table status"
     return HttpResponse(template.render(context, request))
@@ -153,18 +301,21 @@ def import_supervisors(request):
 @permission_required("supervisors.can_manage_scholarship")
 def import_scholarships(request):
     # configure template
-    csv = create_temp_copy(request.FILES['datafile'].temporary_file_path())
+    try:
+        csv = stage_upload(request.FILES['datafile'], prefix='scholarships')
+    except UploadQuotaExceeded as ex:
+        return upload_failed(request, str(ex))
     enc = get_variable(request, 'encoding')
+    merge = (get_variable(request, 'merge', def_value='off') == 'on')
     email = get_variable(request, 'email_notification')
     write_last_parameter(request.user, 'dbbackend.database_scholarships.email', email)
     if len(email) == 0:
         email = None
-    t = threading.Thread(target=dbimport.queue_import_scholarships, args=(csv, enc), kwargs={'email': email})
-    t.setDaemon(True)
-    t.start()
+    jobs.enqueue('import_scholarships', {'csv': csv, 'encoding': enc, 'email': email, 'merge': merge, 'delete': False},
+                 user=request.user.username, files=[csv])
     template = loader.get_template('message.html')
     context = applist.template_context()
-    context['message'] = "Started import of scholarships... Check 'Table status' page for progress."
+    context['message'] = "Queued import of scholarships... Check 'Table status' page for progress."
     context['back_link'] = "/dbbackend/tablestatus"
     context['back_text'] = "Table status"
     return HttpResponse(template.render(context, request))
@@ -174,18 +325,21 @@ def import_scholarships(request):
 @permission_required("supervisors.can_manage_associatedrole")
 def import_associatedrole(request):
     # configure template
-    csv = create_temp_copy(request.FILES['datafile'].temporary_file_path())
+    try:
+        csv = stage_upload(request.FILES['datafile'], prefix='associatedrole')
+    except UploadQuotaExceeded as ex:
+        return upload_failed(request, str(ex))
     enc = get_variable(request, 'encoding')
+    merge = (get_variable(request, 'merge', def_value='off') == 'on')
     email = get_variable(request, 'email_notification')
     write_last_parameter(request.user, 'dbbackend.database_associatedrole.email', email)
     if len(email) == 0:
         email = None
-    t = threading.Thread(target=dbimport.queue_import_associatedrole, args=(csv, enc), kwargs={'email': email})
-    t.setDaemon(True)
-    t.start()
+    jobs.enqueue('import_associatedrole', {'csv': csv, 'encoding': enc, 'email': email, 'merge': merge, 'delete': False},
+                 user=request.user.username, files=[csv])
     template = loader.get_template('message.html')
     context = applist.template_context()
-    context['message'] = "Started import of associate role... Check 'Table status' page for progress."
+    context['message'] = "Queued import of associate role... Check 'Table status' page for progress."
     context['back_link'] = "/dbbackend/tablestatus"
     context['back_text'] = "Table status"
     return HttpResponse(template.render(context, request))
@@ -195,20 +349,25 @@ def import_associatedrole(request):
 @permission_required("dbbackend.can_manage_grade_results")
 def import_graderesults(request):
     # configure template
-    csv = create_temp_copy(request.FILES['datafile'].temporary_file_path())
+    try:
+        csv = stage_upload(request.FILES['datafile'], prefix='graderesults')
+    except UploadQuotaExceeded as ex:
+        return upload_failed(request, str(ex))
     year = int(get_variable(request, 'year', def_value='1900'))
-    isgzip = (get_variable(request, 'gzip', def_value='off') == 'on')
+    defer_indexes = (get_variable(request, 'defer_indexes', def_value='off') == 'on')
+    differential = (get_variable(request, 'differential', def_value='off') == 'on')
     enc = get_variable(request, 'encoding')
     email = get_variable(request, 'email_notification')
     write_last_parameter(request.user, 'dbbackend.database_graderesults.email', email)
     if len(email) == 0:
         email = None
-    t = threading.Thread(target=dbimport.queue_import_grade_results, args=(year, csv, isgzip, enc), kwargs={'email': email})
-    t.setDaemon(True)
-    t.start()
+    jobs.enqueue('import_grade_results', {'year': year, 'csv': csv, 'encoding': enc, 'email': email,
+                                          'defer_indexes': defer_indexes, 'differential': differential,
+                                          'delete': False},
+                 user=request.user.username, files=[csv])
     template = loader.get_template('message.html')
     context = applist.template_context()
-    context['message'] = "Started import of grade results... Check 'Table status' page for progress."
+    context['message'] = "Queued import of grade results... Check 'Table status' page for progress."
     context['back_link'] = "/dbbackend/tablestatus"
     context['back_text'] = "Table status"
     return HttpResponse(template.render(context, request))
@@ -218,19 +377,21 @@ def import_graderesults(request):
 @permission_required("dbbackend.can_manage_coursedefs")
 def import_coursedefs(request):
     # configure template
-    csv = create_temp_copy(request.FILES['datafile'].temporary_file_path())
+    try:
+        csv = stage_upload(request.FILES['datafile'], prefix='coursedefs')
+    except UploadQuotaExceeded as ex:
+        return upload_failed(request, str(ex))
     year = int(get_variable(request, 'year', def_value='1900'))
     enc = get_variable(request, 'encoding')
     email = get_variable(request, 'email_notification')
     write_last_parameter(request.user, 'dbbackend.database_coursedefs.email', email)
     if len(email) == 0:
         email = None
-    t = threading.Thread(target=dbimport.queue_import_coursedefs, args=(year, csv, enc), kwargs={'email': email})
-    t.setDaemon(True)
-    t.start()
+    jobs.enqueue('import_coursedefs', {'year': year, 'csv': csv, 'encoding': enc, 'email': email, 'delete': False},
+                 user=request.user.username, files=[csv])
     template = loader.get_template('message.html')
     context = applist.template_context()
-    context['message'] = "Started import of course definitions... Check 'Table status' page for progress."
+    context['message'] = "Queued import of course definitions... Check 'Table status' page for progress."
     context['back_link'] = "/dbbackend/tablestatus"
     context['back_text'] = "Table status"
     return HttpResponse(template.render(context, request))
@@ -240,20 +401,20 @@ def import_coursedefs(request):
 @user_passes_test(lambda u: u.is_superuser)
 def import_bulk(request):
     # configure template
-    csv = request.FILES['datafile'].temporary_file_path()
+    try:
+        csv = stage_upload(request.FILES['datafile'], prefix='bulk')
+    except UploadQuotaExceeded as ex:
+        return upload_failed(request, str(ex))
     email = get_variable(request, 'email_notification')
     write_last_parameter(request.user, 'dbbackend.database_bulk.email', email)
     if len(email) == 0:
         email = None
-    msg = dbimport.import_bulk(csv, email)
+    jobs.enqueue('import_bulk', {'csv': csv, 'email': email}, user=request.user.username, files=[csv])
     template = loader.get_template('message.html')
     context = applist.template_context()
-    if msg is None:
-        context['message'] = "Successful bulk import!"
-    else:
-        context['message'] = "Failed to bulk import: " + msg
-    context['back_link'] = "/"
-    context['back_text'] = "Start"
+    context['message'] = "Queued bulk import... Check 'Table status' and 'Jobs' pages for progress."
+    context['back_link'] = "/dbbackend/jobs"
+    context['back_text'] = "Jobs"
     return HttpResponse(template.render(context, request))
 
 
@@ -265,12 +426,11 @@ def update_studentdates(request):
     write_last_parameter(request.user, 'dbbackend.database_studentdates.email', email)
     if len(email) == 0:
         email = None
-    t = threading.Thread(target=dbimport.queue_populate_student_dates, args=(), kwargs={'email': email})
-    t.setDaemon(True)
-    t.start()
+    incremental = (get_variable(request, 'full', def_value='off') != 'on')
+    jobs.enqueue('populate_student_dates', {'email': email, 'incremental': incremental}, user=request.user.username)
     template = loader.get_template('message.html')
     context = applist.template_context()
-    context['message'] = "Started student dates recalculation... Check 'Table status' page for progress."
+    context['message'] = "Queued student dates recalculation... Check 'Table status' page for progress."
     context['back_link'] = "/dbbackend/tablestatus"
     context['back_text'] = "Table status"
     return HttpResponse(template.render(context, request))
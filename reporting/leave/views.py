@@ -1,12 +1,11 @@
 from django.template import loader
 from django.http import HttpResponse
-from django.db import connection
 from django.contrib.auth.decorators import login_required, permission_required
 
 import reporting.applist as applist
 from reporting.error import create_error_response
 from reporting.form_utils import get_variable_with_error
-from dbbackend.models import GradeResults
+from dbbackend.dimensions import dimension_values
 from csv import DictReader
 import traceback
 import sys
@@ -34,15 +33,7 @@ def actual_balance_key(a):
 @permission_required("leave.can_access_leave")
 def index(request):
     # get all schools
-    cursor = connection.cursor()
-    cursor.execute("""
-        SELECT DISTINCT(owning_school_clevel)
-        FROM %s
-        ORDER BY owning_school_clevel ASC
-        """ % GradeResults._meta.db_table)
-    schools = list()
-    for row in cursor.fetchall():
-        schools.append(row[0])
+    schools = dimension_values('graderesults.school')
     # configure template
     template = loader.get_template('leave/index.html')
     context = applist.template_context('leave')
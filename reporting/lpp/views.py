@@ -5,6 +5,7 @@ import reporting.form_utils as form_utils
 from reporting.form_utils import get_variable_with_error, get_variable
 from reporting.error import create_error_response
 from dbbackend.models import GradeResults
+from dbbackend.dimensions import dimension_values
 from django.db import connection
 from django.http import HttpResponse
 from django.contrib.auth.decorators import login_required, permission_required
@@ -55,26 +56,10 @@ DEFAULT_TYPE = "master"
 @permission_required("lpp.can_access_lpp")
 def index(request):
     # get all years
-    cursor = connection.cursor()
-    cursor.execute("""
-        SELECT DISTINCT(year)
-        FROM %s
-        ORDER BY year DESC
-        """ % GradeResults._meta.db_table)
-    years = []
-    for row in cursor.fetchall():
-        years.append(str(row[0]))
+    years = dimension_values('graderesults.year', latest_first=True)
 
     # get all schools
-    cursor = connection.cursor()
-    cursor.execute("""
-        SELECT DISTINCT(owning_school_clevel)
-        FROM %s
-        ORDER BY owning_school_clevel ASC
-        """ % GradeResults._meta.db_table)
-    schools = []
-    for row in cursor.fetchall():
-        schools.append(row[0])
+    schools = dimension_values('graderesults.school')
 
     # get query date
     query_date = None
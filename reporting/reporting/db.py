@@ -140,3 +140,133 @@ def escape_quotes(s):
     """
 
     return s.replace("'", "''")
+
+
+REQUIRED = object()
+""" the default value for columns that must be present in the header """
+
+
+def normalize_header(names):
+    """
+    Normalizes the column names of a CSV header: lower case and blanks replaced with underscores.
+
+    :param names: the column names to normalize
+    :type names: list of str
+    :return: the normalized names
+    :rtype: list of str
+    """
+    return [name.lower().replace(" ", "_") for name in names]
+
+
+def int_value(value):
+    """
+    Turns the (non-empty) string into an int.
+
+    :param value: the string to convert
+    :type value: str
+    :return: the int, None if empty string
+    :rtype: int
+    """
+    if value == '':
+        return None
+    return int(float(value.replace(",", "")))
+
+
+def float_value(value):
+    """
+    Turns the (non-empty) string into a float.
+
+    :param value: the string to convert
+    :type value: str
+    :return: the float, None if empty string
+    :rtype: float
+    """
+    if value == '':
+        return None
+    return float(value.replace(",", ""))
+
+
+def bool_value(value):
+    """
+    Turns the (non-empty) string into a boolean.
+
+    :param value: the string to convert
+    :type value: str
+    :return: the boolean, None if empty string
+    :rtype: bool
+    """
+    if value == '':
+        return None
+    if value == '0':
+        return False
+    elif value == '1':
+        return True
+    else:
+        return bool(value)
+
+
+class RowMapper(object):
+    """
+    Maps the rows (tuples) of a csv.reader to dictionaries. The column definitions
+    get compiled against the header once (alias resolved to column index), so
+    that mapping a row only consists of truncating and converting the cells.
+
+    A column definition is a tuple of (name, aliases, converter, defvalue):
+    - name: the key in the generated dictionary
+    - aliases: the list of column names to look for in the header (in order)
+    - converter: the function to apply to the (truncated) cell, None for strings
+    - defvalue: the value to use if none of the aliases is present (REQUIRED if the column must be present)
+    """
+
+    def __init__(self, header, columns, max_len=250):
+        """
+        Compiles the column definitions against the header.
+
+        :param header: the header row of the CSV file (gets normalized)
+        :type header: list of str
+        :param columns: the list of column definitions
+        :type columns: list of tuple
+        :param max_len: the maximum length of the cells, truncated if longer
+        :type max_len: int
+        """
+        self.header = normalize_header(header)
+        self.width = len(self.header)
+        self.present = []
+        self.missing = []
+        index = dict()
+        for i, name in enumerate(self.header):
+            if name not in index:
+                index[name] = i
+        for name, aliases, converter, defvalue in columns:
+            col = None
+            for alias in aliases:
+                if alias in index:
+                    col = index[alias]
+                    break
+            if col is not None:
+                self.present.append((name, col, converter, max_len))
+            elif defvalue is REQUIRED:
+                raise Exception("Column not found: " + "/".join(aliases))
+            else:
+                self.missing.append((name, defvalue))
+
+    def map(self, row):
+        """
+        Maps the row onto a dictionary.
+
+        :param row: the row from the csv.reader
+        :type row: list of str
+        :return: the dictionary with the (converted) values
+        :rtype: dict
+        """
+        if len(row) < self.width:
+            row = row + [''] * (self.width - len(row))
+        result = dict(self.missing)
+        for name, col, converter, max_len in self.present:
+            value = row[col]
+            if len(value) > max_len:
+                value = value[:max_len]
+            if converter is not None:
+                value = converter(value)
+            result[name] = value
+        return result
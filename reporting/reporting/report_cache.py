@@ -0,0 +1,241 @@
+from collections import OrderedDict
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from dbbackend.models import TableStatus
+from datetime import date
+import reporting.settings
+import hashlib
+import pickle
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_ALIAS = "reports"
+""" the name of the cache in the CACHES setting """
+
+STATE_KEY = "report-cache-state"
+""" the key of the LRU index and the statistics in the cache """
+
+
+def is_enabled():
+    """
+    Checks whether the report cache is configured (REPORT_CACHE).
+
+    :return: True if enabled
+    :rtype: bool
+    """
+
+    return reporting.settings.REPORT_CACHE is not None
+
+
+def get_cache():
+    """
+    Returns the Django cache that stores the report results.
+
+    :return: the cache
+    :rtype: BaseCache
+    """
+
+    return caches[CACHE_ALIAS]
+
+
+def is_local():
+    """
+    Checks whether the cache is local to each process (LocMemCache), i.e., not
+    shared across the WSGI worker processes and the command-line.
+
+    :return: True if local
+    :rtype: bool
+    """
+
+    return isinstance(get_cache(), LocMemCache)
+
+
+def data_versions(tables):
+    """
+    Determines the data versions of the tables, which the imports increment
+    whenever they update the status of a table.
+
+    :param tables: the tables to get the versions for
+    :type tables: list
+    :return: the table/version dictionary (0 if no status available)
+    :rtype: dict
+    """
+
+    result = dict([(table, 0) for table in tables])
+    for table, version in TableStatus.objects.all().filter(table__in=list(tables)).values_list('table', 'version'):
+        result[table] = max(result[table], version)
+    return result
+
+
+def normalize(value):
+    """
+    Normalizes the request parameter, i.e., lists get sorted and duplicates removed,
+    since the order of the selected options does not matter.
+
+    :param value: the value to normalize
+    :return: the normalized value
+    """
+
+    if isinstance(value, (list, tuple, set)):
+        return sorted(set([str(v) for v in value]))
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+
+def cache_key(name, params, versions):
+    """
+    Generates the key for the report. As reports depend on the current date
+    (eg the status of students), the date is part of the key as well.
+
+    :param name: the name of the report
+    :type name: str
+    :param params: the parameters of the report
+    :type params: dict
+    :param versions: the data versions of the tables the report uses (see data_versions)
+    :type versions: dict
+    :return: the key
+    :rtype: str
+    """
+
+    data = {
+        'name': name,
+        'params': dict([(k, normalize(v)) for k, v in params.items()]),
+        'versions': versions,
+        'date': date.today().strftime("%Y-%m-%d"),
+    }
+    return "report-" + hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_state(cache):
+    """
+    Loads the LRU index (key/size, least recently used first) and the statistics from the cache.
+
+    :param cache: the cache to use
+    :type cache: BaseCache
+    :return: the state
+    :rtype: dict
+    """
+
+    state = cache.get(STATE_KEY)
+    if state is None:
+        state = {'entries': OrderedDict(), 'hits': 0, 'misses': 0, 'evictions': 0}
+    return state
+
+
+def save_state(cache, state):
+    """
+    Stores the LRU index and the statistics in the cache.
+
+    :param cache: the cache to use
+    :type cache: BaseCache
+    :param state: the state to store
+    :type state: dict
+    """
+
+    cache.set(STATE_KEY, state, None)
+
+
+def evict(cache, state):
+    """
+    Removes the least recently used entries until the limits (REPORT_CACHE_MAX_ENTRIES,
+    REPORT_CACHE_MAX_SIZE) are met.
+
+    :param cache: the cache to use
+    :type cache: BaseCache
+    :param state: the state to update
+    :type state: dict
+    """
+
+    entries = state['entries']
+    max_entries = reporting.settings.REPORT_CACHE_MAX_ENTRIES
+    max_size = reporting.settings.REPORT_CACHE_MAX_SIZE
+    while len(entries) > 0:
+        if (len(entries) <= max_entries) and ((max_size is None) or (sum(entries.values()) <= max_size)):
+            break
+        key, size = entries.popitem(last=False)
+        cache.delete(key)
+        state['evictions'] += 1
+        logger.debug("Evicted report %s (%d bytes)" % (key, size))
+
+
+def get_report(name, params, tables, compute):
+    """
+    Returns the cached result of the report, computing (and caching) it if not
+    available for the current data versions of the tables. The index and the
+    statistics are shared via the cache as well, concurrent updates from
+    different processes can get lost, which only affects the statistics and
+    the eviction order.
+
+    :param name: the name of the report
+    :type name: str
+    :param params: the parameters of the report
+    :type params: dict
+    :param tables: the tables that the report uses
+    :type tables: list
+    :param compute: the function (no arguments) that generates the result
+    :type compute: function
+    :return: the result
+    """
+
+    if not is_enabled():
+        return compute()
+
+    cache = get_cache()
+    key = cache_key(name, params, data_versions(tables))
+    result = cache.get(key)
+    state = load_state(cache)
+    if result is not None:
+        state['hits'] += 1
+        if key in state['entries']:
+            state['entries'].move_to_end(key)
+        save_state(cache, state)
+        logger.debug("Report cache hit: %s" % name)
+        return result
+
+    state['misses'] += 1
+    state['entries'].pop(key, None)
+    result = compute()
+    size = len(pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+    max_size = reporting.settings.REPORT_CACHE_MAX_SIZE
+    if (max_size is None) or (size <= max_size):
+        cache.set(key, result)
+        state['entries'][key] = size
+        evict(cache, state)
+    else:
+        logger.info("Report too large for cache: %s (%d bytes)" % (name, size))
+    save_state(cache, state)
+    return result
+
+
+def statistics():
+    """
+    Returns the statistics of the report cache.
+
+    :return: the statistics (entries, size, hits, misses, hit_rate, evictions)
+    :rtype: dict
+    """
+
+    state = load_state(get_cache())
+    total = state['hits'] + state['misses']
+    return {
+        'entries': len(state['entries']),
+        'size': sum(state['entries'].values()),
+        'hits': state['hits'],
+        'misses': state['misses'],
+        'hit_rate': state['hits'] / total if total > 0 else None,
+        'evictions': state['evictions'],
+    }
+
+
+def clear():
+    """
+    Removes all reports and the statistics from the cache.
+    """
+
+    cache = get_cache()
+    state = load_state(cache)
+    cache.delete_many(list(state['entries'].keys()) + [STATE_KEY])
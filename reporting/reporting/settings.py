@@ -191,9 +191,101 @@ ADMIN_EMAIL = 'admin@example.com'
 # only show production-ready apps?
 PRODUCTION = True
 
+# the directory for staging uploaded import files, uses <TMP_DIR>/reporting-uploads if None
+UPLOAD_STAGING_DIR = None
+
+# the maximum number of bytes of the upload staging area (None for unlimited)
+UPLOAD_STAGING_QUOTA = 20 * 1024 * 1024 * 1024
+
+# the number of seconds after which unused files get removed from the upload staging area
+UPLOAD_STAGING_MAX_AGE = 7 * 24 * 60 * 60
+
 # the default temp directory
 TMP_DIR = tempfile.gettempdir()
 
+# the number of rows to collect before writing them to the database during imports
+IMPORT_BATCH_SIZE = 5000
+
+# whether to use COPY FROM STDIN for writing batches when using PostgreSQL
+IMPORT_USE_COPY = True
+
+# the maximum number of parsed date values to cache per import
+IMPORT_DATE_CACHE_SIZE = 10000
+
+# the maximum number of processes to use for bulk imports (always 1 with SQLite)
+IMPORT_BULK_WORKERS = 4
+
+# whether imports load into shadow tables that get swapped in, rather than emptying the live tables first
+IMPORT_SHADOW_TABLES = True
+
+# the number of processes for parsing large grade results files (1 to parse sequentially)
+IMPORT_PARSE_WORKERS = 4
+
+# the minimum size in bytes of grade results files to parse in parallel
+IMPORT_PARSE_MIN_SIZE = 32 * 1024 * 1024
+
+# the approximate size in bytes of the chunks that get parsed in parallel
+IMPORT_PARSE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# the minimum number of seconds between progress updates of running imports
+IMPORT_PROGRESS_INTERVAL = 2
+
+# whether imports sample their peak memory using tracemalloc (slows down imports, for diagnosing memory usage)
+IMPORT_TRACE_MEMORY = False
+
+# the number of import runs to keep per table in the import history
+IMPORT_HISTORY_LENGTH = 50
+
+# the number of bytes the decompression thread of compressed imports decompresses at a time
+IMPORT_DECOMPRESS_BLOCK_SIZE = 1024 * 1024
+
+# the maximum number of decompressed blocks buffered ahead of the parsing
+IMPORT_DECOMPRESS_BLOCKS = 8
+
+# the maximum number of jobs that the run_jobs worker executes at the same time
+JOB_WORKERS = 2
+
+# the maximum number of jobs of the same type that can run at the same time
+JOB_DEFAULT_CONCURRENCY = 1
+
+# job type-specific concurrency limits (eg {'import_grade_results': 2})
+JOB_CONCURRENCY = {}
+
+# how often to try an interrupted job (worker stopped, process died) before marking it as failed
+JOB_MAX_ATTEMPTS = 3
+
+# the number of seconds to wait before retrying an interrupted job (doubles with each attempt)
+JOB_RETRY_DELAY = 60
+
+# the number of seconds between checking the job queue
+JOB_POLL_INTERVAL = 5
+
+# the number of seconds to give a cancelled job to clean up before killing it
+JOB_CANCEL_TIMEOUT = 30
+
+# the number of jobs to list on the jobs page
+JOB_HISTORY_LENGTH = 100
+
+# the Django cache for the results of the supervisor reports (None to disable), shared
+# across processes (a LOCATION of None uses <TMP_DIR>/reporting-reports)
+REPORT_CACHE = {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': None,
+    'TIMEOUT': 24 * 60 * 60,
+}
+
+# the maximum number of report results to cache (least recently used get evicted first)
+REPORT_CACHE_MAX_ENTRIES = 100
+
+# the maximum total number of bytes of the cached report results (None for unlimited)
+REPORT_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+# the maximum number of names returned by the supervisor/student name search
+NAME_SEARCH_LIMIT = 50
+
+# the minimum trigram similarity (0-1) of names that don't contain the search string
+NAME_SEARCH_THRESHOLD = 0.3
+
 # custom settings?
 try:
     import reporting.settings_custom
@@ -203,6 +295,35 @@ try:
     DEBUG = reporting.settings_custom.DEBUG
     PRODUCTION = reporting.settings_custom.PRODUCTION
     TMP_DIR = reporting.settings_custom.TMP_DIR
+    UPLOAD_STAGING_DIR = getattr(reporting.settings_custom, 'UPLOAD_STAGING_DIR', UPLOAD_STAGING_DIR)
+    UPLOAD_STAGING_QUOTA = getattr(reporting.settings_custom, 'UPLOAD_STAGING_QUOTA', UPLOAD_STAGING_QUOTA)
+    UPLOAD_STAGING_MAX_AGE = getattr(reporting.settings_custom, 'UPLOAD_STAGING_MAX_AGE', UPLOAD_STAGING_MAX_AGE)
+    IMPORT_BATCH_SIZE = getattr(reporting.settings_custom, 'IMPORT_BATCH_SIZE', IMPORT_BATCH_SIZE)
+    IMPORT_USE_COPY = getattr(reporting.settings_custom, 'IMPORT_USE_COPY', IMPORT_USE_COPY)
+    IMPORT_DATE_CACHE_SIZE = getattr(reporting.settings_custom, 'IMPORT_DATE_CACHE_SIZE', IMPORT_DATE_CACHE_SIZE)
+    IMPORT_BULK_WORKERS = getattr(reporting.settings_custom, 'IMPORT_BULK_WORKERS', IMPORT_BULK_WORKERS)
+    IMPORT_SHADOW_TABLES = getattr(reporting.settings_custom, 'IMPORT_SHADOW_TABLES', IMPORT_SHADOW_TABLES)
+    IMPORT_PARSE_WORKERS = getattr(reporting.settings_custom, 'IMPORT_PARSE_WORKERS', IMPORT_PARSE_WORKERS)
+    IMPORT_PARSE_MIN_SIZE = getattr(reporting.settings_custom, 'IMPORT_PARSE_MIN_SIZE', IMPORT_PARSE_MIN_SIZE)
+    IMPORT_PARSE_CHUNK_SIZE = getattr(reporting.settings_custom, 'IMPORT_PARSE_CHUNK_SIZE', IMPORT_PARSE_CHUNK_SIZE)
+    IMPORT_PROGRESS_INTERVAL = getattr(reporting.settings_custom, 'IMPORT_PROGRESS_INTERVAL', IMPORT_PROGRESS_INTERVAL)
+    IMPORT_TRACE_MEMORY = getattr(reporting.settings_custom, 'IMPORT_TRACE_MEMORY', IMPORT_TRACE_MEMORY)
+    IMPORT_HISTORY_LENGTH = getattr(reporting.settings_custom, 'IMPORT_HISTORY_LENGTH', IMPORT_HISTORY_LENGTH)
+    IMPORT_DECOMPRESS_BLOCK_SIZE = getattr(reporting.settings_custom, 'IMPORT_DECOMPRESS_BLOCK_SIZE', IMPORT_DECOMPRESS_BLOCK_SIZE)
+    IMPORT_DECOMPRESS_BLOCKS = getattr(reporting.settings_custom, 'IMPORT_DECOMPRESS_BLOCKS', IMPORT_DECOMPRESS_BLOCKS)
+    JOB_WORKERS = getattr(reporting.settings_custom, 'JOB_WORKERS', JOB_WORKERS)
+    JOB_DEFAULT_CONCURRENCY = getattr(reporting.settings_custom, 'JOB_DEFAULT_CONCURRENCY', JOB_DEFAULT_CONCURRENCY)
+    JOB_CONCURRENCY = getattr(reporting.settings_custom, 'JOB_CONCURRENCY', JOB_CONCURRENCY)
+    JOB_MAX_ATTEMPTS = getattr(reporting.settings_custom, 'JOB_MAX_ATTEMPTS', JOB_MAX_ATTEMPTS)
+    JOB_RETRY_DELAY = getattr(reporting.settings_custom, 'JOB_RETRY_DELAY', JOB_RETRY_DELAY)
+    JOB_POLL_INTERVAL = getattr(reporting.settings_custom, 'JOB_POLL_INTERVAL', JOB_POLL_INTERVAL)
+    JOB_CANCEL_TIMEOUT = getattr(reporting.settings_custom, 'JOB_CANCEL_TIMEOUT', JOB_CANCEL_TIMEOUT)
+    JOB_HISTORY_LENGTH = getattr(reporting.settings_custom, 'JOB_HISTORY_LENGTH', JOB_HISTORY_LENGTH)
+    REPORT_CACHE = getattr(reporting.settings_custom, 'REPORT_CACHE', REPORT_CACHE)
+    REPORT_CACHE_MAX_ENTRIES = getattr(reporting.settings_custom, 'REPORT_CACHE_MAX_ENTRIES', REPORT_CACHE_MAX_ENTRIES)
+    REPORT_CACHE_MAX_SIZE = getattr(reporting.settings_custom, 'REPORT_CACHE_MAX_SIZE', REPORT_CACHE_MAX_SIZE)
+    NAME_SEARCH_LIMIT = getattr(reporting.settings_custom, 'NAME_SEARCH_LIMIT', NAME_SEARCH_LIMIT)
+    NAME_SEARCH_THRESHOLD = getattr(reporting.settings_custom, 'NAME_SEARCH_THRESHOLD', NAME_SEARCH_THRESHOLD)
     LOGGING = reporting.settings_custom.LOGGING
     TABLE_STATUS_REFRESH_INTERVAL = reporting.settings_custom.TABLE_STATUS_REFRESH_INTERVAL
     SECRET_KEY = reporting.settings_custom.SECRET_KEY
@@ -284,3 +405,13 @@ except ImportError:
         'django.middleware.clickjacking.XFrameOptionsMiddleware',
         'maintenance_mode.middleware.MaintenanceModeMiddleware',
     ]
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+if REPORT_CACHE is not None:
+    CACHES['reports'] = dict(REPORT_CACHE)
+    if CACHES['reports'].get('LOCATION') is None:
+        CACHES['reports']['LOCATION'] = os.path.join(TMP_DIR, 'reporting-reports')
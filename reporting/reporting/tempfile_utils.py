@@ -1,8 +1,12 @@
 import tempfile
 import time
 import shutil
+import uuid
 import os
 import reporting.settings
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 def gettempdir():
@@ -19,21 +23,120 @@ def gettempdir():
         return tempfile.gettempdir()
 
 
-def create_temp_copy(infile):
+class UploadQuotaExceeded(Exception):
+    """
+    Raised when staging an upload would exceed UPLOAD_STAGING_QUOTA.
+    """
+    pass
+
+
+def get_upload_dir():
+    """
+    Returns the directory of the upload staging area, creating it if necessary.
+
+    :return: the directory
+    :rtype: str
+    """
+
+    if reporting.settings.UPLOAD_STAGING_DIR is not None:
+        result = reporting.settings.UPLOAD_STAGING_DIR
+    else:
+        result = os.path.join(gettempdir(), "reporting-uploads")
+    os.makedirs(result, exist_ok=True)
+    return result
+
+
+def upload_usage():
+    """
+    Returns the number of bytes occupied by the files in the upload staging area.
+
+    :return: the number of bytes
+    :rtype: int
     """
-    Creates a copy (temp file) of the incoming file, returns
-    the new filename.
 
-    Taken from here:
-    https://stackoverflow.com/a/6587648/4698227
+    result = 0
+    for entry in os.scandir(get_upload_dir()):
+        if entry.is_file():
+            result += entry.stat().st_size
+    return result
+
+
+def stage_upload(uploaded, prefix="upload"):
+    """
+    Moves the uploaded file into the upload staging area under a unique name.
+    Files spooled to disk by Django (TemporaryFileUploadHandler) get renamed
+    or hard linked rather than copied, which requires FILE_UPLOAD_TEMP_DIR
+    and the staging area to be on the same file system (copied otherwise).
+    The caller owns the staged file and has to remove it, stale files get
+    removed by cleanup_uploads.
 
-    :param infile: the file to create a copy of
-    :type infile: str
-    :return: the file name of the temp file (copy)
+    :param uploaded: the uploaded file (request.FILES)
+    :type uploaded: UploadedFile
+    :param prefix: the prefix for the file name
+    :type prefix: str
+    :return: the file name of the staged file
     :rtype: str
     """
 
-    temp_dir = gettempdir()
-    result = os.path.join(temp_dir, str(time.time()))
-    shutil.copy2(infile, result)
+    quota = reporting.settings.UPLOAD_STAGING_QUOTA
+    if quota is not None:
+        usage = upload_usage()
+        if usage + uploaded.size > quota:
+            raise UploadQuotaExceeded(
+                "Upload of %d bytes exceeds the quota of the upload staging area (%d of %d bytes used)!"
+                % (uploaded.size, usage, quota))
+
+    ext = os.path.splitext(uploaded.name)[1] if uploaded.name is not None else ""
+    result = os.path.join(get_upload_dir(), "%s-%s%s" % (prefix, uuid.uuid4().hex, ext))
+
+    if hasattr(uploaded, 'temporary_file_path'):
+        source = uploaded.temporary_file_path()
+        # Django ignores the spooled file being gone when closing the upload
+        try:
+            os.rename(source, result)
+            return result
+        except OSError:
+            pass
+        try:
+            os.link(source, result)
+            return result
+        except OSError:
+            pass
+        logger.info("Copying upload %s, as it cannot be moved into %s" % (source, get_upload_dir()))
+        shutil.copyfile(source, result)
+    else:
+        with open(result, 'wb') as f:
+            for chunk in uploaded.chunks():
+                f.write(chunk)
+    return result
+
+
+def cleanup_uploads(keep=None, max_age=None):
+    """
+    Removes files from the upload staging area that are older than the maximum age.
+
+    :param keep: the (optional) files to keep regardless of age, eg of queued imports
+    :type keep: list
+    :param max_age: the maximum age in seconds, uses UPLOAD_STAGING_MAX_AGE if None
+    :type max_age: int
+    :return: the number of removed files
+    :rtype: int
+    """
+
+    if max_age is None:
+        max_age = reporting.settings.UPLOAD_STAGING_MAX_AGE
+    keep = set() if keep is None else set([os.path.abspath(f) for f in keep])
+    now = time.time()
+    result = 0
+    for entry in os.scandir(get_upload_dir()):
+        if not entry.is_file() or (os.path.abspath(entry.path) in keep):
+            continue
+        if now - entry.stat().st_mtime > max_age:
+            try:
+                os.remove(entry.path)
+                result += 1
+            except OSError:
+                logger.exception("Failed to remove staged upload: %s" % entry.path)
+    if result > 0:
+        logger.info("Removed %d stale upload(s)" % result)
     return result
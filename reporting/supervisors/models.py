@@ -24,6 +24,13 @@ class StudentDates(models.Model):
         )
 
 
+class StudentDatesPending(models.Model):
+    """
+    Students whose start/end dates need recalculating, as their data got touched by an import.
+    """
+    student_id = models.CharField(max_length=250, db_index=True)
+
+
 class Supervisors(models.Model):
     """
     Supervisor data.
@@ -87,3 +94,18 @@ class AssociatedRole(models.Model):
             ("can_access_associatedrole", "Can access Associated Role"),
             ("can_manage_associatedrole", "Can manage Associated Role"),
         )
+
+
+class NameGram(models.Model):
+    """
+    Trigrams of the supervisor/student names of the active associated roles,
+    for the indexed name search with SQLite (PostgreSQL uses pg_trgm instead).
+    """
+    kind = models.CharField(max_length=20)  # person/student
+    name = models.CharField(max_length=250)
+    gram = models.CharField(max_length=3)
+
+    class Meta:
+        index_together = [
+            ("kind", "gram"),
+        ]
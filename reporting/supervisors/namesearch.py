@@ -0,0 +1,335 @@
+from django.db import connection, transaction
+from supervisors.models import AssociatedRole, NameGram
+from reporting.db import escape_quotes
+import reporting.settings
+import traceback
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+KINDS = ["person", "student"]
+""" the name columns of the associated roles that can be searched """
+
+CANDIDATES_FACTOR = 10
+""" how many more similar candidates than results to rank when using the n-gram table """
+
+trigram_indexes = False
+""" whether the pg_trgm indexes were found """
+
+
+def trigrams(s):
+    """
+    Determines the trigrams of the string like pg_trgm does: lower case words of
+    alphanumeric characters, padded with two blanks at the start and one at the end.
+
+    :param s: the string to process
+    :type s: str
+    :return: the trigrams
+    :rtype: set
+    """
+
+    result = set()
+    for word in re.findall(r"\w+", s.lower()):
+        padded = "  " + word + " "
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+def inner_trigrams(s):
+    """
+    Determines the trigrams of the string without padding, i.e., the ones that
+    every name containing the string has as well.
+
+    :param s: the string to process
+    :type s: str
+    :return: the trigrams
+    :rtype: set
+    """
+
+    return set([gram for gram in trigrams(s) if " " not in gram])
+
+
+def similarity(a, b):
+    """
+    Computes the similarity of the two strings like pg_trgm does, i.e., the
+    number of shared trigrams divided by the number of distinct trigrams.
+
+    :param a: the first string
+    :type a: str
+    :param b: the second string
+    :type b: str
+    :return: the similarity (0-1)
+    :rtype: float
+    """
+
+    ta = trigrams(a)
+    tb = trigrams(b)
+    if (len(ta) == 0) or (len(tb) == 0):
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def rank(names, query, limit):
+    """
+    Ranks the names: substring matches first, then by similarity with the query,
+    dropping names below the similarity threshold (NAME_SEARCH_THRESHOLD).
+
+    :param names: the candidate names
+    :type names: list
+    :param query: the search string
+    :type query: str
+    :param limit: the maximum number of names to return
+    :type limit: int
+    :return: the ranked names
+    :rtype: list
+    """
+
+    query = query.lower()
+    scored = []
+    for name in set(names):
+        if name is None:
+            continue
+        substring = query in name.lower()
+        score = similarity(name, query)
+        if substring or (score >= reporting.settings.NAME_SEARCH_THRESHOLD):
+            scored.append((not substring, -score, name))
+    return [name for _, _, name in sorted(scored)[:limit]]
+
+
+def trigram_index_name(kind):
+    """
+    Returns the name of the trigram index of the name column.
+
+    :param kind: the name column, see KINDS
+    :type kind: str
+    :return: the index name
+    :rtype: str
+    """
+
+    return "%s_%s_trgm" % (AssociatedRole._meta.db_table, kind)
+
+
+def create_trigram_indexes():
+    """
+    Enables pg_trgm and creates the trigram indexes on the lower case names of
+    the associated roles if necessary (PostgreSQL only).
+
+    :return: None if successful, otherwise error message
+    :rtype: str
+    """
+
+    global trigram_indexes
+
+    if connection.vendor != 'postgresql':
+        return None
+
+    table = AssociatedRole._meta.db_table
+    try:
+        with transaction.atomic():
+            cursor = connection.cursor()
+            cursor.execute("create extension if not exists pg_trgm")
+            for kind in KINDS:
+                cursor.execute("create index if not exists %s on %s using gin (lower(%s) gin_trgm_ops)"
+                               % (trigram_index_name(kind), table, kind))
+        trigram_indexes = True
+        return None
+    except Exception as ex:
+        msg = traceback.format_exc()
+        logger.error("Failed to set up pg_trgm, name searches will scan %s:\n%s" % (table, msg))
+        return msg
+
+
+def has_trigram_indexes():
+    """
+    Checks whether the trigram indexes exist (PostgreSQL only). Once found,
+    they are assumed to exist for the rest of the process.
+
+    :return: whether the indexes are available
+    :rtype: bool
+    """
+
+    global trigram_indexes
+
+    if connection.vendor != 'postgresql':
+        return False
+    if trigram_indexes:
+        return True
+
+    cursor = connection.cursor()
+    cursor.execute("""
+        select count(*)
+        from pg_indexes
+        where tablename = %s
+        and indexname in %s
+        """, [AssociatedRole._meta.db_table, tuple([trigram_index_name(kind) for kind in KINDS])])
+    trigram_indexes = (cursor.fetchone()[0] == len(KINDS))
+    return trigram_indexes
+
+
+def rebuild_name_grams():
+    """
+    Rebuilds the trigrams of the names of the active associated roles (SQLite only).
+
+    :return: None if successful, otherwise error message
+    :rtype: str
+    """
+
+    if connection.vendor != 'sqlite':
+        return None
+
+    try:
+        with transaction.atomic():
+            NameGram.objects.all().delete()
+            grams = []
+            for kind in KINDS:
+                names = AssociatedRole.objects.all().filter(active=True).exclude(**{kind + "__isnull": True}) \
+                    .values_list(kind, flat=True).distinct()
+                for name in names:
+                    for gram in trigrams(name):
+                        grams.append(NameGram(kind=kind, name=name, gram=gram))
+            NameGram.objects.bulk_create(grams)
+        logger.info("Rebuilt %d name trigrams" % len(grams))
+        return None
+    except Exception as ex:
+        msg = traceback.format_exc()
+        logger.error(msg=msg)
+        return msg
+
+
+def update_name_index():
+    """
+    Updates the index for the name search after the associated roles changed:
+    the trigram indexes with PostgreSQL, the trigram table with SQLite.
+
+    :return: None if successful, otherwise error message
+    :rtype: str
+    """
+
+    if connection.vendor == 'postgresql':
+        return create_trigram_indexes()
+    return rebuild_name_grams()
+
+
+def scan_names(kind, query=None):
+    """
+    Retrieves the names of the active associated roles that contain the search string (unindexed).
+
+    :param kind: the name column, see KINDS
+    :type kind: str
+    :param query: the search string, all names if None
+    :type query: str
+    :return: the names
+    :rtype: list
+    """
+
+    where = ""
+    if query is not None:
+        where = "and lower(a.%s) like '%%%s%%'" % (kind, escape_quotes(query.lower()))
+    cursor = connection.cursor()
+    cursor.execute("""
+        select distinct(a.%s)
+        from %s a
+        where a.active = True
+        %s
+        """ % (kind, AssociatedRole._meta.db_table, where))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def search_names_trgm(kind, query, limit):
+    """
+    Searches the names via the pg_trgm indexes, see search_names.
+    """
+
+    table = AssociatedRole._meta.db_table
+    q = escape_quotes(query.lower())
+    # the threshold of the indexed % operator, only for this transaction
+    with transaction.atomic():
+        cursor = connection.cursor()
+        cursor.execute("set local pg_trgm.similarity_threshold = %f" % reporting.settings.NAME_SEARCH_THRESHOLD)
+        cursor.execute("""
+            select n.name
+            from (
+                select distinct(a.%s) as name
+                from %s a
+                where (lower(a.%s) like '%%%s%%' or lower(a.%s) %% '%s')
+                and a.active = True
+            ) n
+            order by (lower(n.name) like '%%%s%%') desc, similarity(lower(n.name), '%s') desc, n.name
+            limit %d
+            """ % (kind, table, kind, q, kind, q, q, q, limit))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_names_grams(kind, query, limit):
+    """
+    Searches the names via the trigram table, see search_names.
+    """
+
+    if not NameGram.objects.all().exists():
+        rebuild_name_grams()
+    table = NameGram._meta.db_table
+    names = []
+    cursor = connection.cursor()
+    grams = trigrams(query)
+    if len(grams) > 0:
+        cursor.execute("""
+            select g.name
+            from %s g
+            where g.kind = '%s'
+            and g.gram in ('%s')
+            group by g.name
+            order by count(*) desc
+            limit %d
+            """ % (table, kind, "','".join([escape_quotes(g) for g in grams]), limit * CANDIDATES_FACTOR))
+        names.extend([row[0] for row in cursor.fetchall()])
+    # substring matches come first, even if they share few trigrams with the query (eg "ith" in "Smith"):
+    # names with all the inner trigrams of the query, scanning all names if there are none (eg "jo", "o'n")
+    grams = inner_trigrams(query)
+    if len(grams) > 0:
+        cursor.execute("""
+            select g.name
+            from %s g
+            where g.kind = '%s'
+            and g.gram in ('%s')
+            group by g.name
+            having count(distinct g.gram) = %d
+            """ % (table, kind, "','".join([escape_quotes(g) for g in grams]), len(grams)))
+        names.extend([row[0] for row in cursor.fetchall()])
+    else:
+        names.extend(scan_names(kind, query))
+    return rank(names, query, limit)
+
+
+def search_names(kind, query, limit=None):
+    """
+    Searches the supervisor or student names of the active associated roles
+    that contain the search string or are similar to it. Names containing the
+    search string come first, followed by the most similar ones.
+
+    :param kind: the name column to search, see KINDS
+    :type kind: str
+    :param query: the search string
+    :type query: str
+    :param limit: the maximum number of names, uses NAME_SEARCH_LIMIT if None
+    :type limit: int
+    :return: the names
+    :rtype: list
+    """
+
+    if kind not in KINDS:
+        raise Exception("Unknown name column: %s" % kind)
+    if limit is None:
+        limit = reporting.settings.NAME_SEARCH_LIMIT
+    query = query.strip()
+    if len(query) == 0:
+        return []
+
+    if has_trigram_indexes():
+        return search_names_trgm(kind, query, limit)
+    if connection.vendor == 'sqlite':
+        return search_names_grams(kind, query, limit)
+    # no pg_trgm, rank all names
+    return rank(scan_names(kind), query, limit)
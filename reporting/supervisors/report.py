@@ -0,0 +1,274 @@
+from collections import OrderedDict
+from django.db import connection
+from supervisors.models import StudentDates, Scholarship, AssociatedRole
+from dbbackend.models import GradeResults
+from reporting.db import escape_quotes
+from datetime import date
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+NO_SCHOLARSHIP = "-none-"
+""" the indicator for 'no' scholarship """
+
+PROGRAM_DISPLAY = OrderedDict([
+    ("DP", "PhD"),
+    ("MD", "Master"),
+])
+""" the programs and how they get displayed """
+
+PAPER_PATTERN_PHD = "%9__"
+""" the (like) pattern for the papers of PhD students """
+
+SORT_COLUMNS = {
+    'department': ["r.department"],
+    'paper': ["coalesce(r.paper, '')"],
+    'supervisor': ["r.person"],
+    'program': ["case r.program %s else r.program end"
+                % " ".join(["when '%s' then '%s'" % (k, v) for k, v in PROGRAM_DISPLAY.items()])],
+    'id': ["r.student_id"],
+    'name': ["case when r.paper is null then r.first_name else r.paper_name end"],
+    'start_date': ["r.start_date"],
+    # "N/A" sorts after the dates
+    'end_date': ["r.open_end", "r.end_date"],
+    'months': ["r.months"],
+    'full_time': ["r.full_time"],
+    'chief_supervisor': ["r.chief_supervisor"],
+    'status': ["r.status"],
+    'scholarship': ["r.scholarship"],
+}
+""" the SQL expressions to sort the report by for each column """
+
+DEFAULT_SORT_COLUMN = "supervisor"
+""" the column to sort by if the requested one is unknown """
+
+TABLES = [
+    StudentDates._meta.db_table,
+    AssociatedRole._meta.db_table,
+    GradeResults._meta.db_table,
+    Scholarship._meta.db_table,
+]
+""" the tables that the report uses """
+
+
+def in_list(values):
+    """
+    Generates the SQL list of (quoted) values for an 'in' condition.
+
+    :param values: the values
+    :type values: list
+    :return: the SQL list
+    :rtype: str
+    """
+
+    return "('%s')" % "','".join([escape_quotes(str(v)) for v in values])
+
+
+def compile_report(tables, conditions, programs, start_year, min_months, only_current, supervisor_type, study_type,
+                   scholarship, sort_column, sort_order):
+    """
+    Compiles the filters of a supervisors report into a single SQL statement.
+    The students get selected from the student dates and their associated roles,
+    with the additional tables and conditions of the report (available aliases:
+    sd=StudentDates, a=AssociatedRole). Name/paper, chief supervisor, status and
+    scholarship of each student get determined as part of the statement as well:
+
+    - name: of the most recent 9xx paper for PhD students, otherwise of the oldest grade result
+    - chief supervisor: the last role of the supervisor, N/A if empty, None if no role
+    - status: from the student dates, or "current" if no end date or not yet finished
+    - scholarship: "Yes" if an active scholarship falls within the years of study, None if NO_SCHOLARSHIP
+
+    :param tables: the additional tables with their alias (eg "dbbackend_graderesults gr")
+    :type tables: list
+    :param conditions: the additional SQL conditions for selecting the students
+    :type conditions: list
+    :param programs: the programs to include ["DP", "MD"]
+    :type programs: list
+    :param start_year: the earliest year the students started
+    :type start_year: int
+    :param min_months: the minimum number of months the students have been studying
+    :type min_months: float
+    :param only_current: whether to list only current students (and active supervisors)
+    :type only_current: bool
+    :param supervisor_type: the type of supervisors to list ["chief", "other"]
+    :type supervisor_type: list
+    :param study_type: list of study type ["full", "part"]
+    :type study_type: list
+    :param scholarship: the scholarship name to check whether the students have it
+    :type scholarship: str
+    :param sort_column: the column to sort by (within a school), see SORT_COLUMNS
+    :type sort_column: str
+    :param sort_order: the sort order (asc/desc)
+    :type sort_order: str
+    :return: the SQL statement
+    :rtype: str
+    """
+
+    # students
+    keys_sql = """
+        select distinct sd.school, sd.department, a.person, a.student_id, sd.program
+        from %s
+        where sd.student_id = a.student_id
+        and sd.program = a.program
+        and sd.program in %s
+        and sd.start_date >= '%d-01-01'
+        and sd.months >= %f
+        %s
+        %s
+        """ % (", ".join(["%s sd" % StudentDates._meta.db_table, "%s a" % AssociatedRole._meta.db_table] + tables),
+               in_list(programs), start_year, min_months,
+               " and a.active = True " if only_current else "",
+               "".join([" and " + c for c in conditions]))
+
+    # scholarship within years of study
+    open_end = "(s.end_date = '9999-12-31' or s.end_date <= '1900-01-01')"
+    if scholarship == NO_SCHOLARSHIP:
+        scholarship_sql = "null"
+    else:
+        scholarship_sql = """
+            case when exists (
+                select sc.id
+                from %s sc
+                where sc.student_id = s.student_id
+                and sc.name = '%s'
+                and sc.decision = 'Active'
+                and sc.year >= %s
+                and (%s or sc.year <= %s)
+            ) then 'Yes' else 'No' end
+            """ % (Scholarship._meta.db_table, escape_quotes(scholarship),
+                   connection.ops.date_extract_sql('year', 's.start_date'), open_end,
+                   connection.ops.date_extract_sql('year', 's.end_date'))
+
+    # most recent 9xx paper of PhD students
+    paper_sql = dict()
+    for column in ["paper_master_code", "name"]:
+        paper_sql[column] = """
+            select g.%s
+            from %s g
+            where g.student_id = k.student_id
+            and k.program = 'DP'
+            and g.paper_master_code like '%s'
+            order by g.year desc, g.id
+            limit 1
+            """ % (column, GradeResults._meta.db_table, PAPER_PATTERN_PHD)
+
+    students_sql = """
+        select k.school, k.department, k.person, k.student_id, k.program,
+            s.id as sd_id, s.start_date, s.end_date, s.months,
+            case when %s then 1 else 0 end as open_end,
+            case when s.full_time is null then 'N/A' when s.full_time = True then 'Yes' else 'No' end as full_time,
+            coalesce(s.status, case when %s or s.end_date >= '%s' then 'current' else 'finished' end) as status,
+            (
+                select case when ar.role = '' then 'N/A' when replace(ar.role, 'Chief', '') <> ar.role then 'Yes' else 'No' end
+                from %s ar
+                where ar.student_id = k.student_id
+                and ar.person = k.person
+                order by ar.id desc
+                limit 1
+            ) as chief_supervisor,
+            (%s) as paper,
+            (%s) as paper_name,
+            (
+                select g.name
+                from %s g
+                where g.student_id = k.student_id
+                order by g.year, g.id desc
+                limit 1
+            ) as first_name,
+            %s as scholarship
+        from (%s) k, %s s
+        where s.school = k.school
+        and s.department = k.department
+        and s.student_id = k.student_id
+        and s.program = k.program
+        """ % (open_end, open_end, date.today().strftime("%Y-%m-%d"), AssociatedRole._meta.db_table,
+               paper_sql["paper_master_code"], paper_sql["name"], GradeResults._meta.db_table,
+               scholarship_sql, keys_sql, StudentDates._meta.db_table)
+
+    # filters
+    filters = []
+    if "chief" not in supervisor_type:
+        filters.append("(r.chief_supervisor is null or r.chief_supervisor <> 'Yes')")
+    if "other" not in supervisor_type:
+        filters.append("(r.chief_supervisor is null or r.chief_supervisor <> 'No')")
+    if "full" not in study_type:
+        filters.append("r.full_time <> 'Yes'")
+    if "part" not in study_type:
+        filters.append("r.full_time <> 'No'")
+    if only_current:
+        filters.append("r.status = 'current'")
+
+    # sorting, ties retain the order of the students
+    if sort_column not in SORT_COLUMNS:
+        logger.warning("Unknown sort column '%s', using '%s'" % (sort_column, DEFAULT_SORT_COLUMN))
+        sort_column = DEFAULT_SORT_COLUMN
+    direction = " desc" if sort_order == "desc" else ""
+    order = ["r.school"] + [c + direction for c in SORT_COLUMNS[sort_column]] \
+        + ["r.department", "r.person", "r.student_id", "r.program", "r.sd_id"]
+
+    return """
+        select r.*
+        from (%s) r
+        %s
+        order by %s
+        """ % (students_sql, "where " + " and ".join(filters) if len(filters) > 0 else "", ", ".join(order))
+
+
+def run_report(tables, conditions, programs, start_year, min_months, only_current, supervisor_type, study_type,
+               scholarship, sort_column, sort_order):
+    """
+    Runs the supervisors report, see compile_report for the parameters.
+    Overview of the returned data structure (<name> is a key in a dictionary):
+
+    <faculty>
+        - department
+        - paper
+        - supervisor
+        - program
+        - id
+        - name (string)
+        - start_date (string)
+        - end_date (string)
+        - months (float)
+        - full_time
+        - chief_supervisor
+        - status
+        - scholarship -- None if NO_SCHOLARSHIP
+
+    :return: the students per faculty/school, sorted
+    :rtype: OrderedDict
+    """
+
+    sql = compile_report(tables, conditions, programs, start_year, min_months, only_current, supervisor_type,
+                         study_type, scholarship, sort_column, sort_order)
+    cursor = connection.cursor()
+    cursor.execute(sql)
+    columns = [col[0] for col in cursor.description]
+    result = OrderedDict()
+    for values in cursor.fetchall():
+        row = dict(zip(columns, values))
+        if row['school'] not in result:
+            result[row['school']] = []
+        if row['paper'] is None:
+            name = row['first_name']
+            paper = ''
+        else:
+            name = row['paper_name']
+            paper = row['paper']
+        result[row['school']].append({
+            'department': row['department'],
+            'paper': paper,
+            'supervisor': row['person'],
+            'program': PROGRAM_DISPLAY.get(row['program'], row['program']),
+            'id': row['student_id'],
+            'name': name,
+            'start_date': str(row['start_date']),
+            'end_date': "N/A" if row['open_end'] else str(row['end_date']),
+            'months': row['months'],
+            'full_time': row['full_time'],
+            'chief_supervisor': row['chief_supervisor'],
+            'status': row['status'],
+            'scholarship': row['scholarship'],
+        })
+    return result
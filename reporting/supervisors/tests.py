@@ -1,3 +1,186 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.db import connection
+from unittest.mock import patch
+from datetime import date
+from supervisors.models import StudentDates, Scholarship, AssociatedRole
+from supervisors.namesearch import search_names, trigrams, inner_trigrams, similarity
+import supervisors.namesearch as namesearch
+from supervisors.report import run_report, in_list, NO_SCHOLARSHIP
+from supervisors.views import DEFAULT_SCHOLARSHIP, cached_report
+from dbbackend.models import GradeResults
+from dbbackend.dbimport import update_tablestatus
+import reporting.report_cache as report_cache
 
-# Create your tests here.
+
+def create_students(count):
+    """
+    Creates the student dates, grade results, roles and scholarships of the students.
+
+    :param count: the number of students
+    :type count: int
+    """
+
+    for i in range(count):
+        student_id = str(1000000 + i)
+        program = "DP" if i % 2 == 0 else "MD"
+        StudentDates(student_id=student_id, program=program, school="FCMS", department="COMP",
+                     start_date=date(2015, 3, 1), end_date=date(2019 + i % 3, 12, 31) if i % 4 > 0 else date(9999, 12, 31),
+                     months=36.0, full_time=(i % 3 != 0), status=None).save()
+        GradeResults(year=2015, student_id=student_id, name="Student %d" % i,
+                     paper_master_code="COMP900" if program == "DP" else "COMP593").save()
+        GradeResults(year=2016, student_id=student_id, name="Student %d (new)" % i,
+                     paper_master_code="COMP501").save()
+        AssociatedRole(student_id=student_id, person="Dr Jones", role="Chief Supervisor" if i % 2 == 0 else "Supervisor",
+                       entity="", active=True, program=program).save()
+        if i % 5 == 0:
+            Scholarship(student_id=student_id, name=DEFAULT_SCHOLARSHIP, status="Active", decision="Active",
+                        year=2016 if i % 10 == 0 else 2022).save()
+
+
+class ReportTestCase(TestCase):
+    """
+    Checks that the supervisors report applies all its filters within a single SQL statement.
+    """
+
+    STUDENTS = 40
+
+    def setUp(self):
+        create_students(self.STUDENTS)
+
+    def report(self, programs=("DP", "MD"), supervisor_type=("chief", "other"), study_type=("full", "part"),
+               only_current=False, scholarship=DEFAULT_SCHOLARSHIP, sort_column="id", sort_order="asc"):
+        result = run_report(tables=[], conditions=["sd.school in " + in_list(["FCMS"])], programs=list(programs),
+                            start_year=2010, min_months=-1, only_current=only_current,
+                            supervisor_type=list(supervisor_type), study_type=list(study_type), scholarship=scholarship,
+                            sort_column=sort_column, sort_order=sort_order)
+        return result.get("FCMS", [])
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            students = self.report()
+        self.assertEqual(len(students), self.STUDENTS)
+        with self.assertNumQueries(1):
+            self.report(supervisor_type=["chief"], study_type=["part"], only_current=True, scholarship=NO_SCHOLARSHIP)
+
+    def test_values(self):
+        students = dict([(s['id'], s) for s in self.report()])
+        phd = students["1000000"]
+        self.assertEqual(phd['name'], "Student 0")
+        self.assertEqual(phd['paper'], "COMP900")
+        self.assertEqual(phd['program'], "PhD")
+        self.assertEqual(phd['chief_supervisor'], "Yes")
+        self.assertEqual(phd['full_time'], "No")
+        self.assertEqual(phd['scholarship'], "Yes")
+        self.assertEqual(phd['start_date'], "2015-03-01")
+        self.assertEqual(phd['end_date'], "N/A")
+        self.assertEqual(phd['status'], "current")
+        master = students["1000001"]
+        self.assertEqual(master['name'], "Student 1")
+        self.assertEqual(master['paper'], "")
+        self.assertEqual(master['program'], "Master")
+        self.assertEqual(master['chief_supervisor'], "No")
+        self.assertEqual(master['full_time'], "Yes")
+        self.assertEqual(master['scholarship'], "No")
+        self.assertEqual(master['end_date'], "2020-12-31")
+        self.assertEqual(master['status'], "finished")
+        # scholarship after the end of the studies
+        self.assertEqual(students["1000005"]['scholarship'], "No")
+        self.assertIsNone(self.report(scholarship=NO_SCHOLARSHIP)[0]['scholarship'])
+
+    def test_filters(self):
+        self.assertEqual(set([s['program'] for s in self.report(programs=["MD"])]), {"Master"})
+        self.assertEqual(set([s['chief_supervisor'] for s in self.report(supervisor_type=["chief"])]), {"Yes"})
+        self.assertEqual(set([s['chief_supervisor'] for s in self.report(supervisor_type=["other"])]), {"No"})
+        self.assertEqual(set([s['full_time'] for s in self.report(study_type=["part"])]), {"No"})
+        self.assertEqual(len(self.report(study_type=[])), 0)
+        current = self.report(only_current=True)
+        self.assertEqual(len(current), self.STUDENTS // 4)
+        self.assertEqual(set([s['status'] for s in current]), {"current"})
+
+    def test_sort(self):
+        ids = [s['id'] for s in self.report(sort_column="id", sort_order="desc")]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        end_dates = [s['end_date'] for s in self.report(sort_column="end_date")]
+        self.assertEqual(end_dates, sorted(end_dates))
+        # unknown columns don't end up in the SQL statement
+        self.assertEqual(len(self.report(sort_column="id; drop table x")), self.STUDENTS)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                           'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'}})
+class ReportCacheTestCase(TestCase):
+    """
+    Checks that the reports get cached until an import modifies one of their tables.
+    """
+
+    def setUp(self):
+        create_students(10)
+        report_cache.clear()
+
+    def cached(self, supervisor_type):
+        params = {'programs': ["DP", "MD"], 'supervisor_type': supervisor_type, 'study_type': ["full", "part"],
+                  'only_current': False, 'min_months': -1.0, 'scholarship': NO_SCHOLARSHIP,
+                  'sort_column': "id", 'sort_order': "asc"}
+        return cached_report("faculty", {'schools': ["FCMS"]}, tables=[], conditions=["sd.school in " + in_list(["FCMS"])],
+                             start_year=2010, params=params)
+
+    def test_cache(self):
+        # data versions, report
+        with self.assertNumQueries(2):
+            result = self.cached(["chief", "other"])
+        # data versions only, order of options is irrelevant
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cached(["other", "chief"]), result)
+        update_tablestatus(AssociatedRole._meta.db_table, msg="imported")
+        with self.assertNumQueries(2):
+            self.cached(["chief", "other"])
+        stats = report_cache.statistics()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+
+class NameSearchTestCase(TestCase):
+    """
+    Checks that the name search finds substrings and similar names, substring matches first.
+    """
+
+    def setUp(self):
+        for i, person in enumerate(["Dr Jones", "Prof Johnson", "Dr Smith", "Ms Jonas", "Dr O'Neill"]):
+            AssociatedRole(student_id=str(1000000 + i), person=person, role="Supervisor", entity="", active=True,
+                           program="DP", student="Student %d" % i).save()
+        AssociatedRole(student_id="1000010", person="Dr Jonestown", role="Supervisor", entity="", active=False,
+                       program="DP", student="Former").save()
+
+    def test_trigrams(self):
+        self.assertEqual(trigrams("Jo"), {"  j", " jo", "jo "})
+        self.assertEqual(similarity("Jones", "jones"), 1.0)
+        self.assertEqual(similarity("Jones", "Smith"), 0.0)
+        self.assertEqual(inner_trigrams("Dr Smith"), {"smi", "mit", "ith"})
+        self.assertEqual(inner_trigrams("o'n"), set())
+
+    def test_search(self):
+        self.assertEqual(search_names("person", "jones"), ["Dr Jones"])
+        # misspelled
+        self.assertEqual(search_names("person", "jonnes")[0], "Dr Jones")
+        # substring matches first, short search strings
+        self.assertEqual(search_names("person", "dr")[:3], ["Dr Jones", "Dr Smith", "Dr O'Neill"])
+        self.assertEqual(search_names("person", "o'n"), ["Dr O'Neill"])
+        self.assertEqual(len(search_names("person", "o", limit=2)), 2)
+        self.assertEqual(search_names("person", "  "), [])
+        self.assertEqual(search_names("person", "xyz"), [])
+        self.assertEqual(search_names("student", "student 3")[0], "Student 3")
+        # inactive roles
+        self.assertEqual(search_names("student", "former"), [])
+
+    def test_substring_candidates(self):
+        # names sharing more trigrams with "ith" than "Dr Smith" (" it", "  i", "th "), but not containing it
+        for i, c in enumerate("abcdefghijklmnop"):
+            AssociatedRole(student_id=str(1000100 + i), person="Ms Itu Th A%s" % c, role="Supervisor", entity="",
+                           active=True, program="DP", student="Student %d" % i).save()
+        self.assertEqual(search_names("person", "ith", limit=1), ["Dr Smith"])
+        # the n-gram table finds substrings of three or more characters without scanning all names
+        if connection.vendor == 'sqlite':
+            with patch('supervisors.namesearch.scan_names', wraps=namesearch.scan_names) as scan:
+                self.assertEqual(search_names("person", "mith"), ["Dr Smith"])
+                self.assertEqual(scan.call_count, 0)
+                self.assertEqual(search_names("person", "o'n"), ["Dr O'Neill"])
+                self.assertEqual(scan.call_count, 1)
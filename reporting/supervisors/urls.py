@@ -16,4 +16,7 @@ urlpatterns = [
 
     url(r'^search-by-student$', views.search_by_student, name='search-by-student'),
     url(r'^list-by-student$', views.list_by_student, name='list-by-student'),
+
+    url(r'^autocomplete-supervisor$', views.autocomplete_supervisor, name='autocomplete-supervisor'),
+    url(r'^autocomplete-student$', views.autocomplete_student, name='autocomplete-student'),
 ]
@@ -1,19 +1,22 @@
 from collections import OrderedDict
 from django.template import loader
 from django.template.defaulttags import register
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.db import connection
 from django.contrib.auth.decorators import login_required, permission_required
 from dbbackend.models import read_last_parameter, write_last_parameter
 from supervisors.models import StudentDates, Supervisors, Scholarship, AssociatedRole
+from supervisors.report import run_report, in_list, NO_SCHOLARSHIP, TABLES
+from supervisors.namesearch import search_names
 from dbbackend.models import GradeResults
+from dbbackend.dimensions import dimension_values, dimension_years
 from reporting.error import create_error_response
 from reporting.settings import REPORTING_OPTIONS
 from reporting.db import escape_quotes
 import reporting.applist as applist
+import reporting.report_cache as report_cache
 from reporting.form_utils import get_variable_with_error, get_variable
 import traceback
-import re
 import sys
 from datetime import date
 import reporting.form_utils as form_utils
@@ -35,12 +38,12 @@ PROGRAM_TYPES = ["DP", "MD"]
 SUPERVISOR_TYPES = ["chief", "other"]
 """ all supervisor types """
 
-NO_SCHOLARSHIP = "-none-"
-""" the indicator for 'no' scholarship """
-
 DEFAULT_SCHOLARSHIP = "University of Waikato Doctoral Scholarship"
 """ the default scholarship """
 
+AUTOCOMPLETE_LIMIT = 10
+""" the maximum number of names to suggest while typing """
+
 
 @register.filter
 def get_item(dictionary, key):
@@ -63,16 +66,8 @@ def get_max_years():
     :rtype: int
     """
 
-    cursor = connection.cursor()
-    cursor.execute("""
-        select extract(year from min(start_date))
-        from %s
-        where start_date > '1900-01-01'
-        """ % StudentDates._meta.db_table)
-    min_year = None
+    min_year, _ = dimension_years('studentdates.school')
     max_years = None
-    for row in cursor.fetchall():
-        min_year = row[0]
     if min_year is not None:
         max_years = date.today().year - min_year
 
@@ -87,17 +82,7 @@ def get_schools():
     :rtype: list
     """
 
-    cursor = connection.cursor()
-    cursor.execute("""
-        SELECT DISTINCT(school)
-        FROM %s
-        WHERE char_length(school) > 0
-        ORDER BY school ASC
-        """ % StudentDates._meta.db_table)
-    result = []
-    for row in cursor.fetchall():
-        result.append(row[0])
-    return result
+    return dimension_values('studentdates.school', non_empty=True)
 
 
 def get_departments(schools):
@@ -110,18 +95,7 @@ def get_departments(schools):
     :rtype: list
     """
 
-    sql = """
-        select distinct(owning_department_clevel)
-        from %s
-        where owning_school_clevel in ('%s')
-        order by owning_department_clevel
-        """ % (GradeResults._meta.db_table, "','".join(schools))
-    cursor = connection.cursor()
-    cursor.execute(sql)
-    result = []
-    for row in cursor.fetchall():
-        result.append(row[0])
-    return result
+    return dimension_values('graderesults.department', parents=schools)
 
 
 def get_papers(paper):
@@ -134,18 +108,7 @@ def get_papers(paper):
     :rtype: list
     """
 
-    sql = """
-        select distinct(paper_master_code)
-        from %s
-        where paper_master_code like '%s'
-        order by paper_master_code
-        """ % (GradeResults._meta.db_table, paper)
-    cursor = connection.cursor()
-    cursor.execute(sql)
-    result = []
-    for row in cursor.fetchall():
-        result.append(row[0])
-    return result
+    return dimension_values('graderesults.paper', pattern=paper)
 
 
 def get_scholarships():
@@ -155,17 +118,8 @@ def get_scholarships():
     :return: the list of scholarships
     :rtype: list
     """
-    cursor = connection.cursor()
-    cursor.execute("""
-        SELECT DISTINCT(name)
-        FROM %s
-        WHERE char_length(name) > 0
-        ORDER BY name ASC
-        """ % Scholarship._meta.db_table)
-    result = []
-    for row in cursor.fetchall():
-        result.append(row[0])
-    return result
+
+    return dimension_values('scholarship.name', non_empty=True)
 
 
 @login_required
@@ -235,263 +189,90 @@ def search_by_paper(request):
     return HttpResponse(template.render(context, request))
 
 
-def add_student(data, school, department, supervisor, studentid, program, supervisor_type, study_type, only_current, scholarship):
+def report_parameters(request, prefix):
     """
-    Adds the student to the "data" structure. Overview of the data structure (<name> is
-    a key in a dictionary):
-
-    <faculty>
-        - department
-        - supervisor
-        - program
-        - studentid
-        - name (string)
-        - start_date (date)
-        - end_date (date)
-        - months (float)
-        - full_time
-        - chief_supervisor
-        - status
-        - scholarship -- present only if looking for scholarship other than '-none-'
-
-    :param data: the data structure to extend
-    :type data: dict
-    :param school: the name of the school/faculty
-    :type school: str
-    :param department: the name of the department
-    :type department: str
-    :param supervisor: the name of the supervisor
-    :type supervisor: str
-    :param studentid: the student id
-    :type studentid: str
-    :param program: the program (PhD/Master)
-    :type program: str
-    :param supervisor_type: the type of supervisors to list ["chief", "other"]
-    :type supervisor_type: list
-    :param study_type: list of study type ["full", "part"]
-    :type study_type: list
-    :param only_current: whether to list only current students
-    :type only_current: bool
-    :param scholarship: the scholarship name to check whether the student has it
-    :type scholarship: str
+    Retrieves the parameters of a supervisors report (see report.run_report)
+    from the request and stores them as the user's last parameters.
+
+    :param request: the request to use
+    :type request: HttpRequest
+    :param prefix: the prefix for the last parameters (eg 'supervisors.search_by_faculty')
+    :type prefix: str
+    :return: the parameters
+    :rtype: dict
     """
 
-    if program == "DP":
-        program_display = "PhD"
-    elif program == "MD":
-        program_display = "Master"
-    else:
-        program_display = program
-
-    # load student data
-    paper_pattern_phd = re.compile(".*9..$")
-    today = date.today().strftime("%Y-%m-%d")
-    for s in StudentDates.objects.all().filter(school=school, department=department, student_id=studentid, program=program):
-        sname = None
-        paper = None
-        for g in GradeResults.objects.all().filter(student_id=studentid).order_by('-year'):
-            sname = g.name
-            if (program == "DP") and paper_pattern_phd.match(g.paper_master_code):
-                paper = g.paper_master_code
-            if paper is not None:
-                break
-        if paper is None:
-            paper = ''
-
-        # chief?
-        chief = None
-        for sv in AssociatedRole.objects.all().filter(student_id=studentid, person=supervisor):
-            if sv.role == "":
-                chief = "N/A"
-            else:
-                chief = "Yes" if "Chief" in sv.role else "No"
-        if s.full_time is None:
-            full_time = 'N/A'
-        elif s.full_time:
-            full_time = 'Yes'
-        else:
-            full_time = 'No'
-
-        # dates
-        start_date = s.start_date.strftime("%Y-%m-%d")
-        end_date = s.end_date.strftime("%Y-%m-%d")
-        if end_date == "9999-12-31" or end_date <= "1900-01-01":
-            end_date = "N/A"
-
-        # status
-        status = s.status
-        if status is None:
-            if end_date == "N/A":
-                status = "current"
-            elif s.end_date.strftime("%Y-%m-%d") >= today:
-                status = "current"
-            else:
-                status = "finished"
-
-        # scholarship
-        scholarship_status = None
-        if scholarship != NO_SCHOLARSHIP:
-            scholarship_status = "No"
-            for sch in Scholarship.objects.all().filter(student_id=studentid, name=scholarship, decision="Active"):
-                if str(sch.year) >= start_date[0:4]:
-                    if end_date == "N/A":
-                        scholarship_status = "Yes"
-                        break
-                    if str(sch.year) <= end_date[0:4]:
-                        scholarship_status = "Yes"
-                        break
-
-        # check conditions
-        if chief == "Yes" and "chief" not in supervisor_type:
-            continue
-        if chief == "No" and "other" not in supervisor_type:
-            continue
-        if full_time == "Yes" and "full" not in study_type:
-            continue
-        if full_time == "No" and "part" not in study_type:
-            continue
-        if only_current and not status == "current":
-            continue
-
-        # ensure data structures are present
-        if school not in data:
-            data[school] = []
-
-        sdata = dict()
-        sdata['department'] = department
-        sdata['paper'] = paper
-        sdata['supervisor'] = supervisor
-        sdata['program'] = program_display
-        sdata['id'] = studentid
-        sdata['name'] = sname
-        sdata['start_date'] = start_date
-        sdata['end_date'] = end_date
-        sdata['months'] = s.months
-        sdata['full_time'] = full_time
-        sdata['chief_supervisor'] = chief
-        sdata['status'] = status
-        sdata['scholarship'] = scholarship_status
-        data[school].append(sdata)
+    programs = get_variable(request, 'program', as_list=True, def_value=PROGRAM_TYPES)
+    if REPORTING_OPTIONS['supervisor.only_phd']:
+        programs = ['DP']
+    result = OrderedDict()
+    result['programs'] = programs
+    result['supervisor_type'] = get_variable(request, 'supervisor_type', as_list=True, def_value=SUPERVISOR_TYPES)
+    result['study_type'] = get_variable(request, 'study_type', as_list=True, def_value=STUDY_TYPES)
+    result['only_current'] = get_variable(request, 'only_current', def_value="off") == "on"
+    result['min_months'] = float(get_variable(request, 'min_months', def_value="-1", blank=False))
+    result['scholarship'] = str(get_variable(request, 'scholarship', def_value="NO_SCHOLARSHIP"))
+    result['sort_column'] = get_variable(request, 'sort_column', def_value="supervisor")
+    result['sort_order'] = get_variable(request, 'sort_order', def_value="asc")
+
+    for k in result:
+        write_last_parameter(request.user, prefix + "." + k, result[k])
 
+    return result
 
-@login_required
-@permission_required("supervisors.can_access_supervisors")
-def list_by_faculty(request):
-    # get parameters
-    response, schools = get_variable_with_error(request, 'supervisors', 'school', as_list=True)
-    if response is not None:
-        return response
 
-    response, departments = get_variable_with_error(request, 'supervisors', 'department', as_list=True)
-    if response is not None:
-        return response
+def cached_report(name, criteria, tables, conditions, start_year, params):
+    """
+    Runs the supervisors report (see report.run_report), reusing the result of
+    an identical report if the data hasn't changed since (see report_cache).
+
+    :param name: the name of the report (faculty/paper/supervisor)
+    :type name: str
+    :param criteria: the report-specific request parameters (eg schools and departments)
+    :type criteria: dict
+    :param tables: the additional tables of the report
+    :type tables: list
+    :param conditions: the additional SQL conditions of the report
+    :type conditions: list
+    :param start_year: the earliest year the students started
+    :type start_year: int
+    :param params: the common parameters, see report_parameters
+    :type params: dict
+    :return: the students per faculty/school
+    :rtype: OrderedDict
+    """
 
-    response, years_back_str = get_variable_with_error(request, 'supervisors', 'years_back')
-    if response is not None:
-        return response
-    years_back = int(years_back_str)
-    start_year = date.today().year - years_back
+    key = OrderedDict(criteria)
+    key['start_year'] = start_year
+    key.update(params)
+    return report_cache.get_report(
+        "supervisors." + name, key, TABLES,
+        lambda: run_report(tables=tables, conditions=conditions, start_year=start_year, **params))
 
-    programs = get_variable(request, 'program', as_list=True, def_value=PROGRAM_TYPES)
-    if REPORTING_OPTIONS['supervisor.only_phd']:
-        programs = ['DP']
-    supervisor_type = get_variable(request, 'supervisor_type', as_list=True, def_value=SUPERVISOR_TYPES)
-    study_type = get_variable(request, 'study_type', as_list=True, def_value=STUDY_TYPES)
-    only_current = get_variable(request, 'only_current', def_value="off") == "on"
-    min_months = float(get_variable(request, 'min_months', def_value="-1", blank=False))
-    scholarship = str(get_variable(request, 'scholarship', def_value="NO_SCHOLARSHIP"))
-    sort_column = get_variable(request, 'sort_column', def_value="supervisor")
-    sort_order = get_variable(request, 'sort_order', def_value="asc")
-    formattype = get_variable(request, 'format')
 
-    # save parameters
-    write_last_parameter(request.user, 'supervisors.search_by_faculty.programs', programs)
-    write_last_parameter(request.user, 'supervisors.search_by_faculty.supervisor_type', supervisor_type)
-    write_last_parameter(request.user, 'supervisors.search_by_faculty.study_type', study_type)
-    write_last_parameter(request.user, 'supervisors.search_by_faculty.only_current', only_current)
-    write_last_parameter(request.user, 'supervisors.search_by_faculty.min_months', min_months)
-    write_last_parameter(request.user, 'supervisors.search_by_faculty.scholarship', scholarship)
-    write_last_parameter(request.user, 'supervisors.search_by_faculty.sort_column', sort_column)
-    write_last_parameter(request.user, 'supervisors.search_by_faculty.sort_order', sort_order)
-
-    sql_active = " and a.active = True " if only_current else ""
-    sql = """
-        select sd.school, sd.department, a.person, a.student_id, sd.program
-        from %s sd, %s a
-        where sd.student_id = a.student_id
-        and sd.program = a.program
-        and sd.school in ('%s')
-        and sd.department in ('%s')
-        and sd.start_date >= '%s-01-01'
-        %s
-        and sd.months >= %f
-        group by sd.school, sd.department, a.person, a.student_id, sd.program
-        order by sd.school, sd.department, a.person, a.student_id, sd.program
-        """ % (StudentDates._meta.db_table, AssociatedRole._meta.db_table, "','".join(schools), "','".join(departments), str(start_year), sql_active, min_months)
-    cursor = connection.cursor()
-    cursor.execute(sql)
-    result = {}
-    for row in cursor.fetchall():
-        try:
-            if row[4] not in programs:
-                continue
-            add_student(data=result, school=row[0], department=row[1], supervisor=row[2], studentid=row[3],
-                        program=row[4], supervisor_type=supervisor_type, study_type=study_type,
-                        only_current=only_current, scholarship=scholarship)
-        except Exception as ex:
-            logger.exception(msg="row=" + str(row))
-
-    # sort
-    for school in result:
-        school_data = result[school]
-        school_data_sorted = sorted(school_data, key=lambda row: row[sort_column], reverse=(sort_order == "desc"))
-        result[school] = school_data_sorted
-
-    # generate output
-    if formattype == "xls":
-        content = OrderedDict()
-        for school in result:
-            data = list()
-            data.append([
-                'Faculty/School',
-                'Department',
-                'Paper',
-                'Supervisor',
-                'Program',
-                'ID',
-                'Name',
-                'Start date',
-                'End date',
-                'Months',
-                'Full time',
-                'Chief supervisor',
-                'Status',
-                'Scholarship (' + scholarship + ')',
-            ])
-            for row in result[school]:
-                data.append([
-                    school,
-                    row['department'],
-                    row['paper'],
-                    row['supervisor'],
-                    row['program'],
-                    row['id'],
-                    row['name'],
-                    row['start_date'],
-                    row['end_date'],
-                    row['months'],
-                    row['full_time'],
-                    row['chief_supervisor'],
-                    row['status'],
-                    row['scholarship'],
-                ])
-            content[school] = data
-        book = excel.pe.Book(content)
-        response = excel.make_response(book, formattype, file_name="faculty-{0}.{1}".format(date.today().strftime("%Y-%m-%d"), formattype))
-        return response
-    elif formattype == "csv":
-        data = list()
-        data.append([
+def report_response(request, result, scholarship, name, sheet_name, sheet_per_school):
+    """
+    Generates the response for the supervisors report, either HTML or CSV/XLS (depending on the 'format' parameter).
+
+    :param request: the request to use
+    :type request: HttpRequest
+    :param result: the students per faculty/school, see report.run_report
+    :type result: dict
+    :param scholarship: the scholarship that was checked
+    :type scholarship: str
+    :param name: the name of the report (faculty/paper/supervisor), used for template, URL and file name
+    :type name: str
+    :param sheet_name: the name of the sheet for the CSV/XLS output
+    :type sheet_name: str
+    :param sheet_per_school: whether to generate a sheet per faculty/school for XLS output
+    :type sheet_per_school: bool
+    :return: the response
+    :rtype: HttpResponse
+    """
+
+    formattype = get_variable(request, 'format')
+    if formattype in ["csv", "xls"]:
+        header = [
             'Faculty/School',
             'Department',
             'Paper',
@@ -506,10 +287,17 @@ def list_by_faculty(request):
             'Chief supervisor',
             'Status',
             'Scholarship (' + scholarship + ')',
-        ])
+        ]
+        content = OrderedDict()
         for school in result:
+            if sheet_per_school and (formattype == "xls"):
+                sheet = school
+            else:
+                sheet = sheet_name
+            if sheet not in content:
+                content[sheet] = [header]
             for row in result[school]:
-                data.append([
+                content[sheet].append([
                     school,
                     row['department'],
                     row['paper'],
@@ -525,24 +313,30 @@ def list_by_faculty(request):
                     row['status'],
                     row['scholarship'],
                 ])
-        sheet = excel.pe.Sheet(data)
-        response = excel.make_response(sheet, formattype, file_name="faculty-{0}.{1}".format(date.today().strftime("%Y-%m-%d"), formattype), sheet_name="Faculty")
+        if len(content) == 0:
+            content[sheet_name] = [header]
+        book = excel.pe.Book(content)
+        response = excel.make_response(book, formattype, file_name="{0}-{1}.{2}".format(name, date.today().strftime("%Y-%m-%d"), formattype))
         return response
     else:
-        template = loader.get_template('supervisors/list_by_faculty.html')
+        template = loader.get_template('supervisors/list_by_%s.html' % name)
         context = applist.template_context('supervisors')
         context['results'] = result
         context['scholarship'] = scholarship
         context['show_scholarship'] = scholarship != NO_SCHOLARSHIP
-        form_utils.add_export_urls(request, context, "/supervisors/list-by-faculty", ['csv', 'xls'])
+        form_utils.add_export_urls(request, context, "/supervisors/list-by-%s" % name, ['csv', 'xls'])
         return HttpResponse(template.render(context, request))
 
 
 @login_required
 @permission_required("supervisors.can_access_supervisors")
-def list_by_paper(request):
+def list_by_faculty(request):
     # get parameters
-    response, papers = get_variable_with_error(request, 'supervisors', 'paper', as_list=True)
+    response, schools = get_variable_with_error(request, 'supervisors', 'school', as_list=True)
+    if response is not None:
+        return response
+
+    response, departments = get_variable_with_error(request, 'supervisors', 'department', as_list=True)
     if response is not None:
         return response
 
@@ -552,150 +346,32 @@ def list_by_paper(request):
     years_back = int(years_back_str)
     start_year = date.today().year - years_back
 
-    programs = get_variable(request, 'program', as_list=True, def_value=PROGRAM_TYPES)
-    if REPORTING_OPTIONS['supervisor.only_phd']:
-        programs = ['DP']
-    supervisor_type = get_variable(request, 'supervisor_type', as_list=True, def_value=SUPERVISOR_TYPES)
-    study_type = get_variable(request, 'study_type', as_list=True, def_value=STUDY_TYPES)
-    only_current = get_variable(request, 'only_current', def_value="off") == "on"
-    min_months = float(get_variable(request, 'min_months', def_value="-1", blank=False))
-    scholarship = str(get_variable(request, 'scholarship', def_value="NO_SCHOLARSHIP"))
-    sort_column = get_variable(request, 'sort_column', def_value="supervisor")
-    sort_order = get_variable(request, 'sort_order', def_value="asc")
-    formattype = get_variable(request, 'format')
+    params = report_parameters(request, 'supervisors.search_by_faculty')
+    result = cached_report("faculty", {'schools': schools, 'departments': departments}, tables=[],
+                           conditions=["sd.school in " + in_list(schools), "sd.department in " + in_list(departments)],
+                           start_year=start_year, params=params)
+    return report_response(request, result, params['scholarship'], "faculty", "Faculty", True)
 
-    # save parameters
-    write_last_parameter(request.user, 'supervisors.search_by_paper.programs', programs)
-    write_last_parameter(request.user, 'supervisors.search_by_paper.supervisor_type', supervisor_type)
-    write_last_parameter(request.user, 'supervisors.search_by_paper.study_type', study_type)
-    write_last_parameter(request.user, 'supervisors.search_by_paper.only_current', only_current)
-    write_last_parameter(request.user, 'supervisors.search_by_paper.min_months', min_months)
-    write_last_parameter(request.user, 'supervisors.search_by_paper.scholarship', scholarship)
-    write_last_parameter(request.user, 'supervisors.search_by_paper.sort_column', sort_column)
-    write_last_parameter(request.user, 'supervisors.search_by_paper.sort_order', sort_order)
-
-    sql_active = " and a.active = True " if only_current else ""
-    sql = """
-        select sd.school, sd.department, a.person, a.student_id, sd.program
-        from %s sd, %s a, %s gr
-        where sd.student_id = a.student_id
-        and gr.student_id = a.student_id
-        and sd.program = a.program
-        and gr.paper_master_code in ('%s')
-        and sd.start_date >= '%s-01-01'
-        %s
-        and sd.months >= %f
-        group by sd.school, sd.department, a.person, a.student_id, sd.program
-        order by sd.school, sd.department, a.person, a.student_id, sd.program
-        """ % (StudentDates._meta.db_table, AssociatedRole._meta.db_table, GradeResults._meta.db_table, "','".join(papers), str(start_year), sql_active, min_months)
-    cursor = connection.cursor()
-    cursor.execute(sql)
-    result = {}
-    for row in cursor.fetchall():
-        try:
-            if row[4] not in programs:
-                continue
-            add_student(data=result, school=row[0], department=row[1], supervisor=row[2], studentid=row[3],
-                        program=row[4], supervisor_type=supervisor_type, study_type=study_type,
-                        only_current=only_current, scholarship=scholarship)
-        except Exception as ex:
-            logger.exception("row=" + str(row))
-
-    # sort
-    for school in result:
-        school_data = result[school]
-        school_data_sorted = sorted(school_data, key=lambda row: row[sort_column], reverse=(sort_order == "desc"))
-        result[school] = school_data_sorted
-
-    # generate output
-    if formattype == "xls":
-        content = OrderedDict()
-        for school in result:
-            data = list()
-            data.append([
-                'Faculty/School',
-                'Department',
-                'Paper',
-                'Supervisor',
-                'Program',
-                'ID',
-                'Name',
-                'Start date',
-                'End date',
-                'Months',
-                'Full time',
-                'Chief supervisor',
-                'Status',
-                'Scholarship (' + scholarship + ')',
-            ])
-            for row in result[school]:
-                data.append([
-                    school,
-                    row['department'],
-                    row['paper'],
-                    row['supervisor'],
-                    row['program'],
-                    row['id'],
-                    row['name'],
-                    row['start_date'],
-                    row['end_date'],
-                    row['months'],
-                    row['full_time'],
-                    row['chief_supervisor'],
-                    row['status'],
-                    row['scholarship'],
-                ])
-            content[school] = data
-        book = excel.pe.Book(content)
-        response = excel.make_response(book, formattype, file_name="paper-{0}.{1}".format(date.today().strftime("%Y-%m-%d"), formattype))
+
+@login_required
+@permission_required("supervisors.can_access_supervisors")
+def list_by_paper(request):
+    # get parameters
+    response, papers = get_variable_with_error(request, 'supervisors', 'paper', as_list=True)
+    if response is not None:
         return response
-    elif formattype == "csv":
-        data = list()
-        data.append([
-            'Faculty/School',
-            'Department',
-            'Paper',
-            'Supervisor',
-            'Program',
-            'ID',
-            'Name',
-            'Start date',
-            'End date',
-            'Months',
-            'Full time',
-            'Chief supervisor',
-            'Status',
-            'Scholarship (' + scholarship + ')',
-        ])
-        for school in result:
-            for row in result[school]:
-                data.append([
-                    school,
-                    row['department'],
-                    row['paper'],
-                    row['supervisor'],
-                    row['program'],
-                    row['id'],
-                    row['name'],
-                    row['start_date'],
-                    row['end_date'],
-                    row['months'],
-                    row['full_time'],
-                    row['chief_supervisor'],
-                    row['status'],
-                    row['scholarship'],
-                ])
-        sheet = excel.pe.Sheet(data)
-        response = excel.make_response(sheet, formattype, file_name="paper-{0}.{1}".format(date.today().strftime("%Y-%m-%d"), formattype), sheet_name="Faculty")
+
+    response, years_back_str = get_variable_with_error(request, 'supervisors', 'years_back')
+    if response is not None:
         return response
-    else:
-        template = loader.get_template('supervisors/list_by_paper.html')
-        context = applist.template_context('supervisors')
-        context['results'] = result
-        context['scholarship'] = scholarship
-        context['show_scholarship'] = scholarship != NO_SCHOLARSHIP
-        form_utils.add_export_urls(request, context, "/supervisors/list-by-paper", ['csv', 'xls'])
-        return HttpResponse(template.render(context, request))
+    years_back = int(years_back_str)
+    start_year = date.today().year - years_back
+
+    params = report_parameters(request, 'supervisors.search_by_paper')
+    result = cached_report("paper", {'papers': papers}, tables=["%s gr" % GradeResults._meta.db_table],
+                           conditions=["gr.student_id = a.student_id", "gr.paper_master_code in " + in_list(papers)],
+                           start_year=start_year, params=params)
+    return report_response(request, result, params['scholarship'], "paper", "Faculty", True)
 
 
 @login_required
@@ -712,19 +388,10 @@ def search_by_supervisor(request):
     # get year from earliest start date
     max_years = get_max_years()
 
-    sql = """
-        select distinct(a.person)
-        from %s sd, %s a
-        where lower(a.person) like '%%%s%%'
-        and a.active = True
-        order by a.person
-        """ % (StudentDates._meta.db_table, AssociatedRole._meta.db_table, escape_quotes(name.lower()))
-    cursor = connection.cursor()
-    cursor.execute(sql)
     results = list()
-    for row in cursor.fetchall():
+    for person in search_names("person", name):
         data = dict()
-        data['supervisor'] = row[0]
+        data['supervisor'] = person
         results.append(data)
 
     # configure template
@@ -756,112 +423,11 @@ def list_by_supervisor(request):
     years_back = int(years_back_str)
     start_year = date.today().year - years_back
 
-    programs = get_variable(request, 'program', as_list=True, def_value=PROGRAM_TYPES)
-    if REPORTING_OPTIONS['supervisor.only_phd']:
-        programs = ['DP']
-    supervisor_type = get_variable(request, 'supervisor_type', as_list=True, def_value=SUPERVISOR_TYPES)
-    study_type = get_variable(request, 'study_type', as_list=True, def_value=STUDY_TYPES)
-    only_current = get_variable(request, 'only_current', def_value="off") == "on"
-    min_months = float(get_variable(request, 'min_months', def_value="-1", blank=False))
-    scholarship = str(get_variable(request, 'scholarship', def_value="NO_SCHOLARSHIP"))
-    sort_column = get_variable(request, 'sort_column', def_value="supervisor")
-    sort_order = get_variable(request, 'sort_order', def_value="asc")
-    formattype = get_variable(request, 'format')
-
-    # save parameters
-    write_last_parameter(request.user, 'search_by_supervisor.programs', programs)
-    write_last_parameter(request.user, 'search_by_supervisor.supervisor_type', supervisor_type)
-    write_last_parameter(request.user, 'search_by_supervisor.study_type', study_type)
-    write_last_parameter(request.user, 'search_by_supervisor.only_current', only_current)
-    write_last_parameter(request.user, 'search_by_supervisor.min_months', min_months)
-    write_last_parameter(request.user, 'search_by_supervisor.scholarship', scholarship)
-    write_last_parameter(request.user, 'search_by_supervisor.sort_column', sort_column)
-    write_last_parameter(request.user, 'search_by_supervisor.sort_order', sort_order)
-
-    sql_active = " and a.active = True " if only_current else ""
-    sql = """
-        select sd.school, sd.department, a.person, a.student_id, sd.program
-        from %s sd, %s a
-        where sd.student_id = a.student_id
-        and sd.program = a.program
-        and a.person = '%s'
-        and sd.start_date >= '%s-01-01'
-        %s
-        and sd.months >= %f
-        group by sd.school, sd.department, a.person, a.student_id, sd.program
-        order by sd.school, sd.department, a.person, a.student_id, sd.program
-        """ % (StudentDates._meta.db_table, AssociatedRole._meta.db_table, escape_quotes(name), start_year, sql_active, min_months)
-    cursor = connection.cursor()
-    cursor.execute(sql)
-    result = dict()
-    for row in cursor.fetchall():
-        try:
-            if len(row[0]) < 1:
-                logger.warning("empty school: " + str(row))
-                continue
-            if row[4] not in programs:
-                continue
-            add_student(data=result, school=row[0], department=row[1], supervisor=row[2], studentid=row[3],
-                        program=row[4], supervisor_type=supervisor_type, study_type=study_type,
-                        only_current=only_current, scholarship=scholarship)
-        except Exception as ex:
-            logger.exception("row=" + str(row))
-
-    # sort
-    for school in result:
-        school_data = result[school]
-        school_data_sorted = sorted(school_data, key=lambda row: row[sort_column], reverse=(sort_order == "desc"))
-        result[school] = school_data_sorted
-
-    # CSV or HTML?
-    # generate output
-    if formattype in ["csv", "xls"]:
-        data = list()
-        data.append([
-            'Faculty/School',
-            'Department',
-            'Paper',
-            'Supervisor',
-            'Program',
-            'ID',
-            'Name',
-            'Start date',
-            'End date',
-            'Months',
-            'Full time',
-            'Chief supervisor',
-            'Status',
-            'Scholarship (' + scholarship + ')',
-        ])
-        for school in result:
-            for row in result[school]:
-                data.append([
-                    school,
-                    row['department'],
-                    row['paper'],
-                    row['supervisor'],
-                    row['program'],
-                    row['id'],
-                    row['name'],
-                    row['start_date'],
-                    row['end_date'],
-                    row['months'],
-                    row['full_time'],
-                    row['chief_supervisor'],
-                    row['status'],
-                    row['scholarship'],
-                ])
-        book = excel.pe.Book({'Supervisor': data})
-        response = excel.make_response(book, formattype, file_name="supervisor-{0}.{1}".format(date.today().strftime("%Y-%m-%d"), formattype))
-        return response
-    else:
-        template = loader.get_template('supervisors/list_by_supervisor.html')
-        context = applist.template_context('supervisors')
-        context['results'] = result
-        context['scholarship'] = scholarship
-        context['show_scholarship'] = scholarship != NO_SCHOLARSHIP
-        form_utils.add_export_urls(request, context, "/supervisors/list-by-supervisor", ['csv', 'xls'])
-        return HttpResponse(template.render(context, request))
+    params = report_parameters(request, 'search_by_supervisor')
+    result = cached_report("supervisor", {'name': name}, tables=[],
+                           conditions=["a.person = '%s'" % escape_quotes(name), "sd.school <> ''"],
+                           start_year=start_year, params=params)
+    return report_response(request, result, params['scholarship'], "supervisor", "Supervisor", False)
 
 
 @login_required
@@ -887,16 +453,19 @@ def search_by_student(request):
             order by a.student_id, sd.program, a.student
             """ % (StudentDates._meta.db_table, AssociatedRole._meta.db_table, name)
     else:
+        students = search_names("student", name)
+        if len(students) == 0:
+            students = [""]
         sql = """
             select a.student_id, sd.program, a.student
             from %s sd, %s a
-            where lower(a.student) like '%%%s%%'
+            where a.student in %s
             and a.active = True
             and a.student_id = sd.student_id
             and a.program = sd.program
             group by a.student_id, sd.program, a.student
             order by a.student_id, sd.program, a.student
-            """ % (StudentDates._meta.db_table, AssociatedRole._meta.db_table, escape_quotes(name.lower()))
+            """ % (StudentDates._meta.db_table, AssociatedRole._meta.db_table, in_list(students))
     cursor = connection.cursor()
     cursor.execute(sql)
     results = list()
@@ -906,6 +475,9 @@ def search_by_student(request):
         data['program'] = row[1]
         data['student'] = row[2]
         results.append(data)
+    # best matching names first
+    if not name.isdigit():
+        results.sort(key=lambda x: students.index(x['student']))
 
     # configure template
     template = loader.get_template('supervisors/search_by_student.html')
@@ -914,6 +486,22 @@ def search_by_student(request):
     return HttpResponse(template.render(context, request))
 
 
+@login_required
+@permission_required("supervisors.can_access_supervisors")
+def autocomplete_supervisor(request):
+    term = get_variable(request, 'term', def_value="")
+    return JsonResponse({'names': search_names("person", term, limit=AUTOCOMPLETE_LIMIT)})
+
+
+@login_required
+@permission_required("supervisors.can_access_supervisors")
+def autocomplete_student(request):
+    term = get_variable(request, 'term', def_value="")
+    if term.isdigit():
+        return JsonResponse({'names': []})
+    return JsonResponse({'names': search_names("student", term, limit=AUTOCOMPLETE_LIMIT)})
+
+
 @login_required
 @permission_required("supervisors.can_access_supervisors")
 def list_by_student(request):